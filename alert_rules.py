@@ -0,0 +1,304 @@
+"""
+Declarative alert rules for the real-time client (websocket_client.py).
+
+Rules live in a JSON file (see alert_rules.example.json):
+
+    {
+      "defaults": {"window_seconds": 60, "ema_span": 20, "cooldown_seconds": 0},
+      "tickers": {"TSLA": {"window_seconds": 30}},
+      "rules": [
+        {"name": "spike", "ticker": "*", "metric": "rise_from_low_pct", "op": ">", "value": 2.0},
+        {"name": "aapl-over-200", "ticker": "AAPL", "metric": "price", "op": ">=", "value": 200,
+         "cooldown_seconds": 300, "message": "{ticker} is at {price:.2f}"}
+      ]
+    }
+
+For every tick, the ticker's rolling state is updated once (window min/max via
+the monotonic deques in price_windows.py, EMA, rolling VWAP, tick count), then
+only that ticker's rules (plus the "*" ones) are checked. Each metric is
+computed once per tick and compared with the band in which none of its rules
+can fire; outside it, rules on the same operator are kept sorted by threshold,
+so finding every rule that fires is one bisect, however many rules there are.
+
+Metrics: price, window_low, window_high, rise_from_low_pct, drop_from_high_pct,
+ema, pct_from_ema, vwap, pct_from_vwap, tick_count.
+VWAP weights each tick by its "quantity" (1 if the feed doesn't send one, which
+makes it the rolling average price).
+After mark_gap() (the feed lost updates) only "price" rules are checked for a
+ticker until its window no longer reaches back before the gap; every other
+metric would mix prices from both sides of it.
+"""
+import json
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+
+from price_windows import DEFAULT_WINDOW_SECONDS, PriceWindow, WindowConfig
+
+ALL_TICKERS = '*'
+DEFAULT_EMA_SPAN = 20
+OPERATORS = ('>', '>=', '<', '<=')
+GAP_SAFE_METRICS = {'price'} # Don't depend on earlier ticks, so still checked across a feed gap
+
+RuleAlert = namedtuple('RuleAlert', 'rule ticker metric value op threshold price ts message')
+# Stand-in values for every field a message template can use (see RuleEngine.collect),
+# to catch a bad template when the config is loaded instead of on the first alert
+SAMPLE_MESSAGE_FIELDS = {'rule': 'rule', 'ticker': 'AAPL', 'metric': 'price', 'value': 1.0,
+                         'op': '>', 'threshold': 1.0, 'price': 1.0}
+
+
+class Rule:
+    """One parsed rule from the config file."""
+    __slots__ = ('name', 'ticker', 'metric', 'op', 'value', 'cooldown_seconds', 'message')
+
+    def __init__(self, name, metric, op, value, ticker=ALL_TICKERS, cooldown_seconds=None, message=None):
+        if metric not in METRICS:
+            raise ValueError(f"Rule '{name}': unknown metric '{metric}'. Use one of: {', '.join(METRICS)}")
+        if op not in OPERATORS:
+            raise ValueError(f"Rule '{name}': unknown op '{op}'. Use one of: {', '.join(OPERATORS)}")
+        self.name = name
+        self.ticker = ticker
+        self.metric = metric
+        self.op = op
+        self.value = float(value)
+        self.cooldown_seconds = cooldown_seconds
+        self.message = message
+
+
+class RollingState(PriceWindow):
+    """
+    Everything the rules can look at for one ticker, updated once per tick.
+    The window min/max come from PriceWindow; the ticks deque keeps running
+    sums for VWAP and the tick count, and EMA is a single multiply-add.
+    """
+    __slots__ = ('ticks', 'sum_price_x_quantity', 'sum_quantity', 'ema', 'ema_alpha', 'price', 'ts')
+
+    def __init__(self, config, ema_span):
+        super().__init__(config)
+        self.ticks = deque() # (ts, price, quantity)
+        self.sum_price_x_quantity = 0.0
+        self.sum_quantity = 0.0
+        self.ema = None
+        self.ema_alpha = 2.0 / (ema_span + 1)
+        self.price = None
+        self.ts = None
+
+    def add_tick(self, price, ts, quantity=1):
+        ts = self.add(price, ts) # Window min / max (and evicts old entries from those deques)
+        self.price = price
+        self.ts = ts
+
+        ticks = self.ticks
+        ticks.append((ts, price, quantity))
+        self.sum_price_x_quantity += price * quantity
+        self.sum_quantity += quantity
+        cutoff = ts - self.config.window_seconds
+        while ticks[0][0] < cutoff:
+            _, old_price, old_quantity = ticks.popleft()
+            self.sum_price_x_quantity -= old_price * old_quantity
+            self.sum_quantity -= old_quantity
+        if len(ticks) == 1:
+            # Window holds just this tick: reset the sums so float rounding can't build up
+            self.sum_price_x_quantity = price * quantity
+            self.sum_quantity = quantity
+
+        self.ema = price if self.ema is None else self.ema + self.ema_alpha * (price - self.ema)
+
+
+def _pct(part, whole):
+    return (part / whole * 100) if whole else 0.0
+
+
+def _vwap(state):
+    return state.sum_price_x_quantity / state.sum_quantity if state.sum_quantity else state.price
+
+
+# metric name -> function(state) computing it from the ticker's rolling state
+METRICS = {
+    'price': lambda s: s.price,
+    'window_low': lambda s: s.mins[0][1],
+    'window_high': lambda s: s.maxs[0][1],
+    'rise_from_low_pct': lambda s: _pct(s.price - s.mins[0][1], s.mins[0][1]),
+    'drop_from_high_pct': lambda s: _pct(s.maxs[0][1] - s.price, s.maxs[0][1]),
+    'ema': lambda s: s.ema,
+    'pct_from_ema': lambda s: _pct(s.price - s.ema, s.ema),
+    'vwap': _vwap,
+    'pct_from_vwap': lambda s: _pct(s.price - _vwap(s), _vwap(s)),
+    'tick_count': lambda s: len(s.ticks),
+}
+
+
+class RuleGroup:
+    """All rules for one (metric, op), sorted by threshold so the firing ones are a bisect away."""
+    __slots__ = ('op', 'thresholds', 'rules')
+
+    def __init__(self, op, rules):
+        self.op = op
+        rules = sorted(rules, key=lambda rule: rule.value)
+        self.thresholds = [rule.value for rule in rules]
+        self.rules = rules
+
+    def firing(self, value):
+        """The rules whose condition `value <op> threshold` holds."""
+        op = self.op
+        if op == '>':
+            return self.rules[:bisect_left(self.thresholds, value)]
+        if op == '>=':
+            return self.rules[:bisect_right(self.thresholds, value)]
+        if op == '<':
+            return self.rules[bisect_right(self.thresholds, value):]
+        return self.rules[bisect_left(self.thresholds, value):] # '<='
+
+
+class MetricRules:
+    """
+    Every rule on one metric for a ticker. The metric is computed once per tick,
+    and quiet_low < value < quiet_high means no rule can fire, which is most
+    ticks, so those skip the groups entirely.
+    """
+    __slots__ = ('metric', 'compute', 'groups', 'quiet_low', 'quiet_high')
+
+    def __init__(self, metric, rules):
+        self.metric = metric
+        self.compute = METRICS[metric]
+        by_op = {}
+        for rule in rules:
+            by_op.setdefault(rule.op, []).append(rule)
+        self.groups = [RuleGroup(op, op_rules) for op, op_rules in by_op.items()]
+        above = [rule.value for rule in rules if rule.op in ('>', '>=')]
+        below = [rule.value for rule in rules if rule.op in ('<', '<=')]
+        self.quiet_high = min(above) if above else float('inf')
+        self.quiet_low = max(below) if below else float('-inf')
+
+
+class RuleEngine:
+    """
+        engine = load_rule_engine('alert_rules.json')
+        for alert in engine.update('AAPL', 201.5, ts):
+            print(alert.message)
+    """
+
+    def __init__(self, rules, window_seconds=DEFAULT_WINDOW_SECONDS, ema_span=DEFAULT_EMA_SPAN,
+                 cooldown_seconds=0, ticker_settings=None):
+        self.window_seconds = window_seconds
+        self.ema_span = ema_span
+        self.cooldown_seconds = cooldown_seconds
+        self.ticker_settings = ticker_settings or {} # {'TSLA': {'window_seconds': 30, 'ema_span': 10}}
+        self.rules_by_ticker = {}
+        for rule in rules:
+            self.rules_by_ticker.setdefault(rule.ticker, []).append(rule)
+        self.rule_count = len(rules)
+        self.groups = {} # ticker -> [MetricRules], built the first time a ticker is seen
+        self.states = {} # ticker -> RollingState
+        self.last_fired = {} # (rule name, ticker) -> ts, for cooldowns
+
+    def groups_for(self, ticker):
+        groups = self.groups.get(ticker)
+        if groups is None:
+            by_metric = {}
+            for rule in self.rules_by_ticker.get(ticker, []) + self.rules_by_ticker.get(ALL_TICKERS, []):
+                by_metric.setdefault(rule.metric, []).append(rule)
+            groups = self.groups[ticker] = [MetricRules(metric, rules) for metric, rules in by_metric.items()]
+        return groups
+
+    def state_for(self, ticker):
+        state = self.states.get(ticker)
+        if state is None:
+            settings = self.ticker_settings.get(ticker, {})
+            config = WindowConfig(settings.get('window_seconds', self.window_seconds), None, None)
+            state = self.states[ticker] = RollingState(config, settings.get('ema_span', self.ema_span))
+        return state
+
+    def update(self, ticker, price, ts, quantity=1):
+        """Feed one tick (ts in float seconds). Returns a list of RuleAlerts (usually empty)."""
+        state = self.states.get(ticker)
+        if state is None:
+            state = self.state_for(ticker)
+        state.add_tick(price, ts, quantity)
+        groups = self.groups.get(ticker)
+        if groups is None:
+            groups = self.groups_for(ticker)
+
+        alerts = []
+        spans_gap = state.gap_ts is not None
+        for metric_rules in groups:
+            if spans_gap and metric_rules.metric not in GAP_SAFE_METRICS:
+                continue
+            value = metric_rules.compute(state)
+            if metric_rules.quiet_low < value < metric_rules.quiet_high:
+                continue
+            for group in metric_rules.groups:
+                fired = group.firing(value)
+                if fired:
+                    self.collect(alerts, fired, value, ticker, state)
+        return alerts
+
+    def collect(self, alerts, rules, value, ticker, state):
+        """Turn firing rules into alerts, skipping any still in their cooldown."""
+        for rule in rules:
+            cooldown = rule.cooldown_seconds if rule.cooldown_seconds is not None else self.cooldown_seconds
+            if cooldown:
+                key = (rule.name, ticker)
+                last = self.last_fired.get(key)
+                if last is not None and state.ts - last < cooldown:
+                    continue
+                self.last_fired[key] = state.ts
+            fields = {'rule': rule.name, 'ticker': ticker, 'metric': rule.metric, 'value': value,
+                      'op': rule.op, 'threshold': rule.value, 'price': state.price}
+            template = rule.message or "{rule}: {ticker} {metric} = {value:.2f} ({op} {threshold:g}), price {price:.2f}"
+            alerts.append(RuleAlert(rule.name, ticker, rule.metric, value, rule.op, rule.value,
+                                    state.price, state.ts, template.format(**fields)))
+
+    def mark_gap(self, ticker=None):
+        """The feed lost updates for this ticker (or all of them) after their last tick."""
+        if ticker is None:
+            states = self.states.values()
+        else:
+            states = [self.states[ticker]] if ticker in self.states else []
+        for state in states:
+            state.mark_gap()
+
+    def forget(self, ticker):
+        """Drop a ticker's rolling state (e.g. when unsubscribing from it)."""
+        self.states.pop(ticker, None)
+
+
+def rule_engine_from_config(config):
+    """Build a RuleEngine from an already-parsed config dict (same layout as the JSON file)."""
+    defaults = config.get('defaults', {})
+    rules = []
+    names = set()
+    for index, spec in enumerate(config.get('rules', [])):
+        try:
+            rule = Rule(
+                name=spec.get('name', f"rule-{index}"),
+                metric=spec['metric'],
+                op=spec['op'],
+                value=spec['value'],
+                ticker=spec.get('ticker', ALL_TICKERS),
+                cooldown_seconds=spec.get('cooldown_seconds'),
+                message=spec.get('message'),
+            )
+        except KeyError as e:
+            raise ValueError(f"Rule #{index} is missing {e}")
+        if rule.message is not None:
+            try:
+                rule.message.format(**SAMPLE_MESSAGE_FIELDS)
+            except (KeyError, IndexError, ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"Rule '{rule.name}' has a bad message: {e!r}")
+        if rule.name in names:
+            raise ValueError(f"Duplicate rule name '{rule.name}'")
+        names.add(rule.name)
+        rules.append(rule)
+    return RuleEngine(
+        rules,
+        window_seconds=defaults.get('window_seconds', DEFAULT_WINDOW_SECONDS),
+        ema_span=defaults.get('ema_span', DEFAULT_EMA_SPAN),
+        cooldown_seconds=defaults.get('cooldown_seconds', 0),
+        ticker_settings=config.get('tickers', {}),
+    )
+
+
+def load_rule_engine(path):
+    """Read a rules JSON file (see the module docstring) and build a RuleEngine."""
+    with open(path, encoding='utf-8') as f:
+        return rule_engine_from_config(json.load(f))
@@ -0,0 +1,101 @@
+"""
+Benchmark: rule engine throughput (alert_rules.py).
+
+Builds --rules random rules spread over --tickers tickers (plus a few "*" rules
+that apply to every ticker), with thresholds around each ticker's own price
+level like real alert rules, replays a random-walk tick stream through the
+engine and reports ticks/sec. The target is >= 100k ticks/sec with 10k rules.
+A sample of ticks is re-checked by evaluating every rule one by one.
+
+    python -m benchmarks.bench_alert_rules --ticks 1000000 --rules 10000 --tickers 1000
+"""
+import argparse
+import operator
+import random
+import time
+
+from alert_rules import ALL_TICKERS, METRICS, Rule, RuleEngine
+from benchmarks.bench_price_windows import generate_ticks
+
+COMPARE = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+# Rules like people actually write them: alert when something moves away from
+# normal, not conditions that hold all day. metric -> [(op, low, high)], with
+# price-like thresholds as a multiple of the ticker's opening price.
+RULE_SHAPES = {
+    'price': [('>', 1.02, 1.10), ('<', 0.90, 0.98)],
+    'window_low': [('<', 0.90, 0.98)],
+    'window_high': [('>', 1.02, 1.10)],
+    'ema': [('>', 1.02, 1.10), ('<', 0.90, 0.98)],
+    'vwap': [('>', 1.02, 1.10), ('<', 0.90, 0.98)],
+    'rise_from_low_pct': [('>', 1.0, 5.0)],
+    'drop_from_high_pct': [('>', 1.0, 5.0)],
+    'pct_from_ema': [('>', 0.5, 3.0), ('<', -3.0, -0.5)],
+    'pct_from_vwap': [('>', 0.5, 3.0), ('<', -3.0, -0.5)],
+    'tick_count': [('>', 400, 1000)],
+}
+RELATIVE_TO_PRICE = {'price', 'window_low', 'window_high', 'ema', 'vwap'}
+
+
+def make_rules(count, opening_prices, wildcard_rules, seed=7):
+    rng = random.Random(seed)
+    names = sorted(opening_prices)
+    metrics = list(METRICS)
+    rules = []
+    for index in range(count):
+        metric = rng.choice(metrics)
+        if index < wildcard_rules:
+            # Rules for every ticker can only sensibly use relative metrics
+            metric = rng.choice(['rise_from_low_pct', 'drop_from_high_pct', 'pct_from_ema', 'pct_from_vwap'])
+        ticker = ALL_TICKERS if index < wildcard_rules else rng.choice(names)
+        op, low, high = rng.choice(RULE_SHAPES[metric])
+        value = rng.uniform(low, high)
+        if metric in RELATIVE_TO_PRICE:
+            value *= opening_prices[ticker]
+        rules.append(Rule(f"rule-{index}", metric, op, value, ticker, cooldown_seconds=60))
+    return rules
+
+
+def check_sample(rules, ticks):
+    """Compare the engine with a naive loop over every rule, on a small sample (no cooldowns)."""
+    for rule in rules:
+        rule.cooldown_seconds = 0
+    engine = RuleEngine(rules)
+    for ticker, price, ts in ticks:
+        fired = {alert.rule for alert in engine.update(ticker, price, ts)}
+        state = engine.states[ticker]
+        expected = {rule.name for rule in rules if rule.ticker in (ticker, ALL_TICKERS)
+                    and COMPARE[rule.op](METRICS[rule.metric](state), rule.value)}
+        if fired != expected:
+            raise AssertionError(f"Rules fired for {ticker} at {ts} don't match the naive check")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=1000000)
+    parser.add_argument('--rules', type=int, default=10000)
+    parser.add_argument('--tickers', type=int, default=1000)
+    parser.add_argument('--wildcard-rules', type=int, default=5, help="How many of the rules apply to every ticker")
+    parser.add_argument('--ticks-per-second', type=int, default=5000, help="Feed rate across all tickers")
+    args = parser.parse_args()
+
+    ticks = generate_ticks(args.ticks, args.tickers, args.ticks_per_second)
+    opening_prices = {}
+    for ticker, price, _ in ticks:
+        opening_prices.setdefault(ticker, price)
+    check_sample(make_rules(args.rules, opening_prices, args.wildcard_rules), ticks[:20000])
+
+    engine = RuleEngine(make_rules(args.rules, opening_prices, args.wildcard_rules))
+    update = engine.update
+    alerts = 0
+    started = time.perf_counter()
+    for ticker, price, ts in ticks:
+        alerts += len(update(ticker, price, ts))
+    elapsed = time.perf_counter() - started
+    rate = len(ticks) / elapsed
+    print(f"{engine.rule_count:,} rules over {args.tickers:,} tickers: {len(ticks):,} ticks in {elapsed:.2f}s "
+          f"({rate:,.0f} ticks/s), {alerts:,} alerts")
+    print("OK: >= 100k ticks/s" if rate >= 100000 else "Below the 100k ticks/s target on this machine")
+
+
+if __name__ == "__main__":
+    main()
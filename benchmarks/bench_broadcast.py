@@ -0,0 +1,164 @@
+"""
+Load test: mock_server.py's broadcast with --clients simulated clients.
+
+The clients aren't real sockets (10k of those would measure the kernel, not the
+broadcaster): each stands in for a connection, runs through the real
+send_stock_updates handler and ClientFeed, and records how long after publish()
+each frame reached it. --slow-fraction of them take --slow-delay seconds per
+send, like a client on a bad link.
+
+Three runs over the same --seconds:
+  - per-client queues, SLOW_CLIENT_POLICY='conflate'
+  - per-client queues, SLOW_CLIENT_POLICY='disconnect'
+  - the old broadcast (asyncio.gather of every client's send, each interval)
+Reported: frames published vs the schedule, fan-out time (publish() for all
+clients), and delivery latency to the fast clients.
+
+    python -m benchmarks.bench_broadcast --clients 10000 --seconds 10
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from websockets.exceptions import ConnectionClosedOK
+
+import mock_server
+
+
+class SimulatedClient:
+    """Looks enough like a server-side websocket connection for mock_server's handler and ClientFeed."""
+
+    def __init__(self, index, send_delay, published, latencies):
+        self.remote_address = ('simulated', index)
+        self.send_delay = send_delay
+        self.published = published # frame -> perf_counter() at publish
+        self.latencies = latencies # Shared by all the fast clients
+        self.received = 0
+        self.close_code = None
+        self.closed = asyncio.Event()
+
+    async def send(self, frame, text=None):
+        if self.closed.is_set():
+            raise ConnectionClosedOK(None, None)
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        else:
+            self.latencies.append(time.perf_counter() - self.published[frame])
+        self.received += 1
+
+    async def close(self, code=1000, reason=''):
+        self.close_code = code
+        self.closed.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.closed.wait() # A client that never sends anything, until the connection closes
+        raise StopAsyncIteration
+
+
+def make_clients(count, slow_fraction, slow_delay, published, latencies):
+    slow_every = int(1 / slow_fraction) if slow_fraction else 0
+    return [SimulatedClient(index, slow_delay if slow_every and index % slow_every == 0 else 0, published, latencies)
+            for index in range(count)]
+
+
+def make_batch(seq):
+    """One batch the way broadcast_prices builds it, plus the frame every (unsubscribed) client gets from it."""
+    fragments = {ticker: json.dumps({"ticker": ticker, "price": 100.0, "timestamp": "2024-05-15T10:00:00+00:00",
+                                     "seq": seq}).encode('utf-8')
+                 for ticker in mock_server.TICKERS}
+    batch = mock_server.PriceBatch(seq, 1715767200.0, [100.0] * len(fragments), fragments)
+    return batch, b'[' + b','.join(fragments.values()) + b']'
+
+
+async def run_queued(args, policy):
+    mock_server.SLOW_CLIENT_POLICY = policy
+    for key in mock_server.broadcast_stats:
+        mock_server.broadcast_stats[key] = 0
+    published, latencies = {}, []
+    clients = make_clients(args.clients, args.slow_fraction, args.slow_delay, published, latencies)
+    handlers = [asyncio.create_task(mock_server.send_stock_updates(client)) for client in clients]
+    await asyncio.sleep(0) # Let every handler register its ClientFeed
+
+    fanout = []
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    next_frame = loop.time()
+    seq = 0
+    while time.perf_counter() - started < args.seconds:
+        next_frame += args.interval # Same fixed schedule as broadcast_prices
+        await asyncio.sleep(max(0, next_frame - loop.time()))
+        seq += 1
+        batch, frame = make_batch(seq)
+        published[frame] = time.perf_counter()
+        mock_server.publish(batch)
+        fanout.append(time.perf_counter() - published[frame])
+    await asyncio.sleep(args.interval * 2) # Let the fast clients' queues drain
+
+    for client in clients:
+        await client.close()
+    await asyncio.gather(*handlers)
+    return seq, fanout, latencies, dict(mock_server.broadcast_stats)
+
+
+async def run_gather(args):
+    """The broadcast loop as it used to be: one gather over every client's send, every interval."""
+    published, latencies = {}, []
+    clients = make_clients(args.clients, args.slow_fraction, args.slow_delay, published, latencies)
+    fanout = []
+    started = time.perf_counter()
+    seq = 0
+    while time.perf_counter() - started < args.seconds:
+        await asyncio.sleep(args.interval)
+        seq += 1
+        _, frame = make_batch(seq)
+        published[frame] = time.perf_counter()
+        await asyncio.gather(*[client.send(frame) for client in clients], return_exceptions=True)
+        fanout.append(time.perf_counter() - published[frame])
+    return seq, fanout, latencies, None
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(label, args, seq, fanout, latencies, stats):
+    expected = int(args.seconds / args.interval)
+    latencies.sort()
+    fanout.sort()
+    print(f"{label}: {seq} of ~{expected} scheduled frames published")
+    print(f"  fan-out per frame: p50 {percentile(fanout, 0.5) * 1000:.1f}ms  max {fanout[-1] * 1000:.1f}ms")
+    if latencies:
+        print(f"  fast clients, publish -> sent: p50 {percentile(latencies, 0.5) * 1000:.1f}ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms  max {latencies[-1] * 1000:.1f}ms "
+              f"({len(latencies):,} deliveries)")
+    if stats:
+        print(f"  slow clients: {stats['frames_conflated']:,} frames conflated, "
+              f"{stats['slow_clients_dropped']:,} clients disconnected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=0.1, help="Seconds between frames")
+    parser.add_argument('--slow-fraction', type=float, default=0.01)
+    parser.add_argument('--slow-delay', type=float, default=0.5, help="Seconds a slow client takes per send")
+    args = parser.parse_args()
+
+    print(f"{args.clients:,} clients ({args.slow_fraction:.0%} slow at {args.slow_delay}s per send), "
+          f"a frame every {args.interval}s for {args.seconds}s")
+    for policy in ('conflate', 'disconnect'):
+        with contextlib.redirect_stdout(io.StringIO()): # The handler prints every (dis)connect
+            result = asyncio.run(run_queued(args, policy))
+        report(f"per-client queues, {policy}", args, *result)
+    report("old gather broadcast", args, *asyncio.run(run_gather(args)))
+
+
+if __name__ == "__main__":
+    main()
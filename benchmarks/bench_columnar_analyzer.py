@@ -0,0 +1,106 @@
+"""
+Benchmark: pure-Python vs NumPy (columnar) trade analysis engines.
+
+For each row count, generates a trades CSV, runs both engines on it, checks the
+results agree (average price within a cent, everything else exactly) and prints
+the speedup. First checks a small file of rows the NumPy engine has to reject
+(nan/inf prices, quantities past int64, prices with more than 4 decimals).
+
+    python -m benchmarks.bench_columnar_analyzer --rows 1000000 10000000 50000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_trade_analyzer import generate_trades_csv
+from trade_analyzer import get_analyzer
+
+
+def run_engine(engine, path):
+    analyzer = get_analyzer(engine)
+    started = time.perf_counter()
+    with open(path, 'rb') as stream:
+        analyzer.consume_stream(stream)
+    results = {row[0]: row for row in analyzer.results()}
+    return results, time.perf_counter() - started
+
+
+def check_same(python_results, numpy_results):
+    if python_results.keys() != numpy_results.keys():
+        raise AssertionError("Engines found different tickers")
+    for ticker, python_row in python_results.items():
+        numpy_row = numpy_results[ticker]
+        for column, (expected, actual) in enumerate(zip(python_row, numpy_row)):
+            if column == 2: # average_price: float sum vs exact fixed-point sum
+                if abs(float(expected) - float(actual)) > 0.01:
+                    raise AssertionError(f"{ticker} average price differs: {expected} vs {actual}")
+            elif expected != actual:
+                raise AssertionError(f"{ticker} column {column} differs: {expected} vs {actual}")
+
+
+# Rows the fixed-point NumPy engine must skip as malformed instead of rounding or overflowing
+BAD_ROWS = [
+    "AAPL,nan,10,BUY",
+    "AAPL,inf,10,SELL",
+    "MSFT,-Infinity,5,BUY",
+    "MSFT,101.5,99999999999999999999,BUY", # Past int64
+    "GOOG,170.12345,10,SELL", # 5 decimals
+    "GOOG,1e300,10,BUY",
+]
+GOOD_ROWS = [
+    "AAPL,170.5,10,BUY",
+    "MSFT, 101.25 ,5,SELL", # Spaces send the block down the csv path as well
+    "GOOG,170.1234,20,BUY",
+    "AAPL,169.75,3,SELL",
+]
+
+
+def check_bad_rows(tmp_dir):
+    """The NumPy engine gives the same results as the Python engine on the good rows alone."""
+    header = "ticker,price,quantity,side\n"
+    mixed_path = os.path.join(tmp_dir, 'mixed.csv')
+    good_path = os.path.join(tmp_dir, 'good.csv')
+    with open(mixed_path, 'w') as out:
+        out.write(header + "\n".join(GOOD_ROWS[:2] + BAD_ROWS + GOOD_ROWS[2:]) + "\n")
+    with open(good_path, 'w') as out:
+        out.write(header + "\n".join(GOOD_ROWS) + "\n")
+    try:
+        analyzer = get_analyzer('numpy')
+        with open(mixed_path, 'rb') as stream:
+            analyzer.consume_stream(stream)
+        if analyzer.malformed_records != len(BAD_ROWS):
+            raise AssertionError(f"Expected {len(BAD_ROWS)} malformed rows, got {analyzer.malformed_records}")
+        python_results, _ = run_engine('python', good_path)
+        check_same(python_results, {row[0]: row for row in analyzer.results()})
+    finally:
+        os.remove(mixed_path)
+        os.remove(good_path)
+    print(f"Bad rows: the NumPy engine skipped all {len(BAD_ROWS)} and matched the Python engine on the rest")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000, 50000000])
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    check_bad_rows(tmp_dir)
+    for rows in args.rows:
+        path = os.path.join(tmp_dir, f'trades_{rows}.csv')
+        try:
+            generate_trades_csv(path, rows=rows)
+            python_results, python_elapsed = run_engine('python', path)
+            numpy_results, numpy_elapsed = run_engine('numpy', path)
+            check_same(python_results, numpy_results)
+            print(f"{rows:>11,} rows | python {python_elapsed:7.1f}s ({rows / python_elapsed:>10,.0f} rows/s)"
+                  f" | numpy {numpy_elapsed:7.1f}s ({rows / numpy_elapsed:>10,.0f} rows/s)"
+                  f" | speedup {python_elapsed / numpy_elapsed:.1f}x")
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+    os.rmdir(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: analyzing trades.csv vs its columnar copy (columnar_store.py).
+
+Generates one day of trades in a temporary local "bucket", converts it, then
+analyzes it every way (CSV / columnar, both engines, all tickers / one ticker)
+and reports bytes read from storage and wall-clock time. Results are checked
+against the CSV run of the same engine.
+
+    python -m benchmarks.bench_columnar_store --rows 5000000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_trade_analyzer import TICKERS, generate_trades_csv
+from columnar_store import columnar_prefix, convert_csv, read_columnar_trades
+from trade_analyzer import LocalS3Client, read_s3_trades
+
+BUCKET = 'bench-bucket'
+CSV_KEY = '2024/05/15/trades.csv'
+
+
+class CountingBody:
+    def __init__(self, body, counter):
+        self.body = body
+        self.counter = counter
+
+    def read(self, size=-1):
+        data = self.body.read(size)
+        self.counter.bytes_read += len(data)
+        return data
+
+    def close(self):
+        self.body.close()
+
+
+class CountingS3Client(LocalS3Client):
+    """LocalS3Client that counts how many bytes are read out of it."""
+
+    def __init__(self, root_dir):
+        super().__init__(root_dir)
+        self.bytes_read = 0
+
+    def get_object(self, Bucket, Key):
+        response = super().get_object(Bucket, Key)
+        response['Body'] = CountingBody(response['Body'], self)
+        return response
+
+
+def run(label, s3_client, analyze, baseline=None):
+    s3_client.bytes_read = 0
+    started = time.perf_counter()
+    analyzer = analyze()
+    elapsed = time.perf_counter() - started
+    results = list(analyzer.results())
+    if baseline is not None:
+        expected = [row for row in baseline if row[0] in {result[0] for result in results}]
+        if results != expected:
+            raise AssertionError(f"{label}: results differ from the CSV run")
+    print(f"{label:<34} {s3_client.bytes_read / (1024 * 1024):>9,.1f} MB read {elapsed:>8.2f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000000)
+    parser.add_argument('--engines', nargs='+', default=['python', 'numpy'])
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(root, BUCKET, *CSV_KEY.split('/'))
+        os.makedirs(os.path.dirname(csv_path))
+        generate_trades_csv(csv_path, rows=args.rows)
+        s3_client = CountingS3Client(root)
+
+        started = time.perf_counter()
+        manifest = convert_csv(s3_client, BUCKET, CSV_KEY)
+        print(f"{args.rows:,} rows: converted in {time.perf_counter() - started:.1f}s, "
+              f"CSV {os.path.getsize(csv_path) / (1024 * 1024):,.1f} MB, "
+              f"{len(manifest['partitions'])} ticker partitions\n")
+
+        prefix = columnar_prefix(CSV_KEY)
+        one_ticker = [TICKERS[0]]
+        for engine in args.engines:
+            baseline = run(f"csv      {engine:<6} all tickers", s3_client,
+                           lambda: read_s3_trades(s3_client, BUCKET, CSV_KEY, engine=engine))
+            run(f"columnar {engine:<6} all tickers", s3_client,
+                lambda: read_columnar_trades(s3_client, BUCKET, prefix, engine), baseline)
+            run(f"columnar {engine:<6} {one_ticker[0]} only", s3_client,
+                lambda: read_columnar_trades(s3_client, BUCKET, prefix, engine, tickers=one_ticker), baseline)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
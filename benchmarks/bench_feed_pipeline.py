@@ -0,0 +1,132 @@
+"""
+Benchmark: classic per-tick client loop vs the pipeline mode (feed_pipeline.py).
+
+Both consume the same pre-built frames from an in-process fake websocket (no
+network), write their console output to /dev/null, and run the same 2% window
+check. The classic loop does what connect_and_listen does per update
+(fromisoformat + strftime + print(flush=True)); the pipeline queues frames,
+handles them in batches and buffers / rate-limits output (most of its gain:
+both parse timestamps with fromisoformat). A second pipeline run with
+a tiny queue and drop_oldest shows the backpressure counters.
+
+    python -m benchmarks.bench_feed_pipeline --frames 20000 --updates-per-frame 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from feed_pipeline import BufferedLog, FeedPipeline
+from price_windows import PriceWindowMonitor
+
+
+class FeedFinished(Exception):
+    pass
+
+
+class FakeWebSocket:
+    """recv() hands out pre-built frames, then raises FeedFinished."""
+
+    def __init__(self, frames, delay_every=0):
+        self.frames = iter(frames)
+        self.delay_every = delay_every
+        self.sent = 0
+
+    async def recv(self):
+        self.sent += 1
+        if self.delay_every and self.sent % self.delay_every == 0:
+            await asyncio.sleep(0) # Give the processor a chance, like a real socket would
+        try:
+            return next(self.frames)
+        except StopIteration:
+            raise FeedFinished()
+
+
+def make_frames(count, updates_per_frame, seed=1):
+    rng = random.Random(seed)
+    tickers = [f"T{i:04d}" for i in range(updates_per_frame)]
+    prices = {ticker: rng.uniform(50, 200) for ticker in tickers}
+    now = datetime(2024, 5, 15, 10, 0, tzinfo=timezone.utc)
+    frames = []
+    for _ in range(count):
+        now += timedelta(milliseconds=50)
+        updates = []
+        for ticker in tickers:
+            prices[ticker] = max(0.01, prices[ticker] + rng.uniform(-0.05, 0.05))
+            updates.append({"ticker": ticker, "price": round(prices[ticker], 2), "timestamp": now.isoformat()})
+        frames.append(json.dumps(updates))
+    return frames
+
+
+async def run_classic(frames, out):
+    """The per-update work connect_and_listen does, minus the socket."""
+    monitor = PriceWindowMonitor()
+    websocket = FakeWebSocket(frames)
+    while True:
+        try:
+            message_str = await websocket.recv()
+        except FeedFinished:
+            break
+        updates = json.loads(message_str)
+        print(f"\nReceived {len(updates)} updates:", flush=True, file=out)
+        for update_data in updates:
+            ticker = update_data['ticker']
+            price = float(update_data['price'])
+            timestamp_dt = datetime.fromisoformat(update_data['timestamp'].replace('Z', '+00:00'))
+            print(f"  Ticker: {ticker}, Price: {price:.2f}, Timestamp: {timestamp_dt.strftime('%Y-%m-%d %H:%M:%S')}",
+                  flush=True, file=out)
+            alert = monitor.update(ticker, price, timestamp_dt.timestamp())
+            if alert:
+                print(f"\n>> {alert}\n", flush=True, file=out)
+
+
+async def run_pipeline(frames, out, queue_size, overflow, delay_every):
+    monitor = PriceWindowMonitor()
+
+    def check(ticker, price, ts, update):
+        alert = monitor.update(ticker, price, ts)
+        return [str(alert)] if alert else []
+
+    pipeline = FeedPipeline(check, log=BufferedLog(out), queue_size=queue_size, overflow=overflow,
+                            stats_interval=0)
+    try:
+        await pipeline.run(FakeWebSocket(frames, delay_every))
+    except FeedFinished:
+        pass
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--updates-per-frame', type=int, default=50)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.updates_per_frame)
+    updates = args.frames * args.updates_per_frame
+    with open(os.devnull, 'w') as out:
+        started = time.perf_counter()
+        asyncio.run(run_classic(frames, out))
+        classic = time.perf_counter() - started
+        print(f"classic loop:  {updates:,} updates in {classic:.2f}s ({updates / classic:,.0f} updates/s)")
+
+        started = time.perf_counter()
+        pipeline = asyncio.run(run_pipeline(frames, out, 1000, 'block', delay_every=10))
+        elapsed = time.perf_counter() - started
+        print(f"pipeline:      {updates:,} updates in {elapsed:.2f}s ({updates / elapsed:,.0f} updates/s), "
+              f"{pipeline.stats.updates_processed:,} processed, speedup {classic / elapsed:.1f}x")
+        for line in pipeline.stats.lines():
+            print(f"  {line}")
+
+        # Receiver much faster than the processor, tiny queue: frames get dropped, counters show it
+        pipeline = asyncio.run(run_pipeline(frames, out, 8, 'drop_oldest', delay_every=0))
+        print("pipeline, queue of 8 with drop_oldest and a receiver that never yields:")
+        for line in pipeline.stats.lines()[:2]:
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
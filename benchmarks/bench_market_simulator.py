@@ -0,0 +1,154 @@
+"""
+Benchmark: market_simulator.py (NumPy price paths) vs mock_server.py's own
+per-ticker Python loop, plus the checks that make it usable for load tests.
+
+  - throughput: batches per second for --tickers, price generation alone and
+    price generation + encoding into the per-ticker JSON fragments publish() takes
+  - determinism: two simulators with the same seed give identical batches
+    (spikes included), a different seed doesn't
+  - record / replay: batches written with FeedRecorder come back identical
+    from FeedReplay, spikes included
+  - alert recall: a smaller universe with random spikes runs through
+    PriceWindowMonitor; a spike counts as caught if an alert for that ticker in
+    its direction fires within the window. Alerts on a ticker with no spike
+    in the window count as false alerts.
+
+    python -m benchmarks.bench_market_simulator --tickers 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import mock_server
+from market_simulator import BatchEncoder, FeedRecorder, FeedReplay, MarketSimulator
+from price_windows import PriceWindowMonitor
+
+
+def per_second(make_batch, batches):
+    make_batch() # Warm up
+    started = time.perf_counter()
+    for _ in range(batches):
+        make_batch()
+    return batches / (time.perf_counter() - started)
+
+
+def legacy_loop(tickers):
+    """mock_server's random walk, prices only (the JSON part of next_batch() taken out)."""
+    prices = {ticker: random.uniform(50, 200) for ticker in tickers}
+
+    def make_batch():
+        for ticker in tickers:
+            prices[ticker] = max(0.01, prices[ticker] + random.uniform(-0.5, 0.5))
+    return make_batch
+
+
+def throughput(args):
+    simulator = MarketSimulator(args.tickers, seed=1)
+    encoder = BatchEncoder(simulator.tickers)
+    mock_server.use_generated_tickers(args.tickers)
+    results = [
+        ("legacy loop, prices", per_second(legacy_loop(mock_server.TICKERS), args.batches)),
+        ("simulator, prices", per_second(simulator.next_batch, args.batches)),
+        ("legacy next_batch(), prices + JSON", per_second(mock_server.next_batch, args.batches)),
+        ("simulator, prices + JSON", per_second(lambda: encoder.encode(simulator.next_batch()), args.batches)),
+    ]
+    print(f"Throughput, {args.tickers:,} tickers:")
+    for label, rate in results:
+        print(f"  {label:36} {rate:10,.1f} batches/s  ({rate * args.tickers:14,.0f} ticks/s)")
+    print(f"  vectorized prices: {results[1][1] / results[0][1]:.0f}x the legacy loop, "
+          f"with JSON: {results[3][1] / results[2][1]:.1f}x")
+
+
+def same_batches(first, second, batches):
+    for _ in range(batches):
+        a, b = first.next_batch(), second.next_batch()
+        if a.seq != b.seq or a.ts != b.ts or not np.array_equal(a.prices, b.prices):
+            return False
+    return True
+
+
+def check_determinism(args):
+    options = {'interval': 0.01, 'spike_rate': 50.0, 'start_ts': 0.0}
+    same = same_batches(MarketSimulator(1000, seed=7, **options), MarketSimulator(1000, seed=7, **options), 200)
+    different = same_batches(MarketSimulator(1000, seed=7, **options), MarketSimulator(1000, seed=8, **options), 200)
+    if not same or different:
+        raise AssertionError("Simulator isn't deterministic by seed")
+    print("OK: same seed gives identical batches, a different seed doesn't")
+
+
+def check_replay(args):
+    simulator = MarketSimulator(1000, interval=0.01, seed=3, spike_rate=50.0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'feed.rec')
+        recorder = FeedRecorder(path, simulator.tickers, simulator.interval, simulator.seed)
+        batches = [simulator.next_batch() for _ in range(args.batches)]
+        for batch in batches:
+            recorder.write(batch)
+        recorder.close(simulator.spikes_applied)
+
+        replay = FeedReplay(path)
+        replayed = [replay.next_batch() for _ in range(len(replay))]
+        same = (replay.next_batch() is None and len(replayed) == len(batches)
+                and all(a.seq == b.seq and a.ts == b.ts and np.array_equal(a.prices, b.prices)
+                        for a, b in zip(batches, replayed))
+                and replay.spikes == simulator.spikes_applied)
+        size = os.path.getsize(path)
+        del replay, replayed # Let go of the memory map before the directory is removed
+    if not same:
+        raise AssertionError("Replay differs from the recording")
+    print(f"OK: {len(batches)} recorded batches ({size / 1e6:.1f}MB, "
+          f"{len(simulator.spikes_applied)} spikes) replay identically")
+
+
+def alert_recall(args):
+    simulator = MarketSimulator(args.recall_tickers, interval=args.interval, seed=11, spike_rate=args.spike_rate,
+                                start_ts=0.0)
+    window_batches = int(args.window / args.interval)
+    monitor = PriceWindowMonitor(window_seconds=args.window)
+    alerts = [] # (seq, ticker, direction)
+    for _ in range(args.recall_batches):
+        batch = simulator.next_batch()
+        for ticker, price in zip(simulator.tickers, batch.prices.tolist()):
+            alert = monitor.update(ticker, price, batch.ts)
+            if alert:
+                alerts.append((batch.seq, ticker, alert.direction))
+
+    spikes_by_ticker = {}
+    for spike in simulator.spikes_applied:
+        spikes_by_ticker.setdefault(spike.ticker, []).append(spike)
+    fired = set(alerts)
+    caught = sum(1 for spike in simulator.spikes_applied
+                 if any((seq, spike.ticker, 'rise' if spike.percent > 0 else 'drop') in fired
+                        for seq in range(spike.seq, spike.seq + window_batches + 1)))
+    false_alerts = sum(1 for seq, ticker, _ in alerts
+                       if not any(spike.seq <= seq <= spike.seq + window_batches
+                                  for spike in spikes_by_ticker.get(ticker, ())))
+    spikes = len(simulator.spikes_applied)
+    print(f"Alert recall, {args.recall_tickers:,} tickers x {args.recall_batches} batches "
+          f"({args.window}s window, spikes of 3-8%): {caught} of {spikes} spikes caught "
+          f"({caught / max(1, spikes):.0%}), {false_alerts} false alerts out of {len(alerts):,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=100000)
+    parser.add_argument('--batches', type=int, default=20, help="Batches per throughput run")
+    parser.add_argument('--recall-tickers', type=int, default=500)
+    parser.add_argument('--recall-batches', type=int, default=2000)
+    parser.add_argument('--interval', type=float, default=0.01, help="Recall run: seconds between batches")
+    parser.add_argument('--spike-rate', type=float, default=20.0, help="Recall run: random spikes per second")
+    parser.add_argument('--window', type=float, default=1.0, help="Recall run: alert window in seconds")
+    args = parser.parse_args()
+
+    throughput(args)
+    check_determinism(args)
+    check_replay(args)
+    alert_recall(args)
+
+
+if __name__ == "__main__":
+    main()
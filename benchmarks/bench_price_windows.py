@@ -0,0 +1,109 @@
+"""
+Benchmark: sliding-window spike/drop detection (price_windows.py).
+
+Replays a random-walk tick stream across many tickers through PriceWindowMonitor
+and reports ticks/sec. The ticks of a sample of tickers (over the whole stream,
+so their windows fill up) are also run through both the new monitor and the old
+list-rebuilding check from websocket_client.py for comparison, and a small
+sample is verified against a brute-force window min/max.
+
+    python -m benchmarks.bench_price_windows --ticks 5000000 --tickers 5000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from price_windows import PriceWindowMonitor
+
+
+def generate_ticks(count, tickers, ticks_per_second, seed=42):
+    """[(ticker, price, ts)], a random walk per ticker, `ticks_per_second` ticks across all tickers."""
+    rng = random.Random(seed)
+    names = [f"T{i:05d}" for i in range(tickers)]
+    prices = {name: rng.uniform(10, 500) for name in names}
+    ticks = []
+    ts = 1715767200.0
+    step = 1.0 / ticks_per_second
+    for _ in range(count):
+        name = names[rng.randrange(tickers)]
+        price = prices[name] = max(0.01, prices[name] * (1 + rng.gauss(0, 0.0005)))
+        ticks.append((name, price, ts))
+        ts += step
+    return ticks
+
+
+def legacy_replay(ticks, window_seconds, threshold):
+    """The pre-deque algorithm: append, rebuild the list, compare with the oldest price."""
+    recent_prices = {}
+    alerts = 0
+    start = datetime.fromtimestamp(ticks[0][2], timezone.utc)
+    origin = ticks[0][2]
+    for ticker, price, ts in ticks:
+        now = start + timedelta(seconds=ts - origin)
+        history = recent_prices.setdefault(ticker, [])
+        history.append((now, price))
+        cutoff = now - timedelta(seconds=window_seconds)
+        history = recent_prices[ticker] = [(t, p) for t, p in history if t >= cutoff]
+        if len(history) >= 2 and price > history[0][1]:
+            if (price - history[0][1]) / history[0][1] * 100 > threshold:
+                alerts += 1
+    return alerts
+
+
+def check_against_brute_force(ticks, window_seconds):
+    """Recompute every window's min/max from scratch and compare (slow, use a small sample)."""
+    monitor = PriceWindowMonitor(window_seconds=window_seconds)
+    history = {}
+    for ticker, price, ts in ticks:
+        monitor.update(ticker, price, ts)
+        in_window = [(t, p) for t, p in history.get(ticker, []) if t >= ts - window_seconds]
+        in_window.append((ts, price))
+        history[ticker] = in_window
+        window = monitor.windows[ticker]
+        if window.low[1] != min(p for _, p in in_window) or window.high[1] != max(p for _, p in in_window):
+            raise AssertionError(f"Window min/max wrong for {ticker} at {ts}")
+
+
+def replay(ticks, window_seconds):
+    monitor = PriceWindowMonitor(window_seconds=window_seconds)
+    update = monitor.update
+    alerts = 0
+    started = time.perf_counter()
+    for ticker, price, ts in ticks:
+        if update(ticker, price, ts) is not None:
+            alerts += 1
+    return alerts, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=5000000)
+    parser.add_argument('--tickers', type=int, default=5000)
+    parser.add_argument('--ticks-per-second', type=int, default=20000, help="Feed rate across all tickers")
+    parser.add_argument('--window-seconds', type=float, default=60)
+    parser.add_argument('--legacy-tickers', type=int, default=50, help="Tickers replayed through the old algorithm")
+    args = parser.parse_args()
+
+    print(f"Generating {args.ticks:,} ticks across {args.tickers:,} tickers...")
+    ticks = generate_ticks(args.ticks, args.tickers, args.ticks_per_second)
+    check_against_brute_force(ticks[:20000], args.window_seconds)
+
+    alerts, elapsed = replay(ticks, args.window_seconds)
+    print(f"deque windows, all tickers:  {len(ticks):>10,} ticks in {elapsed:6.2f}s "
+          f"({len(ticks) / elapsed:>9,.0f} ticks/s), {alerts:,} alerts")
+
+    sample = {f"T{i:05d}" for i in range(args.legacy_tickers)}
+    sample_ticks = [tick for tick in ticks if tick[0] in sample]
+    alerts, elapsed = replay(sample_ticks, args.window_seconds)
+    print(f"deque windows, {len(sample)} tickers: {len(sample_ticks):>10,} ticks in {elapsed:6.2f}s "
+          f"({len(sample_ticks) / elapsed:>9,.0f} ticks/s), {alerts:,} alerts")
+    started = time.perf_counter()
+    legacy_alerts = legacy_replay(sample_ticks, args.window_seconds, 2.0)
+    elapsed = time.perf_counter() - started
+    print(f"old list check, {len(sample)} tickers: {len(sample_ticks):>9,} ticks in {elapsed:6.2f}s "
+          f"({len(sample_ticks) / elapsed:>9,.0f} ticks/s), {legacy_alerts:,} alerts (rises from the oldest price only)")
+
+
+if __name__ == "__main__":
+    main()
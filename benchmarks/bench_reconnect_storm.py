@@ -0,0 +1,196 @@
+"""
+Reconnect storm: many reconnecting clients (feed_supervisor.py) against an
+in-process mock_server.py that keeps dropping them.
+
+Each round lets the feed run for --steady seconds, then either aborts every
+client connection at once (network blip: the server keeps ticking, so clients
+miss a few batches) or restarts the server (down for --downtime seconds, then
+back with new prices and seq counting from 0 again). Reported per round:
+time-to-recover (event -> each client's first update after reconnecting).
+
+Alert correctness: half the clients mark their windows on a gap, half don't.
+For a few clients of each kind, every alert is compared with a brute-force
+check over the ticks that client actually received, where a window never
+reaches back past a gap. "across a gap" counts alerts comparing a price from
+before a gap with one after it; the gap-marking clients should have none.
+
+    python -m benchmarks.bench_reconnect_storm --clients 100 --rounds 6
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+from datetime import datetime
+
+import mock_server
+from feed_supervisor import Backoff, FeedSupervisor
+from price_windows import PriceWindowMonitor
+
+HOST = 'localhost'
+
+
+class StormClient:
+    """One supervised client with its own price windows; remembers what it saw."""
+
+    def __init__(self, url, mark_gaps, window_seconds, seed):
+        self.monitor = PriceWindowMonitor(window_seconds=window_seconds)
+        self.mark_gaps = mark_gaps
+        self.ticks = [] # (ticker, price, ts)
+        self.alerts = []
+        self.gap_boundaries = [] # ts of the last tick received before each gap
+        self.recovered_at = None
+        self.awaiting_data = False
+        self.supervisor = FeedSupervisor(url, self.on_updates, on_gap=self.on_gap, on_connect=self.on_connect,
+                                         backoff=Backoff(0.1, 2.0, random.Random(seed)), log=lambda line: None)
+
+    async def on_connect(self, websocket):
+        self.awaiting_data = True
+
+    def on_gap(self):
+        if self.ticks:
+            self.gap_boundaries.append(self.ticks[-1][2])
+        if self.mark_gaps:
+            self.monitor.mark_gap()
+
+    def on_updates(self, updates):
+        if self.awaiting_data:
+            self.recovered_at = time.monotonic()
+            self.awaiting_data = False
+        for update in updates:
+            ts = datetime.fromisoformat(update['timestamp']).timestamp()
+            self.ticks.append((update['ticker'], update['price'], ts))
+            alert = self.monitor.update(update['ticker'], update['price'], ts)
+            if alert:
+                self.alerts.append(alert)
+
+
+def alerts_across_gaps(client):
+    return sum(1 for alert in client.alerts
+               if any(alert.from_ts <= boundary < alert.ts for boundary in client.gap_boundaries))
+
+
+def brute_force_alerts(client, window_seconds, rise=2.0, drop=2.0):
+    """(ticker, ts, direction) for every alert the ticks should give, never looking back past a gap."""
+    expected = []
+    history = {}
+    boundaries = client.gap_boundaries
+    next_boundary = 0
+    last_boundary = float('-inf')
+    for ticker, price, ts in client.ticks:
+        while next_boundary < len(boundaries) and boundaries[next_boundary] < ts:
+            last_boundary = boundaries[next_boundary]
+            next_boundary += 1
+        ticks = history.setdefault(ticker, [])
+        ticks.append((ts, price))
+        prices = [p for t, p in ticks if t >= ts - window_seconds and t > last_boundary]
+        low, high = min(prices), max(prices)
+        if low > 0 and (price - low) / low * 100 > rise:
+            expected.append((ticker, ts, 'rise'))
+        elif high > 0 and (high - price) / high * 100 > drop:
+            expected.append((ticker, ts, 'drop'))
+    return expected
+
+
+async def wait_for_recovery(clients, since, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(client.recovered_at is not None and client.recovered_at > since for client in clients):
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def restart_feed_state():
+    """What a freshly started mock_server would have: new random prices, seq from 0."""
+    mock_server.INITIAL_PRICES = {ticker: random.uniform(50, 200) for ticker in mock_server.TICKERS}
+    mock_server.sequence_number = 0
+
+
+async def run_storm(args):
+    mock_server.UPDATE_INTERVAL_SECONDS = args.interval
+    mock_server.PRICE_FLUCTUATION_RANGE = args.fluctuation
+    restart_feed_state()
+    url = f"ws://{HOST}:{args.port}"
+    server = await mock_server.serve(HOST, args.port)
+    broadcaster = asyncio.create_task(mock_server.broadcast_prices())
+
+    clients = [StormClient(url, mark_gaps=index % 2 == 0, window_seconds=args.window, seed=index)
+               for index in range(args.clients)]
+    tasks = [asyncio.create_task(client.supervisor.run()) for client in clients]
+    await wait_for_recovery(clients, 0, args.timeout)
+
+    rounds = []
+    for round_number in range(args.rounds):
+        await asyncio.sleep(args.steady)
+        kind = 'restart' if round_number % 2 else 'drop'
+        event_at = time.monotonic()
+        if kind == 'drop':
+            for websocket in list(mock_server.connected_clients):
+                websocket.transport.abort()
+        else:
+            server.close()
+            await server.wait_closed()
+            await asyncio.sleep(args.downtime)
+            restart_feed_state()
+            server = await mock_server.serve(HOST, args.port)
+        recovered = await wait_for_recovery(clients, event_at, args.timeout)
+        times = sorted(client.recovered_at - event_at for client in clients
+                       if client.recovered_at is not None and client.recovered_at > event_at)
+        rounds.append((kind, recovered, times))
+
+    for client in clients:
+        await client.supervisor.stop()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    broadcaster.cancel()
+    server.close()
+    await server.wait_closed()
+    return clients, rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=6, help="Alternates connection drops and server restarts")
+    parser.add_argument('--steady', type=float, default=3.0, help="Seconds of normal feed between events")
+    parser.add_argument('--downtime', type=float, default=1.0, help="Seconds the server is down on a restart")
+    parser.add_argument('--interval', type=float, default=0.05, help="Seconds between price batches")
+    parser.add_argument('--fluctuation', type=float, default=0.05, help="Max price move per batch")
+    parser.add_argument('--window', type=float, default=10.0, help="Alert window in seconds")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Give up waiting for recovery after this long")
+    parser.add_argument('--verify-clients', type=int, default=4, help="Clients of each kind checked by brute force")
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()): # mock_server prints every (dis)connect
+        clients, rounds = asyncio.run(run_storm(args))
+
+    print(f"{args.clients} clients, {args.rounds} rounds")
+    for kind, recovered, times in rounds:
+        if not times:
+            print(f"  {kind:8} nobody recovered within {args.timeout}s")
+            continue
+        status = "all recovered" if recovered else f"only {len(times)} recovered"
+        print(f"  {kind:8} {status}: p50 {times[len(times) // 2]:.3f}s  "
+              f"p99 {times[int(len(times) * 0.99)]:.3f}s  max {times[-1]:.3f}s")
+    attempts = sum(client.supervisor.attempts for client in clients)
+    connects = sum(client.supervisor.connects for client in clients)
+    print(f"  connection attempts: {attempts:,} for {connects:,} successful connects")
+
+    for mark_gaps in (True, False):
+        group = [client for client in clients if client.mark_gaps == mark_gaps]
+        across = sum(alerts_across_gaps(client) for client in group)
+        alerts = sum(len(client.alerts) for client in group)
+        gaps = sum(client.supervisor.sequence.gaps for client in group)
+        mismatched = 0
+        for client in group[:args.verify_clients]:
+            fired = [(alert.ticker, alert.ts, alert.direction) for alert in client.alerts]
+            mismatched += len(set(fired) ^ set(brute_force_alerts(client, args.window)))
+        label = "marking gaps" if mark_gaps else "ignoring gaps"
+        print(f"  {label:13}: {len(group)} clients, {gaps} gaps seen, {alerts} alerts, {across} across a gap, "
+              f"{mismatched} differences from brute force ({min(len(group), args.verify_clients)} clients checked)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark: per-ticker subscriptions (mock_server.py topic routing) vs everyone
+getting every ticker, with a big universe.
+
+--tickers generated tickers, --clients simulated clients going through the real
+send_stock_updates handler. In the subscribed run each client subscribes to
+--interest tickers (picked with a skew towards popular names, so some clients
+share a set), and half-way through unsubscribes from half of them. Reported per
+run: time to build a batch (encode every ticker once) and to route it
+(publish), bytes per client per batch, and the client-side cost of decoding
+what it gets (json.loads, measured on every --sample-every'th client). The
+sampled subscribed clients are checked to receive exactly their tickers.
+
+    python -m benchmarks.bench_subscriptions --tickers 5000 --clients 1000 --interest 10
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+
+import mock_server
+from feed_supervisor import subscribe_message, unsubscribe_message
+
+
+class SubscribingClient:
+    """Stands in for a server-side connection: reads control messages from an inbox, tallies what it's sent."""
+
+    def __init__(self, index, decode):
+        self.remote_address = ('simulated', index)
+        self.decode = decode
+        self.inbox = asyncio.Queue()
+        self.frames = 0
+        self.bytes = 0
+        self.parse_seconds = 0.0
+        self.tickers_seen = set()
+
+    async def send(self, frame, text=None):
+        self.frames += 1
+        self.bytes += len(frame)
+        if self.decode:
+            started = time.perf_counter()
+            updates = json.loads(frame)
+            self.parse_seconds += time.perf_counter() - started
+            self.tickers_seen.update(update['ticker'] for update in updates)
+
+    async def close(self, code=1000, reason=''):
+        self.inbox.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+def pick_interest(rng, universe, size):
+    """Skewed towards the first tickers in the list, like real watchlists."""
+    picked = set()
+    while len(picked) < size:
+        picked.add(universe[min(len(universe) - 1, int(rng.paretovariate(1.2)) - 1)]
+                   if rng.random() < 0.5 else rng.choice(universe))
+    return picked
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def run(args, subscribe):
+    rng = random.Random(3)
+    mock_server.use_generated_tickers(args.tickers)
+    universe = mock_server.TICKERS
+    clients = [SubscribingClient(index, decode=index % args.sample_every == 0) for index in range(args.clients)]
+    interests = [pick_interest(rng, universe, args.interest) for _ in clients]
+    handlers = [asyncio.create_task(mock_server.send_stock_updates(client)) for client in clients]
+    if subscribe:
+        for client, tickers in zip(clients, interests):
+            client.inbox.put_nowait(subscribe_message(tickers))
+    await settle()
+
+    build, route = [], []
+    for batch in range(args.batches):
+        if subscribe and batch == args.batches // 2:
+            for client, tickers in zip(clients, interests):
+                dropped = set(sorted(tickers)[:len(tickers) // 2])
+                client.inbox.put_nowait(unsubscribe_message(dropped))
+                tickers -= dropped
+                client.tickers_seen = set() # From here on only the remaining tickers should arrive
+            await settle()
+        started = time.perf_counter()
+        batch = mock_server.next_batch()
+        built = time.perf_counter()
+        mock_server.publish(batch)
+        route.append(time.perf_counter() - built)
+        build.append(built - started)
+        await settle() # Let every client's sender deliver
+
+    groups = len(mock_server.subscription_groups)
+    for client in clients:
+        await client.close()
+    await asyncio.gather(*handlers)
+
+    sampled = [(client, tickers) for client, tickers in zip(clients, interests) if client.decode]
+    if subscribe:
+        for client, tickers in sampled:
+            if client.tickers_seen != tickers:
+                raise AssertionError(f"Client {client.remote_address} got {len(client.tickers_seen)} tickers, "
+                                     f"wanted {len(tickers)}")
+    frames = sum(client.frames for client in clients)
+    parse = sum(client.parse_seconds for client, _ in sampled) / sum(client.frames for client, _ in sampled)
+    return {
+        'build_ms': sorted(build)[len(build) // 2] * 1000,
+        'route_ms': sorted(route)[len(route) // 2] * 1000,
+        'bytes_per_frame': sum(client.bytes for client in clients) / frames,
+        'parse_ms': parse * 1000,
+        'groups': groups,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--interest', type=int, default=10, help="Tickers per subscribed client")
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--sample-every', type=int, default=50, help="Decode and check every Nth client's frames")
+    args = parser.parse_args()
+
+    print(f"{args.tickers:,} tickers, {args.clients:,} clients, {args.batches} batches")
+    for subscribe in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()): # The handler prints every (dis)connect
+            result = asyncio.run(run(args, subscribe))
+        label = f"subscribed to {args.interest} (then {args.interest - args.interest // 2})" if subscribe \
+            else "every ticker"
+        print(f"{label}: build batch {result['build_ms']:.1f}ms, route {result['route_ms']:.1f}ms, "
+              f"{result['bytes_per_frame']:,.0f} bytes per client per batch, "
+              f"client decode {result['parse_ms']:.3f}ms per batch ({result['groups']} subscription groups)")
+    print("OK: sampled subscribed clients received exactly their tickers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: recording a day of ticks to tick_log.py and replaying it.
+
+Generates --hours of a feed with --tickers tickers moving every --interval
+seconds (one seq per batch, with a few dropped batches as feed gaps) and, while
+generating, runs the same alert checks the live client does. Then:
+  - record: TickRecorder append rate, segments and bytes on disk
+  - scan: raw TickLog.ticks() throughput
+  - replay: websocket_client.replay_ticks() over everything (same checks as
+    live, as fast as possible); its alerts must match the live ones
+  - filtered replays: one ticker, and one hour, showing what the index skips
+
+    python -m benchmarks.bench_tick_log --tickers 50 --hours 24
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import websocket_client
+from feed_supervisor import SequenceTracker
+from tick_log import TickLog, TickRecorder
+
+START_TS = 1715731200.0 # 2024-05-15 00:00 UTC
+
+
+def generate(args):
+    """(ticker, price, ts, seq) for every tick of the day, in feed order."""
+    rng = random.Random(7)
+    tickers = [f"MOCKSTOCK_{index:04d}" for index in range(args.tickers)]
+    prices = [rng.uniform(50, 200) for _ in tickers]
+    batches = int(args.hours * 3600 / args.interval)
+    for seq in range(1, batches + 1):
+        if rng.random() < args.gap_rate:
+            continue # A batch the client never got
+        ts = START_TS + seq * args.interval
+        for index, ticker in enumerate(tickers):
+            prices[index] = max(0.01, prices[index] * (1 + rng.gauss(0, args.volatility)))
+            yield ticker, round(prices[index], 2), ts, seq
+
+
+def reset_client_state():
+    websocket_client.price_monitor.windows.clear()
+
+
+def live_alert_count(ticks):
+    """What the live client would have alerted on: check_update per tick, windows marked on gaps."""
+    reset_client_state()
+    sequence = SequenceTracker()
+    last_seq = None
+    alerts = 0
+    for ticker, price, ts, seq in ticks:
+        if seq != last_seq:
+            last_seq = seq
+            if sequence.check(seq):
+                websocket_client.mark_feed_gap()
+        alerts += len(websocket_client.check_update(ticker, price, ts, {}))
+    return alerts
+
+
+def timed_replay(directory, **filters):
+    reset_client_state()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # Alert lines
+        ticks, alerts = websocket_client.replay_ticks(directory, **filters)
+    return ticks, alerts, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--hours', type=float, default=24.0)
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between batches")
+    parser.add_argument('--volatility', type=float, default=0.001, help="Std dev of each tick's return")
+    parser.add_argument('--gap-rate', type=float, default=0.0005, help="Fraction of batches dropped")
+    parser.add_argument('--segment-records', type=int, default=1 << 20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='tick-log-')
+    try:
+        ticks = list(generate(args))
+        print(f"{len(ticks):,} ticks: {args.tickers} tickers every {args.interval}s for {args.hours}h")
+        live_alerts = live_alert_count(ticks)
+
+        recorder = TickRecorder(directory, args.segment_records)
+        started = time.perf_counter()
+        for ticker, price, ts, seq in ticks:
+            recorder.append(ticker, price, ts, seq)
+        recorder.close()
+        elapsed = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        segments = len([name for name in os.listdir(directory) if name.endswith('.ticks')])
+        print(f"  record:  {len(ticks) / elapsed:12,.0f} ticks/s  ({elapsed:.1f}s, {segments} segments, "
+              f"{size / 1e6:.0f}MB)")
+
+        log = TickLog(directory)
+        started = time.perf_counter()
+        scanned = 0
+        checksum = 0.0
+        for _, price, _, _, _ in log.ticks():
+            scanned += 1
+            checksum += price
+        elapsed = time.perf_counter() - started
+        log.close()
+        if scanned != len(ticks) or abs(checksum - sum(tick[1] for tick in ticks)) > 1e-3:
+            raise AssertionError("The log doesn't hold what was recorded")
+        print(f"  scan:    {scanned / elapsed:12,.0f} ticks/s  ({elapsed:.1f}s)")
+
+        replayed, alerts, elapsed = timed_replay(directory)
+        print(f"  replay:  {replayed / elapsed:12,.0f} ticks/s  ({elapsed:.1f}s for the whole day, {alerts} alerts)")
+        if replayed != len(ticks) or alerts != live_alerts:
+            raise AssertionError(f"Replay gave {alerts} alerts over {replayed} ticks, live had {live_alerts}")
+
+        replayed, _, elapsed = timed_replay(directory, tickers={'MOCKSTOCK_0000'})
+        print(f"  one ticker: {replayed:,} ticks in {elapsed:.2f}s")
+        noon = START_TS + 12 * 3600
+        replayed, _, elapsed = timed_replay(directory, start=noon, end=noon + 3600)
+        print(f"  one hour:   {replayed:,} ticks in {elapsed:.2f}s")
+        print(f"OK: replay matches the recording and the live alerts ({live_alerts})")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark for the streaming trade analyzer (trade_analyzer.py).
+
+Generates a trades CSV of the requested size (1 GB by default), then runs the
+analyzer on it in a child process and reports wall-clock time, throughput and
+peak memory. Peak memory should stay flat as --size-mb grows.
+
+    python -m benchmarks.bench_trade_analyzer --size-mb 1024
+    python -m benchmarks.bench_trade_analyzer --size-mb 4096 --keep /tmp/trades_4g.csv
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TICKERS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN", "NVDA", "META", "NFLX", "AMD", "INTC"]
+
+
+def generate_trades_csv(path, size_bytes=None, rows=None, seed=42):
+    """
+    Write random trades to `path` until the file is at least `size_bytes` long
+    (or has exactly `rows` data rows). Returns the number of rows written.
+    """
+    rng = random.Random(seed)
+    rows_written = 0
+    with open(path, 'w', newline='') as out:
+        out.write("ticker,price,quantity,side,timestamp\n")
+        written = out.tell()
+        while (rows is None and written < size_bytes) or (rows is not None and rows_written < rows):
+            # Build ~1 MB of rows at a time so generation isn't the slow part
+            batch = 20000 if rows is None else min(20000, rows - rows_written)
+            lines = []
+            for _ in range(batch):
+                lines.append(
+                    f"{rng.choice(TICKERS)},{rng.uniform(10, 500):.2f},{rng.randint(1, 1000)},"
+                    f"{'BUY' if rng.random() < 0.5 else 'SELL'},2024-05-15T10:00:00Z\n"
+                )
+            block = ''.join(lines)
+            out.write(block)
+            written += len(block)
+            rows_written += len(lines)
+    return rows_written
+
+
+def run_analyzer(path):
+    """Run trade_analyzer.py on `path` in a child process; return (seconds, peak RSS in MB)."""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, 'trade_analyzer.py'), path, '-o', os.devnull],
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KB on Linux (bytes on macOS)
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+    return elapsed, peak_rss_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=1024, help="Size of the generated trades file")
+    parser.add_argument('--keep', help="Write the generated file here and keep it (reused if it already exists)")
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), 'trades.csv')
+    try:
+        if not os.path.exists(path):
+            print(f"Generating {args.size_mb} MB of trades at {path}...")
+            rows = generate_trades_csv(path, size_bytes=args.size_mb * 1024 * 1024)
+            print(f"  {rows:,} rows")
+
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        elapsed, peak_rss_mb = run_analyzer(path)
+        print(f"Analyzed {size_mb:,.0f} MB in {elapsed:.1f}s ({size_mb / elapsed:,.1f} MB/s), "
+              f"peak RSS {peak_rss_mb:,.1f} MB")
+    finally:
+        if not args.keep and os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
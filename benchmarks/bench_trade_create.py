@@ -0,0 +1,183 @@
+"""
+Load test: trade creation under WSGI (POST /api/trades/) vs ASGI (POST /api/trades/async/).
+
+Start both servers first, against the same database, with the same number of processes:
+    gunicorn trading_system.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    uvicorn trading_system.asgi:application --workers 4 --port 8001
+then
+    python -m benchmarks.bench_trade_create --clients 1000 --requests 50000 \\
+        --target wsgi=http://127.0.0.1:8000/api/trades/ \\
+        --target asgi=http://127.0.0.1:8001/api/trades/async/
+
+Each of --clients clients keeps one keep-alive connection and POSTs trades back
+to back until --requests have been sent to that target. Reported per target:
+requests/s, p50 / p99 / max latency of the 201s, and errors by kind. Targets
+run one after the other.
+
+The trades are real rows, all with ticker --ticker on 2000-01-03, so they are easy
+to delete afterwards:
+    python manage.py shell -c "from trades_api.models import Trade; Trade.objects.filter(ticker='LOADT').delete()"
+(and the matching DailyTickerStats row).
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+class HTTPConnection:
+    """Just enough HTTP/1.1 over asyncio streams for POSTing JSON on a keep-alive connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    @property
+    def open(self):
+        return self.writer is not None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def post_json(self, path, body):
+        """(status, response body). The server may close the connection afterwards; .open tells."""
+        head = (f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            response_body = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            response_body = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2) # Chunk + CRLF
+                if not size:
+                    break
+                response_body += chunk[:-2]
+        else:
+            response_body = await self.reader.read() # Body runs to the end of the connection
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_body
+
+
+def trade_body(rng, ticker):
+    second = rng.randrange(6 * 3600)
+    return json.dumps({
+        'ticker': ticker,
+        'price': f"{rng.uniform(10, 500):.2f}",
+        'quantity': rng.randint(1, 1000),
+        'side': rng.choice(['BUY', 'SELL']),
+        'timestamp': f"2000-01-03T{9 + second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}Z",
+    }).encode('utf-8')
+
+
+async def run_target(url, args):
+    """(latencies of the 201s, errors Counter, elapsed seconds) for --requests POSTs from --clients clients."""
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    remaining = args.requests
+    latencies = []
+    errors = Counter()
+
+    async def client(index):
+        nonlocal remaining
+        rng = random.Random(index)
+        connection = HTTPConnection(parts.hostname, parts.port or 80)
+        while remaining > 0:
+            remaining -= 1
+            body = trade_body(rng, args.ticker)
+            started = time.perf_counter()
+            try:
+                if not connection.open:
+                    await asyncio.wait_for(connection.connect(), args.timeout)
+                status, _ = await asyncio.wait_for(connection.post_json(path, body), args.timeout)
+            except asyncio.TimeoutError:
+                errors['timeout'] += 1
+                connection.close()
+                continue
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                errors[type(e).__name__] += 1
+                connection.close()
+                continue
+            if status == 201:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors[f"HTTP {status}"] += 1
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client(index) for index in range(args.clients)])
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def raise_open_file_limit(wanted):
+    # One socket per client, and the default soft limit is often 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, metavar='LABEL=URL',
+                        help="Endpoint to load, e.g. asgi=http://127.0.0.1:8001/api/trades/async/ (repeatable)")
+    parser.add_argument('--clients', type=int, default=1000, help="Concurrent clients (one connection each)")
+    parser.add_argument('--requests', type=int, default=20000, help="POSTs per target")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Seconds before a request counts as failed")
+    parser.add_argument('--ticker', default='LOADT', help="Ticker for every trade (1-5 uppercase letters)")
+    args = parser.parse_args()
+    targets = [target.split('=', 1) if '=' in target else (target, target) for target in args.target]
+    raise_open_file_limit(args.clients + 100)
+
+    print(f"{args.clients} clients, {args.requests} requests per target")
+    rates = {}
+    for label, url in targets:
+        latencies, errors, elapsed = asyncio.run(run_target(url, args))
+        rates[label] = len(latencies) / elapsed
+        line = f"  {label:8} {rates[label]:9,.0f} req/s"
+        if latencies:
+            line += (f"  p50 {percentile(latencies, 0.5) * 1000:8.1f}ms  p99 {percentile(latencies, 0.99) * 1000:8.1f}ms"
+                     f"  max {max(latencies) * 1000:8.1f}ms")
+        line += f"  {len(latencies)} ok"
+        if errors:
+            line += "  errors: " + ", ".join(f"{kind} x{count}" for kind, count in errors.most_common())
+        print(line)
+    if len(targets) == 2 and all(rates.values()):
+        (first, _), (second, _) = targets
+        print(f"{second} / {first}: {rates[second] / rates[first]:.2f}x requests/s")
+
+
+if __name__ == "__main__":
+    main()
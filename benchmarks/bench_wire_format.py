@@ -0,0 +1,142 @@
+"""
+Benchmark: JSON vs binary frames (wire_format.py) on the mock feed.
+
+Two simulated clients go through mock_server.py's real handler, one left on
+JSON and one that asks for binary. Both get --batches batches of --tickers
+tickers (--interest of them each if set). Reported per format: bytes per tick
+on the wire (plus the one-off symbol table for binary) and client decode
+throughput: JSON the way the classic and pipeline clients decode it
+(json.loads + datetime.fromisoformat per update), binary with FeedDecoder.
+The binary client's updates are checked against the JSON client's.
+
+    python -m benchmarks.bench_wire_format --tickers 1000 --batches 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+from datetime import datetime
+
+import mock_server
+from feed_supervisor import subscribe_message
+from wire_format import FORMAT_BINARY, FeedDecoder, format_message, is_binary_frame
+
+
+class RecordingClient:
+    """Stands in for a server-side connection: sends the given control messages, keeps every frame it's sent."""
+
+    def __init__(self, index, messages):
+        self.remote_address = ('simulated', index)
+        self.inbox = asyncio.Queue()
+        for message in messages:
+            self.inbox.put_nowait(message)
+        self.frames = []
+
+    async def send(self, frame, text=None):
+        self.frames.append(frame)
+
+    async def close(self, code=1000, reason=''):
+        self.inbox.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+async def collect(args):
+    """Frames a JSON client and a binary client receive for the same batches."""
+    mock_server.use_generated_tickers(args.tickers)
+    interest = []
+    if args.interest:
+        interest = [subscribe_message(random.Random(5).sample(mock_server.TICKERS, args.interest))]
+    json_client = RecordingClient(0, interest)
+    binary_client = RecordingClient(1, interest + [format_message(FORMAT_BINARY)])
+    handlers = [asyncio.create_task(mock_server.send_stock_updates(client)) for client in (json_client, binary_client)]
+    for _ in range(3):
+        await asyncio.sleep(0) # Let the control messages through
+    for _ in range(args.batches):
+        mock_server.publish(mock_server.next_batch())
+        await asyncio.sleep(0)
+    for client in (json_client, binary_client):
+        await client.close()
+    await asyncio.gather(*handlers)
+    # JSON frames arrive as text on a real connection
+    return [frame.decode('utf-8') for frame in json_client.frames], binary_client.frames
+
+
+def decode_json(frames):
+    ticks = []
+    for frame in frames:
+        for update in json.loads(frame):
+            ticks.append((update['ticker'], float(update['price']),
+                          datetime.fromisoformat(update['timestamp'].replace('Z', '+00:00')).timestamp()))
+    return ticks
+
+
+def decode_binary(frames):
+    decoder = FeedDecoder()
+    ticks = []
+    for frame in frames:
+        ticks.extend((update['ticker'], update['price'], update['ts']) for update in decoder.decode(frame))
+    return ticks
+
+
+def timed(decode, frames, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        ticks = decode(frames)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return ticks, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=1000)
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--interest', type=int, default=0, help="Subscribe both clients to this many tickers")
+    parser.add_argument('--repeat', type=int, default=3, help="Decode runs per format (best is reported)")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()): # The handler prints every (dis)connect
+        json_frames, binary_frames = asyncio.run(collect(args))
+    symbol_table = [frame for frame in binary_frames if not is_binary_frame(frame)]
+    data_frames = [frame for frame in binary_frames if is_binary_frame(frame)]
+    if len(symbol_table) != 1 or len(data_frames) != len(json_frames):
+        raise AssertionError(f"Binary client got {len(symbol_table)} symbol tables and {len(data_frames)} frames, "
+                             f"JSON client {len(json_frames)} frames")
+
+    results = [
+        ("JSON", json_frames, decode_json),
+        ("binary", binary_frames, decode_binary),
+    ]
+    decoded = {}
+    per_tick = args.interest or args.tickers
+    print(f"{per_tick:,} tickers per frame, {len(json_frames)} frames")
+    for label, frames, decode in results:
+        ticks, seconds = timed(decode, frames, args.repeat)
+        decoded[label] = ticks
+        wire_bytes = sum(len(frame) for frame in frames if label != "binary" or is_binary_frame(frame))
+        print(f"  {label:22} {wire_bytes / len(ticks):6.1f} bytes/tick  "
+              f"decode {len(ticks) / seconds:12,.0f} ticks/s")
+    print(f"  binary symbol table: {len(symbol_table[0]):,} bytes, once per connection")
+
+    expected = decoded["JSON"]
+    got = decoded["binary"]
+    if len(got) != len(expected) or any(a[0] != b[0] or a[1] != b[1] or abs(a[2] - b[2]) > 1e-6
+                                        for a, b in zip(expected, got)):
+        raise AssertionError("Binary updates differ from the JSON ones")
+    print("OK: binary updates match the JSON ones (ticker, price, timestamp)")
+
+
+if __name__ == "__main__":
+    main()
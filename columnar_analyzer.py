@@ -0,0 +1,368 @@
+"""
+Vectorized (NumPy) engine for the trade analysis. Select it with engine='numpy'
+(the Lambda event flag "engine": "numpy", or --engine numpy on the command line).
+
+Instead of splitting, converting and adding up one row at a time in Python, the
+input is read in large byte blocks and each block is parsed straight into NumPy
+column arrays: comma/newline positions are found with one vector compare, and
+the ticker, price, quantity and side fields are decoded from the raw bytes with
+array arithmetic. Per-ticker totals are then grouped reductions over integer
+ticker codes. Output matches TradeAnalyzer (trade_analyzer.py).
+
+Prices are parsed as fixed-point integers (1/10000ths) directly from their digits,
+never through a float, so sums of price * quantity are exact integer arithmetic.
+
+Blocks the fast parser can't handle exactly (quoted fields, blank or short lines,
+signs/exponents/spaces in numbers, more than 4 decimals...) go through the csv
+module instead, with the same rules as the row-by-row engine. The one difference:
+rows the fixed-point totals can't hold exactly (nan/inf prices, prices with more
+than 4 decimals, numbers longer than 15 digits) are skipped as malformed rather
+than rounded or overflowed.
+"""
+import csv
+import io
+import math
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+
+from trade_analyzer import DEFAULT_READ_CHUNK_SIZE, SIDE_CODES, TradeAnalyzer, format_price, iter_text_lines
+
+DEFAULT_BLOCK_BYTES = 16 * 1024 * 1024 # Bytes parsed per NumPy block
+DEFAULT_BLOCK_ROWS = 100000 # Rows per block on the csv (slow) path
+PRICE_DECIMALS = 4
+PRICE_SCALE = 10 ** PRICE_DECIMALS # Fixed-point: 170.5 is stored as 1705000
+MAX_NUMBER_DIGITS = 15 # Keeps every parsed number (and price * quantity sums) well inside int64
+POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+MAX_NUMBER = 10 ** MAX_NUMBER_DIGITS
+
+NEWLINE, CARRIAGE_RETURN, COMMA, DOT, ZERO = (ord(c) for c in '\n\r,.0')
+
+
+def field_bytes(buf, starts, lengths, offset):
+    """Byte `offset` of each field, or 0 where the field is shorter than that."""
+    chars = buf[np.minimum(starts + offset, len(buf) - 1)]
+    return np.where(offset < lengths, chars, 0)
+
+
+def price_to_ticks(text):
+    """
+    csv path: parse one price into exact 1/10000ths. Raises ValueError if it isn't a
+    finite number with at most 4 decimals that fits in MAX_NUMBER_DIGITS digits.
+    """
+    price = float(text) # Same syntax the row-by-row engine accepts
+    if not math.isfinite(price):
+        raise ValueError(f"price is not a finite number: {text!r}")
+    # Decimal keeps every digit, so "170.12345" can't be rounded to 170.1235 on the way
+    ticks = Decimal(text) * PRICE_SCALE
+    if ticks != ticks.to_integral_value():
+        raise ValueError(f"price has more than {PRICE_DECIMALS} decimals: {text!r}")
+    if abs(ticks) >= MAX_NUMBER:
+        raise ValueError(f"price is too large: {text!r}")
+    return int(ticks)
+
+
+def parse_quantity(text):
+    """csv path: parse one quantity, raising ValueError if it's longer than MAX_NUMBER_DIGITS digits."""
+    quantity = int(text)
+    if abs(quantity) >= MAX_NUMBER:
+        raise ValueError(f"quantity is too large: {text!r}")
+    return quantity
+
+
+def parse_fixed_point(buf, starts, lengths, decimals):
+    """
+    Parse unsigned decimal fields ("170.5", "100", ".25") into integers scaled by
+    10**decimals, exactly. Returns None if any field isn't a plain number with at
+    most `decimals` decimal places.
+    Works one character position at a time (value = value * 10 + digit) across
+    all rows at once, so the loop runs as many times as the longest field is wide.
+    """
+    if len(lengths) == 0 or lengths.min() == 0 or lengths.max() > MAX_NUMBER_DIGITS + 1:
+        return None
+    values = np.zeros(len(starts), dtype=np.int64)
+    digit_count = np.zeros(len(starts), dtype=np.int64)
+    fraction_digits = np.zeros(len(starts), dtype=np.int64)
+    seen_dot = np.zeros(len(starts), dtype=bool)
+    for offset in range(int(lengths.max())):
+        in_field = offset < lengths
+        chars = field_bytes(buf, starts, lengths, offset)
+        is_dot = in_field & (chars == DOT)
+        digits = chars.astype(np.int64) - ZERO
+        is_digit = in_field & ~is_dot
+        if np.any(is_digit & ((digits < 0) | (digits > 9))) or np.any(is_dot & seen_dot):
+            return None
+        values = np.where(is_digit, values * 10 + digits, values)
+        digit_count += is_digit
+        fraction_digits += is_digit & seen_dot
+        seen_dot |= is_dot
+    if digit_count.min() == 0 or fraction_digits.max() > decimals:
+        return None
+    if (digit_count + decimals - fraction_digits).max() > MAX_NUMBER_DIGITS:
+        return None
+    return values * POW10[decimals - fraction_digits]
+
+
+def ticker_keys(buf, starts, lengths):
+    """
+    One fixed-width key per ticker field so np.unique can group them:
+    tickers of up to 8 bytes are packed into a uint64, longer ones into bytes strings.
+    """
+    width = int(lengths.max())
+    padded_width = 8 if width <= 8 else width
+    packed = np.zeros((len(starts), padded_width), dtype=np.uint8)
+    for offset in range(width):
+        packed[:, offset] = field_bytes(buf, starts, lengths, offset)
+    if padded_width == 8:
+        return packed.view(np.uint64).ravel()
+    return packed.view(f'S{padded_width}').ravel()
+
+
+class PrefixedStream:
+    """A .read(n) stream that returns `head` first, then the rest of `stream`."""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size):
+        if self.head:
+            head, self.head = self.head, b''
+            return head
+        return self.stream.read(size)
+
+
+class ColumnarTradeAnalyzer(TradeAnalyzer):
+    """Same interface and output as TradeAnalyzer, computed a block at a time with NumPy."""
+
+    def __init__(self, block_bytes=DEFAULT_BLOCK_BYTES, block_rows=DEFAULT_BLOCK_ROWS):
+        super().__init__()
+        self.block_bytes = block_bytes
+        self.block_rows = block_rows
+        # {'TICKER': [total_volume, notional_ticks, trade_count, min_ticks, max_ticks, buy_volume, sell_volume]}
+        # Plain Python ints, so the running totals can never overflow.
+        self.stock_analysis = {}
+
+    # --- Reading ---
+
+    def consume_stream(self, stream, chunk_size=DEFAULT_READ_CHUNK_SIZE):
+        """Aggregate a binary CSV stream, parsing about block_bytes at a time."""
+        read_size = max(chunk_size, self.block_bytes)
+        pending = b''
+        columns = None
+        while True:
+            chunk = stream.read(read_size)
+            if chunk:
+                pending += chunk
+                cut = pending.rfind(b'\n') + 1 # Only parse whole lines
+                if cut == 0:
+                    continue
+                block, pending = pending[:cut], pending[cut:]
+            else:
+                if not pending:
+                    break
+                block, pending = pending + b'\n', b''
+
+            if columns is None:
+                header_end = block.index(b'\n') + 1
+                columns = self.read_header(csv.reader([block[:header_end].decode('utf-8')]))
+                block = block[header_end:]
+            if b'"' in block:
+                # Quoted fields can hide commas and newlines (even across blocks), so
+                # hand the rest of the input to the csv path as one continuous stream.
+                rest = iter_text_lines(PrefixedStream(block + pending, stream), read_size)
+                self.consume_rows(filter(None, csv.reader(rest)), columns)
+                break
+            if block:
+                self.consume_bytes(block, columns)
+            if not chunk:
+                break
+        return self
+
+    def consume_lines(self, lines):
+        """Aggregate CSV text lines (header first), one block of rows at a time."""
+        reader = csv.reader(lines)
+        columns = self.read_header(reader)
+        if columns is None:
+            return self
+        self.consume_rows(filter(None, reader), columns) # filter(None) skips blank lines
+        return self
+
+    def consume_rows(self, rows, columns):
+        """csv path: aggregate parsed rows in blocks of block_rows."""
+        while True:
+            block = list(islice(rows, self.block_rows))
+            if not block:
+                break
+            self.records_processed += len(block)
+            arrays = self.rows_to_arrays(block, columns)
+            if arrays is not None:
+                self.aggregate(*arrays)
+
+    def consume_bytes(self, block, columns):
+        """Fast path for a block of whole lines; falls back to the csv path if needed."""
+        arrays = self.bytes_to_arrays(block, columns)
+        if arrays is None:
+            self.consume_rows(filter(None, csv.reader(io.StringIO(block.decode('utf-8')))), columns)
+            return
+        self.records_processed += len(arrays[1])
+        self.aggregate(*arrays)
+
+    def consume_partition(self, ticker, price_ticks, quantities, side_codes, price_scale):
+        """Aggregate one ticker's already-parsed columns (see columnar_store.py), zero-copy."""
+        if price_scale != PRICE_SCALE:
+            raise ValueError(f"Columnar data uses price scale {price_scale}, this engine needs {PRICE_SCALE}")
+        quantities = np.frombuffer(quantities, dtype=np.int64)
+        if not len(quantities):
+            return
+        self.records_processed += len(quantities)
+        side_codes = np.frombuffer(side_codes, dtype=np.int8)
+        # Every row is the same ticker, so it's a single group
+        self.aggregate(lambda row: ticker, np.zeros(len(quantities), dtype=np.uint8),
+                       np.frombuffer(price_ticks, dtype=np.int64), quantities,
+                       side_codes == SIDE_CODES['BUY'], side_codes == SIDE_CODES['SELL'])
+
+    # --- Parsing ---
+
+    def bytes_to_arrays(self, block, columns):
+        """
+        Parse a block of complete, unquoted CSV lines into column arrays:
+        (ticker name for each key, ticker keys, price ticks, quantities, buy mask, sell mask).
+        Returns None if the block needs the csv path.
+        """
+        ticker_idx, price_idx, quantity_idx, side_idx = columns
+        if b'"' in block:
+            return None
+        buf = np.frombuffer(block, dtype=np.uint8)
+        line_ends = np.flatnonzero(buf == NEWLINE)
+        commas = np.flatnonzero(buf == COMMA)
+        row_count = len(line_ends)
+        # Every line must have exactly as many fields as the header
+        commas_per_line = len(self.header_fields) - 1
+        if len(commas) != row_count * commas_per_line:
+            return None
+        if np.any(np.diff(np.searchsorted(commas, line_ends), prepend=0) != commas_per_line):
+            return None
+
+        line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+        # Drop the '\r' of Windows line endings from the last field
+        last_ends = line_ends - (buf[np.maximum(line_ends - 1, 0)] == CARRIAGE_RETURN)
+        commas = commas.reshape(row_count, commas_per_line)
+
+        def field(index):
+            start = line_starts if index == 0 else commas[:, index - 1] + 1
+            end = last_ends if index == commas_per_line else commas[:, index]
+            return start, end - start
+
+        ticker_starts, ticker_lengths = field(ticker_idx)
+        if ticker_lengths.min() == 0:
+            return None
+        price_ticks = parse_fixed_point(buf, *field(price_idx), PRICE_DECIMALS)
+        quantities = parse_fixed_point(buf, *field(quantity_idx), 0)
+        if price_ticks is None or quantities is None:
+            return None
+
+        keys = ticker_keys(buf, ticker_starts, ticker_lengths)
+        if side_idx is not None:
+            side_starts, side_lengths = field(side_idx)
+            is_buy = self.field_equals(buf, side_starts, side_lengths, b'BUY')
+            is_sell = self.field_equals(buf, side_starts, side_lengths, b'SELL')
+        else:
+            is_buy = is_sell = np.zeros(row_count, dtype=bool)
+
+        def ticker_name(row):
+            start = ticker_starts[row]
+            return block[start:start + ticker_lengths[row]].decode('utf-8')
+
+        return ticker_name, keys, price_ticks, quantities, is_buy, is_sell
+
+    @staticmethod
+    def field_equals(buf, starts, lengths, value):
+        matches = lengths == len(value)
+        for offset, byte in enumerate(value):
+            matches &= buf[np.minimum(starts + offset, len(buf) - 1)] == byte
+        return matches
+
+    def read_header(self, reader):
+        # Remember how many fields a line has, for the fast path's sanity check
+        header = next(reader, None)
+        self.header_fields = header or []
+        return super().read_header(iter([header]) if header is not None else iter([]))
+
+    def rows_to_arrays(self, block, columns):
+        """
+        csv path: turn parsed rows into the same column arrays as bytes_to_arrays,
+        using the same parsing rules (float/int) as the row-by-row engine, plus
+        the fixed-point limits (see price_to_ticks / parse_quantity).
+        Returns None if no row in the block is usable.
+        """
+        ticker_idx, price_idx, quantity_idx, side_idx = columns
+        needed = max(i for i in columns if i is not None) + 1
+        tickers, price_ticks, quantities, sides = [], [], [], []
+        for row in block:
+            try:
+                if len(row) < needed:
+                    raise IndexError("not enough columns")
+                ticks = price_to_ticks(row[price_idx])
+                quantity = parse_quantity(row[quantity_idx])
+            except (ValueError, IndexError) as e:
+                self.log_malformed(row, e)
+                continue
+            tickers.append(row[ticker_idx])
+            price_ticks.append(ticks)
+            quantities.append(quantity)
+            sides.append(row[side_idx] if side_idx is not None else '')
+        if not tickers:
+            return None
+
+        tickers = np.array(tickers)
+        sides = np.array(sides)
+        return (lambda row: str(tickers[row])), tickers, np.array(price_ticks, dtype=np.int64), \
+            np.array(quantities, dtype=np.int64), sides == 'BUY', sides == 'SELL'
+
+    # --- Aggregation ---
+
+    def aggregate(self, ticker_name, keys, price_ticks, quantities, is_buy, is_sell):
+        """Grouped per-ticker reductions for one block, folded into the running totals."""
+        unique_keys, first_index, codes = np.unique(keys, return_index=True, return_inverse=True)
+
+        # Sort rows by ticker code once, then every per-ticker sum/min/max is a
+        # single reduceat over contiguous runs.
+        order = np.argsort(codes, kind='stable')
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(codes[order])) + 1))
+        price_ticks = price_ticks[order]
+        quantities = quantities[order]
+
+        if float(np.abs(price_ticks).max()) * float(np.abs(quantities).max()) * len(quantities) < 2 ** 63:
+            notional_per_trade = price_ticks * quantities
+        else:
+            # Python ints: slow, but a block of huge trades can't overflow
+            notional_per_trade = price_ticks.astype(object) * quantities.astype(object)
+
+        volume = np.add.reduceat(quantities, starts)
+        notional = np.add.reduceat(notional_per_trade, starts)
+        trade_count = np.diff(np.append(starts, len(quantities)))
+        min_price = np.minimum.reduceat(price_ticks, starts)
+        max_price = np.maximum.reduceat(price_ticks, starts)
+        buy_volume = np.add.reduceat(np.where(is_buy[order], quantities, 0), starts)
+        sell_volume = np.add.reduceat(np.where(is_sell[order], quantities, 0), starts)
+
+        # Fold into the running totals (one step per ticker, not per row), in
+        # first-seen order so output order matches the row-by-row engine.
+        for code in np.argsort(first_index, kind='stable'):
+            ticker = ticker_name(first_index[code])
+            self.merge_totals(ticker, [int(volume[code]), int(notional[code]), int(trade_count[code]),
+                                       int(min_price[code]), int(max_price[code]),
+                                       int(buy_volume[code]), int(sell_volume[code])])
+
+    def results(self):
+        """Yield one output row per ticker, same columns and formatting as TradeAnalyzer."""
+        for ticker, totals in self.stock_analysis.items():
+            total_volume, notional_ticks, trade_count, min_ticks, max_ticks, buy_volume, sell_volume = totals
+            average_price = 0
+            if total_volume > 0: # Avoid division by zero if no volume for a ticker
+                average_price = notional_ticks / (total_volume * PRICE_SCALE)
+            yield [ticker, total_volume, format_price(average_price), format_price(min_ticks / PRICE_SCALE),
+                   format_price(max_ticks / PRICE_SCALE), buy_volume, sell_volume, trade_count]
@@ -0,0 +1,307 @@
+"""
+Compact columnar copy of the daily trades files, stored next to the CSV:
+
+    2024/05/15/trades.csv
+    2024/05/15/trades.columnar/_manifest.json
+    2024/05/15/trades.columnar/ticker=AAPL/part-00000/price.i64
+    2024/05/15/trades.columnar/ticker=AAPL/part-00000/quantity.i64
+    2024/05/15/trades.columnar/ticker=AAPL/part-00000/side.i8
+    2024/05/15/trades.columnar/ticker=AAPL/part-00000/timestamp.txt
+    ...
+
+Partitioned by date (the existing YEAR/MONTH/DAY prefix) and by ticker, with one
+file per column, Parquet-style but without needing pyarrow:
+  price.i64      little-endian int64, price * price_scale (10000, so 4 decimals)
+  quantity.i64   little-endian int64
+  side.i8        int8: 1 = BUY, 2 = SELL, 0 = anything else
+  timestamp.txt  the original timestamp strings, one per line
+Large files are written in row groups (part-00000, part-00001, ...), so the
+converter never holds a whole day in memory. The manifest is written last and
+lists the partitions in first-seen ticker order, plus the malformed row count.
+
+The analysis reads only the manifest and the price/quantity/side files of the
+tickers it needs (no ticker or timestamp column, no text parsing).
+Everything goes through an S3-style client (get_object / put_object), so it
+works the same on S3 and on a local directory with LocalS3Client.
+
+    python columnar_store.py convert ./s3/my-bucket            # every trades.csv under a local tree
+    python columnar_store.py convert --bucket my-bucket --prefix 2024/05/
+    python columnar_store.py analyze ./s3/my-bucket/2024/05/15/trades.columnar --tickers AAPL,MSFT
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from array import array
+from urllib.parse import quote
+
+from trade_analyzer import (DEFAULT_READ_CHUNK_SIZE, SIDE_CODES, LocalS3Client, TradeAnalyzer,
+                            get_analyzer, iter_text_lines)
+
+FORMAT_NAME = 'trades-columnar'
+FORMAT_VERSION = 1
+PRICE_SCALE = 10000 # Prices stored as integer 1/10000ths
+DEFAULT_ROW_GROUP_SIZE = 1000000 # Rows buffered (across all tickers) before a part is written
+MANIFEST_NAME = '_manifest.json'
+# Column name -> (file name, array typecode)
+COLUMNS = {
+    'price': ('price.i64', 'q'),
+    'quantity': ('quantity.i64', 'q'),
+    'side': ('side.i8', 'b'),
+}
+TIMESTAMP_FILE = 'timestamp.txt'
+ANALYSIS_COLUMNS = ('price', 'quantity', 'side') # All the analysis ever reads
+
+
+def columnar_prefix(csv_key):
+    """'2024/05/15/trades.csv' -> '2024/05/15/trades.columnar'"""
+    base = csv_key[:-len('.csv')] if csv_key.endswith('.csv') else csv_key
+    return base + '.columnar'
+
+
+def partition_path(ticker):
+    # Quote the ticker so odd characters (like '/') can't escape the partition folder
+    return f"ticker={quote(ticker, safe='')}"
+
+
+def to_little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(data, typecode):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def read_object(s3_client, bucket_name, key):
+    """Whole object as bytes (always closes the body)."""
+    body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body']
+    try:
+        return body.read()
+    finally:
+        body.close()
+
+
+class ColumnarTradesWriter:
+    """
+    Buffers rows per ticker and writes a row group (one part per ticker) every
+    row_group_size rows. Call close() at the end to write the last part and the manifest.
+    """
+
+    def __init__(self, s3_client, bucket_name, prefix, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.row_group_size = row_group_size
+        self.partitions = {} # {'AAPL': {'ticker': 'AAPL', 'path': ..., 'rows': n, 'parts': [...]}}, first-seen order
+        self.buffers = {} # {'AAPL': (prices, quantities, sides, timestamps)}
+        self.buffered_rows = 0
+        self.part_number = 0
+        self.records_processed = 0
+        self.malformed_records = 0
+        self.bytes_written = 0
+
+    def add(self, ticker, price_ticks, quantity, side_code, timestamp):
+        buffer = self.buffers.get(ticker)
+        if buffer is None:
+            buffer = self.buffers[ticker] = (array('q'), array('q'), array('b'), [])
+            if ticker not in self.partitions:
+                self.partitions[ticker] = {'ticker': ticker, 'path': partition_path(ticker), 'rows': 0, 'parts': []}
+        prices, quantities, sides, timestamps = buffer
+        prices.append(price_ticks)
+        quantities.append(quantity)
+        sides.append(side_code)
+        timestamps.append(timestamp)
+        self.buffered_rows += 1
+        if self.buffered_rows >= self.row_group_size:
+            self.flush()
+
+    def put(self, key, data):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data,
+                                  ContentType='application/octet-stream')
+        self.bytes_written += len(data)
+
+    def flush(self):
+        """Write the buffered rows as part-NNNNN of each ticker that has any."""
+        if not self.buffered_rows:
+            return
+        part_name = f"part-{self.part_number:05d}"
+        for ticker, (prices, quantities, sides, timestamps) in self.buffers.items():
+            partition = self.partitions[ticker]
+            part_prefix = f"{self.prefix}/{partition['path']}/{part_name}"
+            for column, values in (('price', prices), ('quantity', quantities), ('side', sides)):
+                self.put(f"{part_prefix}/{COLUMNS[column][0]}", to_little_endian(values))
+            # Timestamps are one per line, so a newline inside one (never seen in practice) becomes a space
+            self.put(f"{part_prefix}/{TIMESTAMP_FILE}",
+                     '\n'.join(t.replace('\n', ' ') for t in timestamps).encode('utf-8'))
+            partition['rows'] += len(quantities)
+            partition['parts'].append({'name': part_name, 'rows': len(quantities)})
+        self.buffers = {}
+        self.buffered_rows = 0
+        self.part_number += 1
+
+    def close(self):
+        """Write what's left, then the manifest (last, so a half-written copy is never picked up)."""
+        self.flush()
+        manifest = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'price_scale': PRICE_SCALE,
+            'columns': {name: file_name for name, (file_name, _) in COLUMNS.items()},
+            'records_processed': self.records_processed,
+            'malformed_records': self.malformed_records,
+            'rows': sum(partition['rows'] for partition in self.partitions.values()),
+            'partitions': list(self.partitions.values()),
+        }
+        self.put(f"{self.prefix}/{MANIFEST_NAME}", json.dumps(manifest, indent=1).encode('utf-8'))
+        return manifest
+
+
+def convert_csv(s3_client, bucket_name, csv_key, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                chunk_size=DEFAULT_READ_CHUNK_SIZE):
+    """
+    Convert s3://bucket/csv_key into its columnar copy (columnar_prefix(csv_key)).
+    Rows are checked with the same rules as the analyzer, so malformed rows are
+    skipped and counted the same way. Returns the manifest.
+    """
+    writer = ColumnarTradesWriter(s3_client, bucket_name, columnar_prefix(csv_key), row_group_size)
+    body = s3_client.get_object(Bucket=bucket_name, Key=csv_key)['Body']
+    try:
+        reader = csv.reader(iter_text_lines(body, chunk_size))
+        header = next(reader, None)
+        if header is not None:
+            ticker_idx, price_idx, quantity_idx, side_idx = TradeAnalyzer().read_header(iter([header]))
+            timestamp_idx = header.index('timestamp') if 'timestamp' in header else None
+            log = TradeAnalyzer() # Only used to log malformed rows the same way as the analysis
+            for row in reader:
+                if not row:
+                    continue # Blank line (e.g. trailing newline)
+                writer.records_processed += 1
+                try:
+                    side = row[side_idx] if side_idx is not None else None
+                    price_ticks = round(float(row[price_idx]) * PRICE_SCALE)
+                    writer.add(row[ticker_idx], price_ticks, int(row[quantity_idx]), SIDE_CODES.get(side, 0),
+                               row[timestamp_idx] if timestamp_idx is not None else '')
+                except (ValueError, IndexError, OverflowError) as e:
+                    writer.malformed_records += 1
+                    log.log_malformed(row, e)
+    finally:
+        body.close()
+    return writer.close()
+
+
+def read_manifest(s3_client, bucket_name, prefix):
+    manifest = json.loads(read_object(s3_client, bucket_name, f"{prefix}/{MANIFEST_NAME}"))
+    if manifest.get('format') != FORMAT_NAME or manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{prefix} is not a {FORMAT_NAME} v{FORMAT_VERSION} dataset")
+    return manifest
+
+
+def read_columnar_trades(s3_client, bucket_name, prefix, engine='python', tickers=None):
+    """
+    Analyze a columnar copy and return the analyzer (same results as reading the CSV).
+    tickers: only read these partitions (None = all). The malformed row count from
+    the conversion is only added when every ticker is read.
+    """
+    manifest = read_manifest(s3_client, bucket_name, prefix)
+    analyzer = get_analyzer(engine)
+    wanted = set(tickers) if tickers is not None else None
+    for partition in manifest['partitions']:
+        if wanted is not None and partition['ticker'] not in wanted:
+            continue # Partition pruning: never touch other tickers' files
+        for part in partition['parts']:
+            part_prefix = f"{prefix}/{partition['path']}/{part['name']}"
+            price_ticks, quantities, side_codes = (
+                from_little_endian(read_object(s3_client, bucket_name, f"{part_prefix}/{manifest['columns'][column]}"),
+                                   COLUMNS[column][1])
+                for column in ANALYSIS_COLUMNS
+            )
+            analyzer.consume_partition(partition['ticker'], price_ticks, quantities, side_codes,
+                                       manifest['price_scale'])
+    if wanted is None:
+        # Malformed rows count as processed, same as the CSV path
+        analyzer.records_processed += manifest['malformed_records']
+        analyzer.malformed_records += manifest['malformed_records']
+    return analyzer
+
+
+def find_local_csv_keys(root_dir):
+    """Every trades.csv under root_dir, as '/'-separated keys relative to it."""
+    keys = []
+    for dir_path, _, file_names in os.walk(root_dir):
+        if 'trades.csv' in file_names:
+            relative = os.path.relpath(os.path.join(dir_path, 'trades.csv'), root_dir)
+            keys.append(relative.replace(os.sep, '/'))
+    return sorted(keys)
+
+
+def find_s3_csv_keys(s3_client, bucket_name, prefix=''):
+    keys = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix):
+        keys.extend(item['Key'] for item in page.get('Contents', []) if item['Key'].endswith('/trades.csv'))
+    return sorted(keys)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert trades.csv files to the columnar format, or analyze a converted copy.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help="Write trades.columnar/ next to every trades.csv")
+    convert.add_argument('root', nargs='?', help="Local directory laid out like the bucket")
+    convert.add_argument('--bucket', help="Convert a real S3 bucket instead (uses boto3)")
+    convert.add_argument('--prefix', default='', help="Only keys under this prefix (S3 mode)")
+    convert.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    convert.add_argument('--force', action='store_true', help="Re-convert files that already have a columnar copy")
+
+    analyze = commands.add_parser('analyze', help="Analyze one local trades.columnar directory")
+    analyze.add_argument('path', help="Path to a trades.columnar directory")
+    analyze.add_argument('--tickers', help="Comma-separated tickers to read (default: all)")
+    analyze.add_argument('--engine', default='python')
+    analyze.add_argument('-o', '--output', help="Where to write the analysis CSV (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'analyze':
+        path = os.path.abspath(args.path)
+        s3_client = LocalS3Client(os.path.dirname(path))
+        tickers = args.tickers.split(',') if args.tickers else None
+        analyzer = read_columnar_trades(s3_client, '.', os.path.basename(path), args.engine, tickers)
+        if args.output:
+            with open(args.output, 'w', newline='', encoding='utf-8') as out:
+                analyzer.write_csv(out)
+        else:
+            analyzer.write_csv(sys.stdout)
+        return
+
+    if args.bucket:
+        import boto3 # Only needed for real S3
+        s3_client, bucket_name = boto3.client('s3'), args.bucket
+        keys = find_s3_csv_keys(s3_client, bucket_name, args.prefix)
+    elif args.root:
+        root = os.path.abspath(args.root)
+        s3_client, bucket_name = LocalS3Client(os.path.dirname(root)), os.path.basename(root)
+        keys = find_local_csv_keys(root)
+    else:
+        parser.error("convert needs a local root directory or --bucket")
+
+    for key in keys:
+        if not args.force:
+            try:
+                read_manifest(s3_client, bucket_name, columnar_prefix(key))
+                print(f"Skipping {key} (already converted)")
+                continue
+            except (s3_client.exceptions.NoSuchKey, ValueError):
+                pass
+        manifest = convert_csv(s3_client, bucket_name, key, args.row_group_size)
+        print(f"Converted {key}: {manifest['rows']} rows in {len(manifest['partitions'])} ticker partitions "
+              f"({manifest['malformed_records']} malformed rows skipped)")
+
+
+if __name__ == "__main__":
+    main()
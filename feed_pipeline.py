@@ -0,0 +1,361 @@
+"""
+Pipeline mode for the real-time client (websocket_client.py --pipeline).
+
+    websocket.recv() --> receiver --> bounded asyncio.Queue --> processor --> alerts
+                        (raw frames,                        (batches of frames: json,
+                         receive time)                       timestamps, alert checks)
+
+The receiver only timestamps raw frames and queues them, so the socket is read
+at full speed. The processor drains whatever has queued up (up to max_batch
+frames), decodes it, parses the timestamps (datetime.fromisoformat, the same as
+the classic loop) and runs the alert checks. Console output goes through
+BufferedLog: lines are written in one chunk every flush interval, and per-tick
+lines are rate-limited (alerts never are). That buffering is where most of the
+speedup over the classic loop comes from (see benchmarks/bench_feed_pipeline.py).
+
+Frames can be JSON or, after asking the server for it, binary (see
+wire_format.py); binary updates already carry float timestamps, so there is
+nothing to parse.
+
+Latency histograms (ingest = time queued, parse = decode + timestamps per frame,
+alert = frame received -> alerts checked) and queue backpressure counters are
+kept in PipelineStats and printed every stats_interval seconds.
+"""
+import asyncio
+import sys
+import time
+from bisect import bisect_right
+from datetime import datetime, timezone
+
+from wire_format import FeedDecoder, is_binary_frame
+
+DEFAULT_QUEUE_SIZE = 1000 # Frames
+DEFAULT_MAX_BATCH = 256 # Frames handled per processor pass
+DEFAULT_FLUSH_INTERVAL = 0.25 # Seconds between console writes
+DEFAULT_MAX_LINES_PER_SECOND = 20 # Per-tick lines; alerts are never dropped
+DEFAULT_STATS_INTERVAL = 10.0
+# Histogram bucket upper bounds in seconds: 10us .. 10s
+LATENCY_BUCKETS = [10 ** (exponent / 4) for exponent in range(-20, 5)]
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets; recording is one bisect, percentiles are approximate (bucket upper bound)."""
+
+    def __init__(self, name, bounds=LATENCY_BUCKETS):
+        self.name = name
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Last bucket: above the largest bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_right(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        target = fraction * self.count
+        running = 0
+        for index, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= target:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else None,
+            'p50_ms': _ms(self.percentile(0.5)),
+            'p99_ms': _ms(self.percentile(0.99)),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+    def __str__(self):
+        s = self.summary()
+        if not s['count']:
+            return f"{self.name}: no samples"
+        return (f"{self.name}: n={s['count']} mean={s['mean_ms']}ms p50<={s['p50_ms']}ms "
+                f"p99<={s['p99_ms']}ms max={s['max_ms']}ms")
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def parse_timestamp(text):
+    """
+    A feed timestamp ("2024-05-15T10:00:00.123456+00:00" or "...Z") as float epoch seconds.
+    Plain fromisoformat: it's C code, and faster than any caching done around it in Python.
+    """
+    parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc) # Feed times are UTC
+    return parsed.timestamp()
+
+
+class BufferedLog:
+    """
+    Collects output lines and writes them in one go every flush_interval seconds.
+    info() lines are rate-limited to max_lines_per_second (the rest are counted
+    and reported as suppressed); alert() lines are always kept.
+    """
+
+    def __init__(self, stream=None, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_lines_per_second=DEFAULT_MAX_LINES_PER_SECOND):
+        self.stream = stream or sys.stdout
+        self.flush_interval = flush_interval
+        self.max_lines_per_second = max_lines_per_second
+        self.lines = []
+        self.second = None
+        self.lines_this_second = 0
+        self.suppressed = 0
+        self.total_suppressed = 0
+        self.last_flush = time.monotonic()
+
+    def allow_info(self):
+        """
+        Rate limit check for one info line (counts it as suppressed if over the limit).
+        Lets callers skip formatting lines that would be dropped anyway.
+        """
+        second = int(time.monotonic())
+        if second != self.second:
+            self.second = second
+            self.lines_this_second = 0
+        if self.lines_this_second >= self.max_lines_per_second:
+            self.suppressed += 1
+            self.total_suppressed += 1
+            return False
+        self.lines_this_second += 1
+        return True
+
+    def info(self, line):
+        if self.allow_info():
+            self.add(line)
+
+    def add(self, line):
+        """Buffer a line without rate limiting (use after allow_info())."""
+        self.lines.append(line)
+
+    def alert(self, line):
+        self.lines.append(line)
+        self.maybe_flush(time.monotonic())
+
+    def maybe_flush(self, now):
+        if now - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.suppressed:
+            self.lines.append(f"  ... {self.suppressed} update lines suppressed (rate limit)")
+            self.suppressed = 0
+        if self.lines:
+            self.stream.write('\n'.join(self.lines) + '\n')
+            self.stream.flush()
+            self.lines = []
+        self.last_flush = time.monotonic()
+
+
+class PipelineStats:
+    """Latency histograms plus queue / backpressure counters."""
+
+    def __init__(self):
+        self.ingest = LatencyHistogram('ingest (queued)')
+        self.parse = LatencyHistogram('parse (per frame)')
+        self.alert = LatencyHistogram('alert (receive -> checked)')
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0 # drop_oldest policy only
+        self.updates_processed = 0
+        self.bad_frames = 0
+        self.handler_errors = 0 # Updates whose alert checks raised (logged, then skipped)
+        self.queue_full_events = 0 # Times the receiver found the queue full
+        self.blocked_seconds = 0.0 # Time the receiver spent waiting for room (block policy)
+        self.max_queue_depth = 0
+        self.batches = 0
+
+    def summary(self):
+        return {
+            'frames_received': self.frames_received,
+            'frames_processed': self.frames_processed,
+            'frames_dropped': self.frames_dropped,
+            'updates_processed': self.updates_processed,
+            'bad_frames': self.bad_frames,
+            'handler_errors': self.handler_errors,
+            'batches': self.batches,
+            'queue_full_events': self.queue_full_events,
+            'blocked_seconds': round(self.blocked_seconds, 3),
+            'max_queue_depth': self.max_queue_depth,
+            'ingest': self.ingest.summary(),
+            'parse': self.parse.summary(),
+            'alert': self.alert.summary(),
+        }
+
+    def lines(self):
+        return [
+            f"[stats] frames received={self.frames_received} processed={self.frames_processed} "
+            f"dropped={self.frames_dropped} bad={self.bad_frames} updates={self.updates_processed} "
+            f"handler errors={self.handler_errors} batches={self.batches}",
+            f"[stats] queue max depth={self.max_queue_depth} full events={self.queue_full_events} "
+            f"receiver blocked {self.blocked_seconds:.3f}s",
+            f"[stats] {self.ingest}",
+            f"[stats] {self.parse}",
+            f"[stats] {self.alert}",
+        ]
+
+
+class FeedPipeline:
+    """
+    Receiver + processor around a bounded queue.
+    handle_update(ticker, price, ts, update) is called for every update and
+    returns a list of alert strings (may be empty).
+    overflow: 'block' waits for room (slows down reading the socket, i.e. real
+    backpressure), 'drop_oldest' throws away the oldest queued frame instead.
+    """
+
+    def __init__(self, handle_update, log=None, queue_size=DEFAULT_QUEUE_SIZE, max_batch=DEFAULT_MAX_BATCH,
+                 overflow='block', print_updates=True, stats_interval=DEFAULT_STATS_INTERVAL):
+        if overflow not in ('block', 'drop_oldest'):
+            raise ValueError("overflow must be 'block' or 'drop_oldest'")
+        self.handle_update = handle_update
+        self.log = log or BufferedLog()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.max_batch = max_batch
+        self.overflow = overflow
+        self.print_updates = print_updates
+        self.stats_interval = stats_interval
+        self.stats = PipelineStats()
+        self.decoder = FeedDecoder()
+        self.last_stats = time.monotonic()
+
+    async def receive(self, websocket):
+        """Read raw frames as fast as they come and queue them with their arrival time."""
+        queue = self.queue
+        stats = self.stats
+        while True:
+            frame = await websocket.recv()
+            item = (time.perf_counter(), frame)
+            stats.frames_received += 1
+            if queue.full():
+                stats.queue_full_events += 1
+                if self.overflow == 'drop_oldest':
+                    queue.get_nowait()
+                    queue.task_done()
+                    stats.frames_dropped += 1
+                else:
+                    started = time.perf_counter()
+                    await queue.put(item)
+                    stats.blocked_seconds += time.perf_counter() - started
+                    continue
+            queue.put_nowait(item)
+            depth = queue.qsize()
+            if depth > stats.max_queue_depth:
+                stats.max_queue_depth = depth
+
+    async def process(self):
+        """Forever: wait for a frame, grab whatever else is queued, handle the batch."""
+        queue = self.queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            self.process_batch(batch)
+            for _ in batch:
+                queue.task_done()
+            await asyncio.sleep(0) # Let the receiver run between batches
+
+    async def flush_periodically(self):
+        """Write buffered output (and stats when due) even when the feed is quiet."""
+        while True:
+            await asyncio.sleep(self.log.flush_interval)
+            if self.stats_interval and time.monotonic() - self.last_stats >= self.stats_interval:
+                self.report_stats()
+            self.log.flush()
+
+    def process_batch(self, batch):
+        stats = self.stats
+        stats.batches += 1
+        dequeued = time.perf_counter()
+        frames = [] # (received_at, updates)
+        for received_at, frame in batch:
+            stats.ingest.record(dequeued - received_at)
+            started = time.perf_counter()
+            try:
+                updates = self.decoder.decode(frame)
+                if is_binary_frame(frame):
+                    timestamps = [update['ts'] for update in updates]
+                else:
+                    timestamps = [parse_timestamp(update['timestamp']) for update in updates]
+            except (ValueError, KeyError, TypeError) as e:
+                stats.bad_frames += 1
+                self.log.alert(f"Skipping bad frame ({e}): {str(frame)[:200]}")
+                continue
+            stats.parse.record(time.perf_counter() - started)
+            frames.append((received_at, updates, timestamps))
+
+        log = self.log
+        handle_update = self.handle_update
+        for received_at, updates, timestamps in frames:
+            for update, ts in zip(updates, timestamps):
+                try:
+                    ticker = update['ticker']
+                    price = float(update['price'])
+                except (KeyError, TypeError, ValueError) as e:
+                    log.alert(f"Skipping bad update ({e}): {update}")
+                    continue
+                if self.print_updates and log.allow_info():
+                    timestamp = update['timestamp'] if 'timestamp' in update \
+                        else datetime.fromtimestamp(ts, timezone.utc).isoformat()
+                    log.add(f"  Ticker: {ticker}, Price: {price:.2f}, Timestamp: {timestamp}")
+                try:
+                    messages = handle_update(ticker, price, ts, update)
+                except Exception as e:
+                    # One bad rule or handler must not stop the processor: the queue would fill
+                    # up and the receiver would wait forever (block) or drop every frame.
+                    stats.handler_errors += 1
+                    if stats.handler_errors <= 10 or stats.handler_errors % 1000 == 0: # Don't flood the console
+                        log.alert(f"Alert check failed for {ticker} ({type(e).__name__}: {e}), update skipped "
+                                  f"({stats.handler_errors} so far)")
+                    continue
+                for message in messages:
+                    log.alert(f"\n>> {message}\n")
+                stats.updates_processed += 1
+            stats.alert.record(time.perf_counter() - received_at)
+            stats.frames_processed += 1
+
+    def report_stats(self):
+        for line in self.stats.lines():
+            self.log.alert(line)
+        self.last_stats = time.monotonic()
+
+    async def run(self, websocket):
+        """
+        Run receiver and processor until the connection closes. Whichever task fails first ends
+        the run and its exception propagates (the receiver's when the connection closes), so a
+        crashed processor can't leave the receiver waiting on a full queue.
+        """
+        receiver = asyncio.create_task(self.receive(websocket))
+        tasks = [asyncio.create_task(self.process()), asyncio.create_task(self.flush_periodically())]
+        try:
+            done, _ = await asyncio.wait([receiver] + tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result() # Re-raise
+        finally:
+            for task in tasks + [receiver]:
+                task.cancel()
+            # Wait for them to wind down; an exception that ended the run was raised above already
+            await asyncio.gather(*tasks, receiver, return_exceptions=True)
+            # Handle whatever was still queued when the connection ended
+            remaining = []
+            while not self.queue.empty():
+                remaining.append(self.queue.get_nowait())
+                self.queue.task_done()
+            if remaining:
+                self.process_batch(remaining)
+            self.report_stats()
+            self.log.flush()
@@ -0,0 +1,244 @@
+"""
+Reconnecting mode for the real-time client (websocket_client.py --reconnect).
+
+FeedSupervisor keeps a connection to the price feed open: when it drops (or
+can't be opened), it waits with exponential backoff and full jitter (a random
+delay between 0 and min(max_delay, initial_delay * 2**attempt), so a crowd of
+clients that lost the server at the same moment doesn't reconnect in lockstep)
+and tries again, forever. Everything the client knows (price windows, rule
+state) lives outside the connection, so it survives reconnects.
+
+Gaps: mock_server.py puts a sequence number ("seq") on every update, one per
+batch. SequenceTracker spots batches we never got (seq jumped) and server
+restarts (seq went backwards); either way on_gap() is called before the first
+batch after the gap, so the client can mark its windows (see
+PriceWindowMonitor.mark_gap). A feed without "seq" gets a gap on every reconnect.
+
+Interest set: FeedSupervisor(tickers=[...]) (or set_interest / subscribe /
+unsubscribe later) tells the server which tickers to send (mock_server.py's
+subscribe / unsubscribe messages), so bandwidth and parsing scale with what the
+client watches rather than the whole universe. The subscription is sent again
+on every reconnect, before on_connect(websocket) runs. tickers=None (the
+default) means every ticker.
+
+Wire format: FeedSupervisor(wire_format='binary') asks for the compact binary
+frames (wire_format.py) on every connect; on_updates gets the same update dicts
+either way, with 'ts' (epoch seconds) in place of the 'timestamp' string.
+"""
+import asyncio
+import json
+import random
+import time
+
+import websockets
+
+from feed_pipeline import LatencyHistogram
+from wire_format import FORMAT_JSON, FeedDecoder, format_messages
+
+DEFAULT_INITIAL_DELAY = 0.5 # Seconds
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_OPEN_TIMEOUT = 10.0
+ALL_TICKERS = '*'
+
+
+class Backoff:
+    """Exponential backoff with full jitter. reset() once a connection is healthy again."""
+
+    def __init__(self, initial_delay=DEFAULT_INITIAL_DELAY, max_delay=DEFAULT_MAX_DELAY, rng=None):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+        self.attempt = 0
+
+    def next_delay(self):
+        ceiling = min(self.max_delay, self.initial_delay * 2 ** self.attempt)
+        self.attempt += 1
+        return self.rng.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class SequenceTracker:
+    """Follows the feed's "seq" numbers and counts what went missing."""
+
+    def __init__(self):
+        self.expected = None # Next seq we should see
+        self.gaps = 0
+        self.missed = 0 # Batches known to be lost (restarts not included)
+        self.restarts = 0
+
+    def check(self, seq):
+        """Record a batch's seq. Returns True if batches were lost before it (or the feed started over)."""
+        expected = self.expected
+        self.expected = seq + 1
+        if expected is None or seq == expected:
+            return False
+        if seq < expected:
+            self.restarts += 1 # Server restarted and counts from the beginning again
+        else:
+            self.missed += seq - expected
+        self.gaps += 1
+        return True
+
+
+def subscribe_message(tickers):
+    return json.dumps({"action": "subscribe", "tickers": sorted(tickers)})
+
+
+def unsubscribe_message(tickers):
+    return json.dumps({"action": "unsubscribe", "tickers": sorted(tickers)})
+
+
+def interest_messages(old, new):
+    """Control messages that change a connection's subscription from `old` to `new` (None = every ticker)."""
+    if new is None:
+        return [] if old is None else [subscribe_message([ALL_TICKERS])]
+    if old is None:
+        # Clear first: a subscribe alone doesn't narrow a connection that explicitly asked for everything
+        messages = [unsubscribe_message([ALL_TICKERS])]
+        return messages + [subscribe_message(new)] if new else messages
+    messages = []
+    if old - new:
+        messages.append(unsubscribe_message(old - new))
+    if new - old:
+        messages.append(subscribe_message(new - old))
+    return messages
+
+
+class FeedSupervisor:
+    """
+        supervisor = FeedSupervisor(url, on_updates, on_gap=price_monitor.mark_gap)
+        await supervisor.run() # Until stop() or cancelled
+    on_updates(updates) gets every decoded batch (a list of update dicts).
+    """
+
+    def __init__(self, url, on_updates, on_gap=None, on_connect=None, backoff=None, log=print,
+                 open_timeout=DEFAULT_OPEN_TIMEOUT, tickers=None, wire_format=FORMAT_JSON):
+        self.url = url
+        self.format_messages = format_messages(wire_format) # Checks the format name too
+        self.decoder = FeedDecoder()
+        self.tickers = set(tickers) if tickers is not None else None # Interest set, None = every ticker
+        self.on_updates = on_updates
+        self.on_gap = on_gap
+        self.on_connect = on_connect
+        self.backoff = backoff or Backoff()
+        self.log = log
+        self.open_timeout = open_timeout
+        self.sequence = SequenceTracker()
+        self.recover = LatencyHistogram("time to recover (drop -> first update)")
+        self.connects = 0
+        self.attempts = 0
+        self.disconnects = 0
+        self.bad_frames = 0
+        self.disconnected_at = None # Monotonic time the last connection was lost, until data flows again
+        self.websocket = None
+        self.stopped = False
+
+    async def run(self):
+        while not self.stopped:
+            self.attempts += 1
+            try:
+                async with websockets.connect(self.url, open_timeout=self.open_timeout) as websocket:
+                    self.websocket = websocket
+                    self.connects += 1
+                    self.log(f"Connected to {self.url}" + (f" (reconnect #{self.connects - 1})" if self.connects > 1 else ""))
+                    # A new connection starts out with every ticker; narrow it to our interest set again
+                    for message in self.format_messages + interest_messages(None, self.tickers):
+                        await websocket.send(message)
+                    if self.on_connect is not None:
+                        await self.on_connect(websocket)
+                    async for message in websocket: # Ends when the server closes cleanly
+                        self.handle_message(message)
+                    self.log("Connection closed by the server.")
+            except websockets.exceptions.ConnectionClosedError as e:
+                self.log(f"Connection lost: {e}")
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                self.log(f"Could not connect to {self.url}: {e or type(e).__name__}")
+            finally:
+                self.websocket = None
+            if self.stopped:
+                break
+            if self.disconnected_at is None:
+                self.disconnected_at = time.monotonic()
+                self.disconnects += 1
+            delay = self.backoff.next_delay()
+            self.log(f"Reconnecting in {delay:.2f}s...")
+            await asyncio.sleep(delay)
+
+    def handle_message(self, message):
+        try:
+            updates = self.decoder.decode(message)
+        except (ValueError, TypeError) as e:
+            self.bad_frames += 1
+            self.log(f"Received a frame we can't decode ({e}): {str(message)[:200]}")
+            return
+        if not updates: # Nothing in it, or the symbol table for binary frames
+            return
+
+        reconnected = self.disconnected_at is not None
+        if reconnected:
+            # Data is flowing again: this is the recovery point, and the backoff can start over
+            self.recover.record(time.monotonic() - self.disconnected_at)
+            self.disconnected_at = None
+            self.backoff.reset()
+        seq = updates[0].get('seq') # decode() only hands back lists of dicts
+        gap = self.sequence.check(seq) if seq is not None else reconnected
+        if gap:
+            self.log(f"Feed gap before seq {seq}: marking windows" if seq is not None else
+                     "Reconnected to a feed without sequence numbers: marking windows")
+            if self.on_gap is not None:
+                self.on_gap()
+        tickers = self.tickers
+        if tickers is not None:
+            # Frames the server sent before it saw our last unsubscribe can still arrive
+            updates = [update for update in updates if update.get('ticker') in tickers]
+            if not updates:
+                return
+        try:
+            self.on_updates(updates)
+        except (KeyError, TypeError, ValueError) as e:
+            self.bad_frames += 1
+            self.log(f"Skipping bad frame ({e}): {str(message)[:200]}")
+
+    async def set_interest(self, tickers):
+        """
+        Declare the tickers to receive (None = every ticker), on the live connection now and on
+        every reconnect. Returns the tickers that were dropped, so their state can be thrown away.
+        """
+        old = self.tickers
+        new = set(tickers) if tickers is not None else None
+        self.tickers = new
+        websocket = self.websocket
+        if websocket is not None:
+            try:
+                for message in interest_messages(old, new):
+                    await websocket.send(message)
+            except websockets.exceptions.ConnectionClosed:
+                pass # run() reconnects and subscribes to the new set then
+        return old - new if old is not None and new is not None else set()
+
+    async def subscribe(self, tickers):
+        """Add tickers to the interest set (a no-op while receiving every ticker)."""
+        if self.tickers is not None:
+            await self.set_interest(self.tickers | set(tickers))
+
+    async def unsubscribe(self, tickers):
+        """Remove tickers from the interest set. Returns the ones that were actually dropped."""
+        if self.tickers is None:
+            raise ValueError("Receiving every ticker: declare an interest set with set_interest() first")
+        return await self.set_interest(self.tickers - set(tickers))
+
+    async def stop(self):
+        """Stop reconnecting and close the current connection, if any."""
+        self.stopped = True
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    def stats_lines(self):
+        return [
+            f"[reconnect] attempts={self.attempts} connects={self.connects} disconnects={self.disconnects} "
+            f"gaps={self.sequence.gaps} missed batches={self.sequence.missed} "
+            f"server restarts={self.sequence.restarts} bad frames={self.bad_frames}",
+            f"[reconnect] {self.recover}",
+        ]
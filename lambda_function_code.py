@@ -1,153 +1,241 @@
-import json 
-import csv
-import io
+import json
 import boto3 # AWS SDK for Python. Available in Lambda by default.
-from datetime import datetime
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from trade_analyzer import ENGINES, get_analyzer, read_s3_trades, write_s3_analysis # Deploy trade_analyzer.py alongside this file
+from columnar_store import columnar_prefix, read_columnar_trades # ...and columnar_store.py
 
-# Initialize S3 client once here, so Lambda can reuse it if the container is warm
+# Initialize S3 client once here, so Lambda can reuse it if the container is warm.
+# boto3 clients are thread-safe, so the backfill threads below all share this one.
 s3_client = boto3.client('s3')
 
-def lambda_handler(event, context):
-    print(f"Received event: {json.dumps(event)}") # Good for debugging to see what triggered Lambda
+# !!! REPLACE 'YOUR_BUCKET_NAME' with your actual S3 bucket name !!!
+bucket_name = 'lonelys-fintech-assignemnt'
 
-    # --- 1. Get and Validate Date from Event ---
-    try:
-        processing_date_str = event['date']
-        # Quick check to see if the date string looks like YYYY-MM-DD
-        datetime.strptime(processing_date_str, '%Y-%m-%d')
-    except (KeyError, ValueError) as e:
-        print(f"Error: Missing or invalid 'date' in event: {e}")
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': "Missing or invalid 'date' in event. Expected YYYY-MM-DD format."})
-        }
+DEFAULT_BACKFILL_WORKERS = 8 # Days analyzed at the same time in range mode
+MAX_BACKFILL_WORKERS = 32
+MAX_BACKFILL_DAYS = 366 # One invocation has 15 minutes, don't accept more than a year
+# 'csv' reads trades.csv; 'columnar' reads the trades.columnar/ copy made by columnar_store.py
+INPUT_FORMATS = ('csv', 'columnar')
 
-    # --- 2. Construct S3 File Paths ---
-    try:
-        date_obj = datetime.strptime(processing_date_str, '%Y-%m-%d')
-        year = str(date_obj.year)
-        month = f"{date_obj.month:02d}"
-        day = f"{date_obj.day:02d}"   
-    except ValueError: 
-        print(f"Error: Invalid date format '{processing_date_str}'") # Should have been caught earlier
-        return {'statusCode': 400, 'body': json.dumps({'error': "Invalid date format."})}
-
-    # !!! REPLACE 'YOUR_BUCKET_NAME' with your actual S3 bucket name !!!
-    bucket_name = 'lonelys-fintech-assignemnt' 
 
+def s3_keys_for(processing_date_str):
+    """Input and output S3 keys for one day (YYYY-MM-DD)."""
+    date_obj = datetime.strptime(processing_date_str, '%Y-%m-%d')
+    year = str(date_obj.year)
+    month = f"{date_obj.month:02d}"
+    day = f"{date_obj.day:02d}"
     # Input file: s3://YOUR_BUCKET_NAME/2024/05/15/trades.csv
     input_s3_key = f"{year}/{month}/{day}/trades.csv"
-
     # Output file: s3://YOUR_BUCKET_NAME/2024/05/15/analysis_2024-05-15.csv
     output_s3_key = f"{year}/{month}/{day}/analysis_{processing_date_str}.csv"
+    return input_s3_key, output_s3_key
+
+
+def analyze_day(processing_date_str, engine='python', input_format='csv'):
+    """
+    Read, analyze and write one day. Never raises: returns (result, analyzer) where
+    result is a dict with 'statusCode' (200 / 404 / 500) plus either the output
+    details or an 'error', and analyzer is None unless the day succeeded.
+    """
+    input_s3_key, output_s3_key = s3_keys_for(processing_date_str)
+    if input_format == 'columnar':
+        input_s3_key = columnar_prefix(input_s3_key)
+    result = {'date': processing_date_str, 'input_file': input_s3_key, 'output_file': output_s3_key}
 
     print(f"Input S3 key: s3://{bucket_name}/{input_s3_key}")
     print(f"Output S3 key: s3://{bucket_name}/{output_s3_key}")
 
-    # --- 3. Read trades.csv from S3 ---
-    trade_records = []
+    # --- Read trades.csv from S3 and aggregate it as it streams in ---
+    # The body is read 1 MB at a time and only per-ticker running totals are kept,
+    # so even a multi-GB file fits in Lambda memory (see trade_analyzer.py).
     try:
-        response = s3_client.get_object(Bucket=bucket_name, Key=input_s3_key)
-        # The file content comes as a stream, so read it and decode from bytes to string
-        csv_content = response['Body'].read().decode('utf-8')
-                
-        # Use io.StringIO to make the string content behave like a file for csv.DictReader
-        csvfile = io.StringIO(csv_content)
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            trade_records.append(row)
-        
-        if not trade_records:
+        if input_format == 'columnar':
+            # Only the manifest and the price/quantity/side columns are downloaded
+            analyzer = read_columnar_trades(s3_client, bucket_name, input_s3_key, engine=engine)
+        else:
+            analyzer = read_s3_trades(s3_client, bucket_name, input_s3_key, engine=engine)
+
+        if not analyzer.records_processed:
             print(f"No records found in {input_s3_key} or file is empty.") # If file is empty, analysis will be empty, which is fine.
-            pass
 
     except s3_client.exceptions.NoSuchKey:
         print(f"Error: Input file not found at s3://{bucket_name}/{input_s3_key}")
-        return {
-            'statusCode': 404,
-            'body': json.dumps({'error': f"Input file not found: {input_s3_key}"})
-        }
+        return dict(result, statusCode=404, error=f"Input file not found: {input_s3_key}"), None
     except Exception as e:
         print(f"Error reading from S3: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': f"Error reading input S3 file: {str(e)}"})
-        }
+        return dict(result, statusCode=500, error=f"Error reading input S3 file: {str(e)}"), None
 
-    # --- 4. Process Data: Calculate Volume and Average Price ---
-    # Using defaultdict to easily sum up values for each stock ticker
-    # {'TICKER': {'total_volume': X, 'sum_price_x_quantity': Y, 'count_trades_for_avg_price': Z}}
-    stock_analysis = defaultdict(lambda: {'total_volume': 0, 'sum_price_x_quantity': 0.0, 'count_trades_for_avg_price': 0})
+    print(f"[{processing_date_str}] Processed {analyzer.records_processed} records "
+          f"({analyzer.malformed_records} malformed) for {analyzer.ticker_count} tickers.")
 
-    for record in trade_records:
-        try:
-            ticker = record['ticker']
-            price = float(record['price'])
-            quantity = int(record['quantity'])
-
-            stock_analysis[ticker]['total_volume'] += quantity
-            # For weighted average price: sum of (price * quantity)
-            stock_analysis[ticker]['sum_price_x_quantity'] += price * quantity
-            # Denominator for weighted average: sum of quantities
-            stock_analysis[ticker]['count_trades_for_avg_price'] += quantity
-
-        except (ValueError, KeyError) as e:
-            # If a row in the CSV is messed up (e.g., price isn't a number), skip it
-            print(f"Skipping malformed record: {record}. Error: {e}")
-            continue 
-    
-    # --- 5. Prepare Analysis Results for CSV Output ---
-    analysis_output_data = [] 
-    analysis_output_data.append(['ticker', 'total_volume', 'average_price'])
-    
-
-    for ticker, data in stock_analysis.items():
-        average_price = 0
-        if data['count_trades_for_avg_price'] > 0: # Avoid division by zero if no trades for a ticker
-            average_price = data['sum_price_x_quantity'] / data['count_trades_for_avg_price']
-        
-        analysis_output_data.append([
-            ticker,
-            data['total_volume'],
-            f"{average_price:.2f}" # Format price to 2 decimal places, e.g., "150.75"
-        ])
-    
-    print(f"Analysis results: {analysis_output_data}")
-    
-    # --- 6. Write Analysis Results back to S3 ---
+    # --- Write Analysis Results back to S3 ---
     try:
-        # Create the CSV content in memory as a string
-        output_csvfile = io.StringIO()
-        writer = csv.writer(output_csvfile)
-        writer.writerows(analysis_output_data)
-        
-        # S3 needs bytes, so convert the string to bytes (UTF-8 encoded)
-        output_csv_content_bytes = output_csvfile.getvalue().encode('utf-8')
-        
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=output_s3_key,
-            Body=output_csv_content_bytes,
-            ContentType='text/csv'
-        )
+        analysis_summary_count = write_s3_analysis(s3_client, bucket_name, output_s3_key, analyzer)
         print(f"Successfully wrote analysis to s3://{bucket_name}/{output_s3_key}")
 
     except Exception as e:
         print(f"Error writing to S3: {e}")
+        return dict(result, statusCode=500, error=f"Error writing output S3 file: {str(e)}"), None
+
+    result.update(
+        statusCode=200,
+        records_processed=analyzer.records_processed,
+        malformed_records=analyzer.malformed_records,
+        analysis_summary_count=analysis_summary_count,
+    )
+    return result, analyzer
+
+
+def backfill_dates(event):
+    """
+    Dates to process in range mode, sorted and de-duplicated:
+    either event['dates'] (a list of YYYY-MM-DD) or event['start_date']..event['end_date'] (inclusive).
+    Raises ValueError with a message for the caller if the event is invalid.
+    """
+    if 'dates' in event:
+        if not isinstance(event['dates'], list) or not event['dates']:
+            raise ValueError("'dates' must be a non-empty list of YYYY-MM-DD strings.")
+        days = {datetime.strptime(date_str, '%Y-%m-%d').date() for date_str in event['dates']}
+    else:
+        start = datetime.strptime(event['start_date'], '%Y-%m-%d').date()
+        end = datetime.strptime(event['end_date'], '%Y-%m-%d').date()
+        if end < start:
+            raise ValueError("'end_date' must not be before 'start_date'.")
+        if (end - start).days >= MAX_BACKFILL_DAYS:
+            raise ValueError(f"Range mode handles at most {MAX_BACKFILL_DAYS} days per invocation.")
+        days = {start + timedelta(days=offset) for offset in range((end - start).days + 1)}
+    if len(days) > MAX_BACKFILL_DAYS:
+        raise ValueError(f"Range mode handles at most {MAX_BACKFILL_DAYS} days per invocation.")
+    return [day.isoformat() for day in sorted(days)]
+
+
+def backfill_handler(event, engine, input_format='csv'):
+    """
+    Range mode: analyze many days concurrently (each day still writes its own
+    analysis_DATE.csv), then write one combined rollup over all the days that succeeded.
+    A failed day doesn't stop the others; every day gets its own status in the response.
+    """
+    try:
+        dates = backfill_dates(event)
+        workers = int(event.get('workers', DEFAULT_BACKFILL_WORKERS))
+        if not 1 <= workers <= MAX_BACKFILL_WORKERS:
+            raise ValueError(f"'workers' must be between 1 and {MAX_BACKFILL_WORKERS}.")
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error: Invalid range event: {e}")
+        message = str(e) if isinstance(e, ValueError) else "Expected 'dates' or 'start_date' and 'end_date'."
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f"Invalid range request: {message} Dates use YYYY-MM-DD format."})
+        }
+
+    print(f"Backfilling {len(dates)} days ({dates[0]} to {dates[-1]}) with {workers} workers")
+
+    # Threads are a good fit here: each day spends most of its time waiting on S3.
+    # pool.map returns results in date order, so the rollup is built the same way every run.
+    combined = get_analyzer(engine)
+    day_results = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(dates))) as pool:
+        for result, analyzer in pool.map(lambda date_str: analyze_day(date_str, engine, input_format), dates):
+            day_results.append(result)
+            if analyzer is not None:
+                combined.merge(analyzer)
+
+    succeeded = [result['date'] for result in day_results if result['statusCode'] == 200]
+    failed = [result['date'] for result in day_results if result['statusCode'] != 200]
+    print(f"Backfill finished: {len(succeeded)} days succeeded, {len(failed)} failed {failed}")
+
+    # --- Combined multi-day rollup ---
+    # s3://YOUR_BUCKET_NAME/rollups/analysis_2024-05-01_2024-05-31.csv
+    rollup_s3_key = None
+    rollup_error = None
+    if succeeded:
+        rollup_s3_key = f"rollups/analysis_{dates[0]}_{dates[-1]}.csv"
+        try:
+            write_s3_analysis(s3_client, bucket_name, rollup_s3_key, combined)
+            print(f"Successfully wrote rollup to s3://{bucket_name}/{rollup_s3_key}")
+        except Exception as e:
+            print(f"Error writing rollup to S3: {e}")
+            rollup_error = f"Error writing rollup S3 file: {str(e)}"
+            rollup_s3_key = None
+
+    # 200 if everything worked, 207 if only some days did, 500 if nothing did
+    if not failed and rollup_error is None:
+        status_code = 200
+    elif succeeded:
+        status_code = 207
+    else:
+        status_code = 500
+
+    return {
+        'statusCode': status_code,
+        'body': json.dumps({
+            'message': f"Trade analysis backfill for {dates[0]} to {dates[-1]}: "
+                       f"{len(succeeded)} of {len(dates)} days succeeded.",
+            'days': day_results,
+            'failed_dates': failed,
+            'rollup_file': rollup_s3_key,
+            'rollup_error': rollup_error,
+            'records_processed': combined.records_processed,
+            'analysis_summary_count': combined.ticker_count
+        })
+    }
+
+
+def lambda_handler(event, context):
+    print(f"Received event: {json.dumps(event)}") # Good for debugging to see what triggered Lambda
+
+    # Optional: which analysis engine to use ("python" by default, or "numpy" for
+    # the vectorized engine in columnar_analyzer.py, which needs a NumPy layer)
+    engine = event.get('engine', 'python')
+    if engine not in ENGINES:
+        print(f"Error: Unknown engine '{engine}'")
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f"Unknown engine '{engine}'. Expected one of: {', '.join(ENGINES)}."})
+        }
+
+    # Optional: read the columnar copy of trades.csv instead of the CSV itself
+    input_format = event.get('input_format', 'csv')
+    if input_format not in INPUT_FORMATS:
+        print(f"Error: Unknown input format '{input_format}'")
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f"Unknown input_format '{input_format}'. Expected one of: {', '.join(INPUT_FORMATS)}."})
+        }
+
+    # Range mode: {"start_date": ..., "end_date": ...} or {"dates": [...]}
+    if 'dates' in event or 'start_date' in event or 'end_date' in event:
+        return backfill_handler(event, engine, input_format)
+
+    # --- 1. Get and Validate Date from Event ---
+    try:
+        processing_date_str = event['date']
+        # Quick check to see if the date string looks like YYYY-MM-DD
+        datetime.strptime(processing_date_str, '%Y-%m-%d')
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error: Missing or invalid 'date' in event: {e}")
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': "Missing or invalid 'date' in event. Expected YYYY-MM-DD format."})
+        }
+
+    # --- 2. Read, analyze and write the day ---
+    result, analyzer = analyze_day(processing_date_str, engine, input_format)
+    if result['statusCode'] != 200:
         return {
-            'statusCode': 500,
-            'body': json.dumps({'error': f"Error writing output S3 file: {str(e)}"})
+            'statusCode': result['statusCode'],
+            'body': json.dumps({'error': result['error']})
         }
 
-    # --- 7. Return Success Response ---
+    # --- 3. Return Success Response ---
     return {
         'statusCode': 200,
         'body': json.dumps({
-            'message': f"Trade analysis complete for {processing_date_str}. Output at s3://{bucket_name}/{output_s3_key}",
-            'input_file': input_s3_key,
-            'output_file': output_s3_key,
-            'records_processed': len(trade_records),
-            'analysis_summary_count': len(analysis_output_data) -1 
+            'message': f"Trade analysis complete for {processing_date_str}. Output at s3://{bucket_name}/{result['output_file']}",
+            'input_file': result['input_file'],
+            'output_file': result['output_file'],
+            'records_processed': result['records_processed'],
+            'analysis_summary_count': result['analysis_summary_count']
         })
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,198 @@
+"""
+Market-data simulator for load testing the feed (mock_server.py --simulate).
+
+MarketSimulator moves every ticker's price in one NumPy operation per batch
+(geometric random walk: price *= exp(sigma * N(0, 1)), with sigma scaled to the
+batch interval), so 100k tickers cost about as much Python as 3. Given a seed
+the whole run is reproducible: starting prices, every step, every random spike
+and the timestamps (start_ts + seq * interval, not the wall clock).
+
+Spikes: a schedule of Spike(seq, ticker, percent) jumps (load_spike_schedule()
+reads one from JSON), and/or random ones at spike_rate per second across the
+universe. Every spike applied is kept in spikes_applied, the ground truth for
+measuring alert recall.
+
+Recording / replay: FeedRecorder writes batches to a file (one JSON header line
+with the tickers and interval, then fixed-size binary records of seq, ts and
+every ticker's price); FeedReplay reads it back (memory-mapped) and hands out
+the same batches. Spikes are saved next to it in <path>.spikes.json.
+
+    simulator = MarketSimulator(10000, interval=0.01, seed=42, spike_rate=1.0)
+    batch = simulator.next_batch()             # Batch(seq, ts, prices)
+    fragments = BatchEncoder(simulator.tickers).encode(batch)  # ticker -> JSON bytes
+"""
+import json
+import math
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+MAX_TICKERS = 100000
+DEFAULT_INTERVAL = 2.0 # Seconds between batches
+DEFAULT_VOLATILITY = 0.001 # Standard deviation of a price's return over one second (0.1%)
+DEFAULT_PRICE_RANGE = (50.0, 200.0) # Starting prices are uniform in this range
+DEFAULT_SPIKE_PERCENT = (3.0, 8.0) # Size range of random spikes, up or down
+MIN_PRICE = 0.01
+RECORDING_FORMAT = 'mock-feed-recording'
+
+Batch = namedtuple('Batch', 'seq ts prices') # prices: float64 array, in the same order as the tickers
+Spike = namedtuple('Spike', 'seq ticker percent')
+
+
+def generated_tickers(count):
+    """MOCKSTOCK_0000, MOCKSTOCK_0001, ... (more digits past 10k)."""
+    width = max(4, len(str(count - 1)))
+    return [f"MOCKSTOCK_{index:0{width}d}" for index in range(count)]
+
+
+def load_spike_schedule(path):
+    """Read [{"seq": 100, "ticker": "MOCKSTOCK_0001", "percent": 5.0}, ...] into Spikes."""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    try:
+        return [Spike(int(entry['seq']), entry['ticker'], float(entry['percent'])) for entry in entries]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Bad spike schedule {path}: {e}")
+
+
+def record_dtype(ticker_count):
+    return np.dtype([('seq', '<i8'), ('ts', '<f8'), ('prices', '<f8', (ticker_count,))])
+
+
+class MarketSimulator:
+    """Seeded, vectorized price paths for `tickers` (a count or a list of names)."""
+
+    def __init__(self, tickers=3, interval=DEFAULT_INTERVAL, seed=None, volatility=DEFAULT_VOLATILITY,
+                 price_range=DEFAULT_PRICE_RANGE, spikes=(), spike_rate=0.0, spike_percent=DEFAULT_SPIKE_PERCENT,
+                 start_ts=None):
+        if isinstance(tickers, int):
+            if not 0 < tickers <= MAX_TICKERS:
+                raise ValueError(f"Number of tickers must be between 1 and {MAX_TICKERS}")
+            tickers = generated_tickers(tickers)
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.tickers = list(tickers)
+        self.interval = interval
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.prices = self.rng.uniform(price_range[0], price_range[1], len(self.tickers))
+        self.step_sigma = volatility * math.sqrt(interval)
+        self.spike_rate = spike_rate
+        self.spike_percent = spike_percent
+        self.start_ts = time.time() if start_ts is None else start_ts
+        self.seq = 0
+        self.spikes_applied = []
+
+        index = {ticker: position for position, ticker in enumerate(self.tickers)}
+        self.scheduled = {} # seq -> [(ticker position, percent)]
+        for spike in spikes:
+            if spike.ticker not in index:
+                raise ValueError(f"Spike for unknown ticker '{spike.ticker}'")
+            self.scheduled.setdefault(spike.seq, []).append((index[spike.ticker], spike.percent))
+
+    def next_batch(self):
+        self.seq += 1
+        prices = self.prices
+        prices *= np.exp(self.step_sigma * self.rng.standard_normal(prices.size)) # Every ticker in one go
+        self.apply_spikes()
+        np.maximum(prices, MIN_PRICE, out=prices)
+        return Batch(self.seq, self.start_ts + self.seq * self.interval, np.round(prices, 2))
+
+    def apply_spikes(self):
+        positions, percents = [], []
+        for position, percent in self.scheduled.get(self.seq, ()):
+            positions.append(position)
+            percents.append(percent)
+        if self.spike_rate:
+            # Random spikes: a Poisson number of them per batch, on random tickers, random sizes and directions
+            count = self.rng.poisson(self.spike_rate * self.interval)
+            if count:
+                low, high = self.spike_percent
+                positions.extend(self.rng.integers(0, len(self.tickers), count).tolist())
+                signs = self.rng.choice([-1.0, 1.0], count)
+                percents.extend((signs * self.rng.uniform(low, high, count)).tolist())
+        if positions:
+            np.multiply.at(self.prices, positions, 1 + np.array(percents) / 100) # Two spikes on one ticker both count
+            self.spikes_applied.extend(Spike(self.seq, self.tickers[position], percent)
+                                       for position, percent in zip(positions, percents))
+
+
+class BatchEncoder:
+    """Turns a Batch into mock_server's per-ticker JSON fragments (same fields as its classic updates)."""
+
+    def __init__(self, tickers):
+        self.tickers = list(tickers)
+        # Everything before the price never changes, so it's encoded once up front
+        self.prefixes = [('{"ticker": %s, "price": ' % json.dumps(ticker)).encode('utf-8') for ticker in self.tickers]
+
+    def encode(self, batch):
+        timestamp = datetime.fromtimestamp(batch.ts, timezone.utc).isoformat()
+        suffix = f', "timestamp": "{timestamp}", "seq": {batch.seq}}}'.encode('utf-8')
+        # repr() of a float is exactly what json.dumps writes for it
+        return dict(zip(self.tickers, [prefix + repr(price).encode('ascii') + suffix
+                                       for prefix, price in zip(self.prefixes, batch.prices.tolist())]))
+
+
+class FeedRecorder:
+    """Appends batches to a file FeedReplay can play back (see the module docstring for the layout)."""
+
+    def __init__(self, path, tickers, interval, seed=None):
+        self.path = path
+        self.dtype = record_dtype(len(tickers))
+        self.file = open(path, 'wb')
+        header = {'format': RECORDING_FORMAT, 'version': 1, 'tickers': list(tickers), 'interval': interval,
+                  'seed': seed}
+        self.file.write(json.dumps(header).encode('utf-8') + b'\n')
+        self.batches = 0
+
+    def write(self, batch):
+        record = np.zeros(1, self.dtype)
+        record['seq'] = batch.seq
+        record['ts'] = batch.ts
+        record['prices'] = batch.prices
+        self.file.write(record.tobytes())
+        self.batches += 1
+
+    def close(self, spikes=()):
+        self.file.close()
+        if spikes:
+            with open(self.path + '.spikes.json', 'w', encoding='utf-8') as f:
+                json.dump([spike._asdict() for spike in spikes], f)
+
+
+class FeedReplay:
+    """Batches from a FeedRecorder file, in order; next_batch() returns None at the end."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header_line = f.readline()
+        try:
+            header = json.loads(header_line)
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('format') != RECORDING_FORMAT:
+            raise ValueError(f"{path} is not a feed recording")
+        self.tickers = header['tickers']
+        self.interval = header['interval']
+        self.seed = header.get('seed')
+        dtype = record_dtype(len(self.tickers))
+        # A recording cut off mid-write ends in a partial record; that one is ignored
+        count = (os.path.getsize(path) - len(header_line)) // dtype.itemsize
+        self.records = np.memmap(path, dtype, 'r', offset=len(header_line), shape=(count,)) if count \
+            else np.zeros(0, dtype)
+        self.position = 0
+        spikes_path = path + '.spikes.json'
+        self.spikes = load_spike_schedule(spikes_path) if os.path.exists(spikes_path) else []
+
+    def __len__(self):
+        return len(self.records)
+
+    def next_batch(self):
+        if self.position >= len(self.records):
+            return None
+        record = self.records[self.position]
+        self.position += 1
+        return Batch(int(record['seq']), float(record['ts']), np.array(record['prices']))
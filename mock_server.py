@@ -1,8 +1,13 @@
+import argparse
 import asyncio
 import websockets
+import websockets.exceptions # Not loaded by 'import websockets' alone until a server starts
 import json
 import random
+import time
+from collections import deque, namedtuple
 from datetime import datetime, timezone
+from wire_format import FORMAT_BINARY, FORMAT_JSON, FORMATS, MAGIC, BinaryEncoder
 
 # Server settings
 HOST = 'localhost'
@@ -14,67 +19,393 @@ INITIAL_PRICES = {ticker: random.uniform(50, 200) for ticker in TICKERS}
 PRICE_FLUCTUATION_RANGE = 0.5
 # How often to send out new prices (in seconds)
 UPDATE_INTERVAL_SECONDS = 2
+# Every batch of updates gets the next sequence number ("seq" on each update), so clients
+# can tell when they missed batches (e.g. while reconnecting). Starts again at 0 when the server restarts.
+sequence_number = 0
+
+# Simulator mode (market_simulator.py, needs numpy): a MarketSimulator (seeded, vectorized, any number of
+# tickers, spike injection) or a FeedReplay of a recording makes the batches instead of the random walk
+# in next_batch(). Set up with use_simulator() (--simulate / --replay on the command line).
+feed_source = None
+feed_encoder = None
+feed_recorder = None
+
+# One batch of prices. prices: a list in the same order as TICKERS, fragments: ticker -> its update
+# as JSON bytes (encoded once, see publish()). ts: float epoch seconds, shared by the whole batch.
+PriceBatch = namedtuple('PriceBatch', 'seq ts prices fragments')
+
+# Each client gets its own queue of frames waiting to be sent. When a client can't keep up and its
+# queue is full, 'conflate' throws away its oldest queued frame (every frame carries the latest price
+# of every ticker the client wants, so newer frames make older ones redundant; the client sees the jump in "seq"),
+# 'disconnect' closes the connection instead. Either way the other clients aren't held up.
+CLIENT_QUEUE_SIZE = 16 # Frames
+SLOW_CLIENT_POLICY = 'conflate' # or 'disconnect'
+
+# Subscriptions. A client gets every ticker until it sends its first control message:
+#   {"action": "subscribe", "tickers": ["MOCKSTOCK_A", "MOCKSTOCK_B"]}  ("*" = every ticker)
+#   {"action": "unsubscribe", "tickers": ["MOCKSTOCK_B"]}
+# Clients with the same set of tickers share a SubscriptionGroup, so each distinct set's frame is
+# built once per batch, and ticker_groups (ticker -> groups that want it) finds the groups a batch touches.
+ALL_TICKERS = '*'
+
+# Wire format (see wire_format.py). Frames are JSON unless a client sends
+#   {"action": "format", "format": "binary"}
+# which gets it the symbol table and then compact binary frames. Groups are per (tickers, format).
+binary_encoder = None # BinaryEncoder for the current TICKERS, made when the first client asks for binary
+
+# Keep track of who's connected: websocket -> ClientFeed
+connected_clients = {}
+subscription_groups = {} # (frozenset of tickers or None = every ticker, wire format) -> SubscriptionGroup
+ticker_groups = {} # ticker -> set of SubscriptionGroups
+# Running totals, handy when load testing (see benchmarks/bench_broadcast.py)
+broadcast_stats = {'frames': 0, 'max_fanout_seconds': 0.0, 'frames_conflated': 0, 'slow_clients_dropped': 0}
+
+
+class ClientFeed:
+    """
+    One connected client: a bounded queue of already-encoded frames and the task that sends them.
+    The broadcaster only calls push(), which never waits, so one slow client can't stall the rest.
+    """
+
+    def __init__(self, websocket, queue_size=None, slow_client_policy=None):
+        self.websocket = websocket
+        self.pending = deque() # Frames waiting to be sent, oldest first
+        self.queue_size = queue_size or CLIENT_QUEUE_SIZE
+        self.slow_client_policy = slow_client_policy or SLOW_CLIENT_POLICY
+        self.replies = deque() # Answers to control messages (symbol tables); never dropped, sent first
+        self.waiter = None # Future the sender sleeps on while there's nothing to send
+        self.closing = False
+        self.sender = None
+        self.closer = None # Task closing a too-slow client; kept here so it isn't garbage collected mid-close
+        self.group = None # The SubscriptionGroup this client is in
+        self.subscribed = False # Has it sent a subscribe / unsubscribe yet?
+        self.wire_format = FORMAT_JSON
+
+    def start(self):
+        self.sender = asyncio.create_task(self.send_loop())
+
+    def stop(self):
+        if self.sender is not None:
+            self.sender.cancel()
+
+    def push(self, frame):
+        """Queue a frame for this client without waiting (see SLOW_CLIENT_POLICY for a full queue)."""
+        if self.closing:
+            return
+        pending = self.pending
+        if len(pending) >= self.queue_size:
+            if self.slow_client_policy == 'disconnect':
+                self.closing = True
+                broadcast_stats['slow_clients_dropped'] += 1
+                print(f"Client {self.websocket.remote_address} is too slow, disconnecting.")
+                self.stop() # Nothing more for it; then close (in the background, the broadcaster doesn't wait)
+                self.closer = asyncio.create_task(self.websocket.close(1008, "Too slow"))
+                return
+            pending.popleft() # Conflate: drop the oldest frame to make room for the newest
+            broadcast_stats['frames_conflated'] += 1
+        pending.append(frame)
+        self.wake()
+
+    def reply(self, frame):
+        """Queue an answer to one of the client's control messages, ahead of the price frames."""
+        self.replies.append(frame)
+        self.wake()
+
+    def wake(self):
+        # A plain deque + one future is a lot cheaper per push than asyncio.Queue, which adds up over 10k clients
+        waiter = self.waiter
+        if waiter is not None:
+            self.waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def send_loop(self):
+        """Send queued frames one at a time; websocket.send waits whenever the client's connection is backed up."""
+        pending = self.pending
+        replies = self.replies
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if replies:
+                    await self.websocket.send(replies.popleft(), text=True)
+                    continue
+                if not pending:
+                    self.waiter = loop.create_future()
+                    await self.waiter
+                    continue
+                frame = pending.popleft()
+                # JSON is already UTF-8 bytes, sent as a text frame; binary frames go as binary
+                await self.websocket.send(frame, text=not frame.startswith(MAGIC))
+        except websockets.exceptions.ConnectionClosed:
+            pass # The handler in send_stock_updates notices too and cleans up
+
+
+class SubscriptionGroup:
+    """Every client interested in exactly the same tickers (tickers=None: all of them), in the same wire format."""
+
+    def __init__(self, tickers, wire_format=FORMAT_JSON):
+        self.tickers = tickers
+        self.wire_format = wire_format
+        self.ordered = sorted(tickers) if tickers is not None else None
+        self.feeds = set()
+
+
+def join_group(feed, tickers):
+    """Move a client into the group for its (new) set of tickers (None means every ticker) and its wire format."""
+    leave_group(feed)
+    tickers = None if tickers is None else frozenset(tickers)
+    key = (tickers, feed.wire_format)
+    group = subscription_groups.get(key)
+    if group is None:
+        group = subscription_groups[key] = SubscriptionGroup(tickers, feed.wire_format)
+        for ticker in tickers or ():
+            ticker_groups.setdefault(ticker, set()).add(group)
+    group.feeds.add(feed)
+    feed.group = group
+
+
+def leave_group(feed):
+    group = feed.group
+    if group is None:
+        return
+    feed.group = None
+    group.feeds.discard(feed)
+    if not group.feeds: # Last one out: forget the group so batches stop building frames for it
+        del subscription_groups[(group.tickers, group.wire_format)]
+        for ticker in group.tickers or ():
+            groups = ticker_groups[ticker]
+            groups.discard(group)
+            if not groups:
+                del ticker_groups[ticker]
+
+
+def get_binary_encoder():
+    global binary_encoder
+    if binary_encoder is None:
+        binary_encoder = BinaryEncoder(TICKERS)
+    return binary_encoder
+
+
+def set_wire_format(feed, request):
+    """Apply a {"action": "format", "format": ...} message: switch the client's frames from the next batch on."""
+    wire_format = request.get('format')
+    if wire_format not in FORMATS:
+        print(f"Client {feed.websocket.remote_address} asked for an unknown format: {str(wire_format)[:50]}")
+        return
+    if wire_format == FORMAT_BINARY:
+        feed.reply(get_binary_encoder().symbol_table()) # Sent before any binary frame
+    feed.wire_format = wire_format
+    join_group(feed, feed.group.tickers if feed.group is not None else None)
+
+
+def handle_control_message(feed, message):
+    """Apply a subscribe / unsubscribe / format message from a client (see the comments above ALL_TICKERS)."""
+    try:
+        request = json.loads(message)
+        action = request['action']
+        if action == 'format':
+            set_wire_format(feed, request)
+            return
+        tickers = request['tickers']
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        tickers = set(tickers)
+    except (ValueError, KeyError, TypeError):
+        print(f"Client {feed.websocket.remote_address} sent a message we don't understand: {str(message)[:200]}")
+        return
+
+    current = feed.group.tickers if feed.group is not None else None # None = every ticker
+    if action == 'subscribe':
+        if ALL_TICKERS in tickers:
+            wanted = None
+        elif current is None and not feed.subscribed:
+            wanted = tickers # First subscribe: from "everything" down to just these
+        elif current is None:
+            wanted = None # Already subscribed to everything
+        else:
+            wanted = current | tickers
+    elif action == 'unsubscribe':
+        if ALL_TICKERS in tickers:
+            wanted = set()
+        else:
+            wanted = (set(TICKERS) if current is None else current) - tickers
+    else:
+        print(f"Client {feed.websocket.remote_address} sent an unknown action: {action}")
+        return
+    feed.subscribed = True
+    join_group(feed, wanted)
 
-# Keep track of who's connected
-connected_clients = set()
 
 async def send_stock_updates(websocket):
     """
     This function runs for each client that connects.
-    Its main job here is to manage the 'connected_clients' set.
+    It registers the client's feed (so 'broadcast_prices' can reach it) and removes it when they leave.
     """
     print(f"Client {websocket.remote_address} connected.")
-    connected_clients.add(websocket) # Add new client to our set
+    feed = connected_clients[websocket] = ClientFeed(websocket)
+    join_group(feed, None) # Every ticker until it subscribes to some
+    feed.start()
     try:
-        # Just keep the connection alive. The actual data sending is done by 'broadcast_prices'.
-        while True:
-            await asyncio.sleep(0.1) # Small sleep to allow other things to run
-            # If we needed to receive messages from clients, we'd use `await websocket.recv()` here.
+        # Clients only ever send subscribe / unsubscribe messages. Reading them is also what notices
+        # the connection closing: the loop ends on a clean close and raises ConnectionClosedError on a dropped one.
+        async for message in websocket:
+            handle_control_message(feed, message)
+        print(f"Client {websocket.remote_address} disconnected gracefully.")
     except websockets.exceptions.ConnectionClosedOK:
         print(f"Client {websocket.remote_address} disconnected gracefully.")
     except websockets.exceptions.ConnectionClosedError as e:
         print(f"Client {websocket.remote_address} connection error: {e}")
     finally:
-        connected_clients.remove(websocket) # Remove client when they disconnect
+        feed.stop()
+        leave_group(feed)
+        del connected_clients[websocket] # Remove client when they disconnect
         print(f"Client {websocket.remote_address} removed.")
 
 
+def publish(batch):
+    """
+    batch: a PriceBatch (see next_batch()).
+    Every group that wants at least one of its tickers gets a single frame shared by all its clients:
+    a JSON list of just its tickers, built by joining the bytes in batch.fragments, or a binary frame
+    built from records packed at most once per ticker per batch. Never waits on a client.
+    """
+    started = time.perf_counter()
+    fragments = batch.fragments
+    records = {} # ticker -> packed binary record, for this batch
+    touched = set()
+    if len(fragments) <= len(ticker_groups):
+        for ticker in fragments:
+            groups = ticker_groups.get(ticker)
+            if groups:
+                touched |= groups
+    else:
+        for ticker, groups in ticker_groups.items():
+            if ticker in fragments:
+                touched |= groups
+
+    for wire_format in FORMATS:
+        everyone = subscription_groups.get((None, wire_format))
+        if everyone is not None:
+            touched.add(everyone)
+    for group in touched:
+        if group.wire_format == FORMAT_BINARY:
+            frame = binary_frame(group, batch, records)
+        elif group.ordered is None:
+            frame = b'[' + b','.join(fragments.values()) + b']'
+        else:
+            frame = b'[' + b','.join([fragments[ticker] for ticker in group.ordered if ticker in fragments]) + b']'
+        for feed in group.feeds:
+            feed.push(frame)
+    broadcast_stats['frames'] += 1
+    broadcast_stats['max_fanout_seconds'] = max(broadcast_stats['max_fanout_seconds'], time.perf_counter() - started)
+
+
+def binary_frame(group, batch, records):
+    """The group's binary frame for this batch; records (ticker -> packed record) is shared by every group."""
+    encoder = get_binary_encoder()
+    ids = encoder.ids
+    prices = batch.prices
+    picked = []
+    for ticker in group.ordered if group.ordered is not None else TICKERS:
+        record = records.get(ticker)
+        if record is None:
+            ticker_id = ids.get(ticker)
+            if ticker_id is None:
+                continue # Subscribed to a ticker the feed doesn't have
+            record = records[ticker] = encoder.record(ticker_id, prices[ticker_id])
+        picked.append(record)
+    return encoder.frame(batch.seq, batch.ts, picked)
+
+
+def next_batch():
+    """Move every price a little and return the PriceBatch, each ticker's update encoded once (JSON -> UTF-8 bytes)."""
+    global sequence_number
+    if feed_source is not None:
+        return next_simulated_batch()
+    sequence_number += 1
+    now = time.time()
+    timestamp = datetime.fromtimestamp(now, timezone.utc).isoformat() # Current time in UTC, same for the whole batch
+    prices = []
+    fragments = {}
+    for ticker in TICKERS:
+        # Make the price change a little bit, up or down
+        change = random.uniform(-PRICE_FLUCTUATION_RANGE, PRICE_FLUCTUATION_RANGE)
+        INITIAL_PRICES[ticker] = max(0.01, INITIAL_PRICES[ticker] + change) # Price can't go below 0.01
+        price = round(INITIAL_PRICES[ticker], 2) # Round to 2 decimal places
+        prices.append(price)
+
+        update_data = {
+            "ticker": ticker,
+            "price": price,
+            "timestamp": timestamp,
+            "seq": sequence_number
+        }
+        fragments[ticker] = json.dumps(update_data).encode('utf-8')
+    return PriceBatch(sequence_number, now, prices, fragments)
+
+
+def next_simulated_batch():
+    """next_batch() in simulator mode. Returns None when a replay has run out."""
+    global sequence_number
+    batch = feed_source.next_batch()
+    if batch is None:
+        return None
+    sequence_number = batch.seq
+    if feed_recorder is not None:
+        feed_recorder.write(batch)
+    return PriceBatch(batch.seq, batch.ts, batch.prices.tolist(), feed_encoder.encode(batch))
+
+
+def use_simulator(source, record_path=None):
+    """Take batches from a MarketSimulator or FeedReplay from now on, optionally recording them to record_path."""
+    global feed_source, feed_encoder, feed_recorder, binary_encoder, TICKERS, UPDATE_INTERVAL_SECONDS
+    from market_simulator import BatchEncoder, FeedRecorder # Only import numpy when asked for
+    feed_source = source
+    feed_encoder = BatchEncoder(source.tickers)
+    TICKERS = list(source.tickers)
+    binary_encoder = None
+    UPDATE_INTERVAL_SECONDS = source.interval
+    feed_recorder = FeedRecorder(record_path, source.tickers, source.interval, source.seed) if record_path else None
+
+
+def stop_recording():
+    """Close the recording (if any), saving the simulator's spikes next to it."""
+    global feed_recorder
+    if feed_recorder is not None:
+        feed_recorder.close(getattr(feed_source, 'spikes_applied', ()))
+        print(f"Recorded {feed_recorder.batches} batches to {feed_recorder.path}")
+        feed_recorder = None
+
+
 async def broadcast_prices():
     """
     This runs in the background, making up new prices and sending them to everyone.
     """
-    global INITIAL_PRICES # We'll be changing these prices
+    loop = asyncio.get_running_loop()
+    next_update = loop.time()
     while True:
-        await asyncio.sleep(UPDATE_INTERVAL_SECONDS) # Wait before sending next batch of prices
-        if not connected_clients: # No one listening? Don't bother.
+        # Wait for the next batch, on a fixed schedule so the time spent sending doesn't push it back
+        next_update += UPDATE_INTERVAL_SECONDS
+        await asyncio.sleep(max(0, next_update - loop.time()))
+        # Prices (and the sequence number) keep moving even when no one is listening, like a real
+        # feed, so a client that was disconnected for a while sees the gap in "seq".
+        batch = next_batch()
+        if batch is None:
+            print("Replay finished.")
+            return
+        if not connected_clients: # No one listening? Don't bother sending.
             continue
+        # Every ticker moves every batch, so each subscriber still sees every seq (no false gaps)
+        publish(batch)
+
+
+def serve(host=HOST, port=PORT):
+    """
+    The WebSocket server. Compression is off: with it on, websockets compresses every
+    frame again for each client, which would undo encoding it once.
+    """
+    return websockets.serve(send_stock_updates, host, port, compression=None)
 
-        updates = [] # Collect all stock updates for this interval
-        for ticker in TICKERS:
-            # Make the price change a little bit, up or down
-            change = random.uniform(-PRICE_FLUCTUATION_RANGE, PRICE_FLUCTUATION_RANGE)
-            INITIAL_PRICES[ticker] = max(0.01, INITIAL_PRICES[ticker] + change) # Price can't go below 0.01
-
-            update_data = {
-                "ticker": ticker,
-                "price": round(INITIAL_PRICES[ticker], 2), # Round to 2 decimal places
-                "timestamp": datetime.now(timezone.utc).isoformat() # Current time in UTC
-            }
-            updates.append(update_data)
-
-        message_to_send = json.dumps(updates) # Convert list of updates to a JSON string
-
-        # Send the message to all connected clients
-        # We copy the set in case it changes while we're sending (e.g., a client disconnects)
-        tasks = [client.send(message_to_send) for client in list(connected_clients)]
-        if tasks:
-            # 'asyncio.gather' sends all messages more or less at the same time
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    # Something went wrong sending to one client (maybe they just disconnected)
-                    # We'll just ignore it for now, the 'send_stock_updates' handler will clean them up.
-                    pass
 
 async def main():
     # Start the price broadcasting task so it runs in the background
@@ -82,10 +413,59 @@ async def main():
 
     print(f"Mock WebSocket server starting on ws://{HOST}:{PORT}")
     # Start the actual WebSocket server and keep it running forever
-    async with websockets.serve(send_stock_updates, HOST, PORT):
-        await asyncio.Future()  # This basically means "run until stopped"
+    try:
+        async with serve(HOST, PORT):
+            await asyncio.Future()  # This basically means "run until stopped"
+    finally:
+        stop_recording()
+
+
+def use_generated_tickers(count):
+    """Swap the three mock stocks for `count` generated ones (MOCKSTOCK_0000, ...), to try a big universe."""
+    global TICKERS, INITIAL_PRICES, binary_encoder
+    TICKERS = [f"MOCKSTOCK_{index:04d}" for index in range(count)]
+    binary_encoder = None
+    INITIAL_PRICES = {ticker: random.uniform(50, 200) for ticker in TICKERS}
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock stock price WebSocket feed.")
+    parser.add_argument('--tickers', type=int, help="Simulate this many tickers instead of the default three")
+    parser.add_argument('--simulate', action='store_true',
+                        help="Use the NumPy market simulator (market_simulator.py) for the prices")
+    parser.add_argument('--interval', type=float, help="Seconds between batches (fractions of a millisecond work too)")
+    parser.add_argument('--seed', type=int, help="Simulator: random seed, for reproducible prices")
+    parser.add_argument('--volatility', type=float, help="Simulator: std dev of a price's return over one second")
+    parser.add_argument('--spike-rate', type=float, default=0.0,
+                        help="Simulator: random price spikes per second (across all tickers)")
+    parser.add_argument('--spikes', help="Simulator: JSON file of scheduled spikes [{seq, ticker, percent}, ...]")
+    parser.add_argument('--record', metavar='PATH', help="Save every batch to this file (simulator / replay)")
+    parser.add_argument('--replay', metavar='PATH', help="Play back a file saved with --record")
+    args = parser.parse_args()
+    if args.replay or args.simulate:
+        from market_simulator import FeedReplay, MarketSimulator, load_spike_schedule
+        if args.replay:
+            source = FeedReplay(args.replay)
+            print(f"Replaying {len(source)} batches of {len(source.tickers)} tickers from {args.replay}")
+        else:
+            options = {'seed': args.seed, 'spike_rate': args.spike_rate}
+            if args.interval:
+                options['interval'] = args.interval
+            if args.volatility is not None:
+                options['volatility'] = args.volatility
+            if args.spikes:
+                options['spikes'] = load_spike_schedule(args.spikes)
+            source = MarketSimulator(args.tickers or len(TICKERS), **options)
+        use_simulator(source, args.record)
+        if args.interval: # A replay can be played faster or slower than it was recorded
+            UPDATE_INTERVAL_SECONDS = args.interval
+    else:
+        if args.record:
+            parser.error("--record needs --simulate or --replay")
+        if args.tickers:
+            use_generated_tickers(args.tickers)
+        if args.interval:
+            UPDATE_INTERVAL_SECONDS = args.interval
     try:
         asyncio.run(main()) # Start the server
     except KeyboardInterrupt:
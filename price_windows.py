@@ -0,0 +1,192 @@
+"""
+Sliding-window price spike / drop detection for the real-time client (websocket_client.py).
+
+For every ticker we keep two monotonic deques over the last `window_seconds`:
+  - mins: prices in increasing order, so mins[0] is the lowest price in the window
+  - maxs: prices in decreasing order, so maxs[0] is the highest price in the window
+Each tick is appended once and removed at most once from each deque, so an
+update is amortized O(1) no matter how many ticks are in the window.
+
+A rise alert fires when the price is more than rise_percent above the window
+minimum (so a rebound from a dip is caught, not just a rise from the oldest
+price), and a drop alert when it's more than drop_percent below the window maximum.
+Window length and thresholds can be set per ticker with configure().
+
+Timestamps are plain float seconds (datetime.timestamp()), to keep the hot path cheap.
+
+After a feed gap (missed updates, e.g. while reconnecting) mark_gap() flags the
+windows: until the pre-gap ticks have slid out, alerts only compare against
+prices received after the gap, so a move that happened while we weren't
+listening isn't reported as if we'd just seen it.
+"""
+from collections import deque, namedtuple
+
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_RISE_PERCENT = 2.0
+DEFAULT_DROP_PERCENT = 2.0
+
+_INHERIT = object() # configure(): argument not given, keep the current value
+
+# direction is 'rise' or 'drop'; from_price/from_ts are the window min (rise) or max (drop)
+PriceAlert = namedtuple('PriceAlert', 'ticker direction percent from_price from_ts price ts window_seconds')
+
+
+class WindowConfig:
+    """Window length and thresholds for one ticker. A threshold of None turns that check off."""
+    __slots__ = ('window_seconds', 'rise_percent', 'drop_percent')
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, rise_percent=DEFAULT_RISE_PERCENT,
+                 drop_percent=DEFAULT_DROP_PERCENT):
+        if window_seconds is None:
+            raise ValueError("window_seconds can't be None: only rise_percent / drop_percent can be switched off")
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be positive")
+        self.window_seconds = window_seconds
+        self.rise_percent = rise_percent
+        self.drop_percent = drop_percent
+
+
+class PriceWindow:
+    """Rolling min / max of one ticker's prices over the last config.window_seconds."""
+    __slots__ = ('config', 'mins', 'maxs', 'last_ts', 'gap_ts')
+
+    def __init__(self, config):
+        self.config = config
+        self.mins = deque() # (ts, price), prices increasing
+        self.maxs = deque() # (ts, price), prices decreasing
+        self.last_ts = None
+        self.gap_ts = None # Last tick before a feed gap, while the window still spans it
+
+    def add(self, price, ts):
+        """Add a tick and evict everything older than the window. Returns the (possibly clamped) ts."""
+        # The deques rely on time only moving forward; a late tick is treated as arriving now
+        if self.last_ts is not None and ts < self.last_ts:
+            ts = self.last_ts
+        self.last_ts = ts
+
+        mins = self.mins
+        while mins and mins[-1][1] >= price:
+            mins.pop() # Can never be the minimum again: this tick is lower (or equal) and newer
+        mins.append((ts, price))
+        maxs = self.maxs
+        while maxs and maxs[-1][1] <= price:
+            maxs.pop()
+        maxs.append((ts, price))
+
+        cutoff = ts - self.config.window_seconds
+        while mins[0][0] < cutoff:
+            mins.popleft()
+        while maxs[0][0] < cutoff:
+            maxs.popleft()
+        if self.gap_ts is not None and cutoff > self.gap_ts:
+            self.gap_ts = None # Everything from before the gap has left the window
+        return ts
+
+    def mark_gap(self):
+        """Ticks were missed after the last one we have; see the module docstring."""
+        if self.last_ts is not None:
+            self.gap_ts = self.last_ts
+
+    def since_gap(self, extremes):
+        """The first (ts, price) in mins or maxs that arrived after the gap (that deque's extreme since then), or None."""
+        gap_ts = self.gap_ts
+        for entry in extremes:
+            if entry[0] > gap_ts:
+                return entry
+        return None
+
+    @property
+    def low(self):
+        return self.mins[0] # (ts, price)
+
+    @property
+    def high(self):
+        return self.maxs[0]
+
+
+class PriceWindowMonitor:
+    """
+    One PriceWindow per ticker, created on first sight.
+        monitor = PriceWindowMonitor()
+        monitor.configure('TSLA', window_seconds=30, rise_percent=3.0)
+        alert = monitor.update('TSLA', 251.3, ts)  # PriceAlert or None
+    """
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, rise_percent=DEFAULT_RISE_PERCENT,
+                 drop_percent=DEFAULT_DROP_PERCENT):
+        self.default_config = WindowConfig(window_seconds, rise_percent, drop_percent)
+        self.configs = {} # Per-ticker overrides
+        self.windows = {}
+
+    def configure(self, ticker, window_seconds=_INHERIT, rise_percent=_INHERIT, drop_percent=_INHERIT):
+        """
+        Override the defaults for one ticker (only the arguments that are given).
+        rise_percent=None / drop_percent=None turns that check off for the ticker.
+        """
+        base = self.configs.get(ticker, self.default_config)
+        config = WindowConfig(
+            window_seconds if window_seconds is not _INHERIT else base.window_seconds,
+            rise_percent if rise_percent is not _INHERIT else base.rise_percent,
+            drop_percent if drop_percent is not _INHERIT else base.drop_percent,
+        )
+        self.configs[ticker] = config
+        if ticker in self.windows:
+            self.windows[ticker].config = config # Takes effect from the next tick
+        return config
+
+    def window(self, ticker):
+        window = self.windows.get(ticker)
+        if window is None:
+            window = self.windows[ticker] = PriceWindow(self.configs.get(ticker, self.default_config))
+        return window
+
+    def update(self, ticker, price, ts):
+        """Add one tick; returns a PriceAlert if it breaks a threshold, otherwise None."""
+        window = self.windows.get(ticker)
+        if window is None:
+            window = self.window(ticker)
+        ts = window.add(price, ts)
+        config = window.config
+        if window.gap_ts is not None:
+            return self.check_since_gap(ticker, window, price, ts)
+
+        low_ts, low = window.mins[0]
+        if config.rise_percent is not None and low > 0 and price > low:
+            percent = (price - low) / low * 100
+            if percent > config.rise_percent:
+                return PriceAlert(ticker, 'rise', percent, low, low_ts, price, ts, config.window_seconds)
+
+        high_ts, high = window.maxs[0]
+        if config.drop_percent is not None and high > 0 and price < high:
+            percent = (high - price) / high * 100
+            if percent > config.drop_percent:
+                return PriceAlert(ticker, 'drop', percent, high, high_ts, price, ts, config.window_seconds)
+        return None
+
+    def check_since_gap(self, ticker, window, price, ts):
+        """update()'s checks for a window that spans a gap, against the post-gap low / high only."""
+        config = window.config
+        low = window.since_gap(window.mins)
+        if config.rise_percent is not None and low is not None and 0 < low[1] < price:
+            percent = (price - low[1]) / low[1] * 100
+            if percent > config.rise_percent:
+                return PriceAlert(ticker, 'rise', percent, low[1], low[0], price, ts, config.window_seconds)
+        high = window.since_gap(window.maxs)
+        if config.drop_percent is not None and high is not None and price < high[1]:
+            percent = (high[1] - price) / high[1] * 100
+            if percent > config.drop_percent:
+                return PriceAlert(ticker, 'drop', percent, high[1], high[0], price, ts, config.window_seconds)
+        return None
+
+    def mark_gap(self, ticker=None):
+        """Flag one ticker's window (or all of them) as missing ticks since its last one."""
+        if ticker is None:
+            windows = self.windows.values()
+        else:
+            windows = [self.windows[ticker]] if ticker in self.windows else []
+        for window in windows:
+            window.mark_gap()
+
+    def forget(self, ticker):
+        """Drop a ticker's window (e.g. when unsubscribing from it)."""
+        self.windows.pop(ticker, None)
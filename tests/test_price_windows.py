@@ -0,0 +1,26 @@
+import unittest
+
+from price_windows import PriceWindowMonitor
+
+
+# Run with: python -m unittest (or python manage.py test, which finds these too)
+class PriceWindowConfigureTests(unittest.TestCase):
+
+    def test_none_turns_a_percent_check_off(self):
+        monitor = PriceWindowMonitor(window_seconds=60, rise_percent=2.0, drop_percent=2.0)
+        config = monitor.configure('TSLA', rise_percent=None)
+        self.assertIsNone(config.rise_percent)
+        self.assertEqual((config.window_seconds, config.drop_percent), (60, 2.0)) # Not given: inherited
+        monitor.update('TSLA', 100.0, 0.0)
+        self.assertIsNone(monitor.update('TSLA', 110.0, 1.0)) # Rise check is off
+        self.assertEqual(monitor.update('TSLA', 90.0, 2.0).direction, 'drop')
+
+    def test_window_seconds_none_is_rejected(self):
+        monitor = PriceWindowMonitor()
+        with self.assertRaisesRegex(ValueError, "only rise_percent / drop_percent can be switched off"):
+            monitor.configure('TSLA', window_seconds=None)
+        self.assertNotIn('TSLA', monitor.configs)
+
+
+if __name__ == '__main__':
+    unittest.main()
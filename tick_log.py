@@ -0,0 +1,262 @@
+"""
+Append-only tick log for the real-time client (websocket_client.py --record / --replay).
+
+A log is a directory of segments. Each segment is:
+  segment-000001.ticks        a 64-byte header (magic, version, record size,
+                              capacity, count) then fixed-width 32-byte records
+                              <ddqII: ts (epoch seconds), price, seq, ticker id, quantity
+  segment-000001.symbols      ticker names, one per line; the line number is the ticker id
+  segment-000001.index.json   written when the segment is closed (see SegmentIndex)
+
+TickRecorder preallocates a segment file, memory-maps it and writes each tick
+with struct.pack_into, bumping the header's count after every record, so a
+reader (or a restart after a crash) sees exactly the ticks written so far. A
+full segment is closed (index written, file trimmed) and a new one started.
+
+SegmentIndex splits a segment into blocks of INDEX_BLOCK records and keeps each
+block's lowest / highest timestamp plus, per ticker, the blocks it appears in.
+TickLog.ticks(tickers, start, end) only visits the blocks that can match, and
+decodes them straight out of the map (struct.iter_unpack over a memoryview
+slice, no copying). A segment without an index (the recorder didn't get to
+close it) is indexed by scanning it once when opened.
+"""
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b'TICKLOG1'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQ') # magic, version, record size, capacity, count
+HEADER_SIZE = 64
+COUNT = struct.Struct('<Q')
+COUNT_OFFSET = 16 # Where count sits in HEADER
+RECORD = struct.Struct('<ddqII') # ts, price, seq, ticker id, quantity
+DEFAULT_SEGMENT_RECORDS = 1 << 20 # 32MB per segment
+INDEX_BLOCK = 4096 # Records per index block
+SEGMENT_PREFIX = 'segment-'
+
+
+def segment_path(directory, number):
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{number:06d}.ticks")
+
+
+def segment_paths(directory):
+    """Every segment in the directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(SEGMENT_PREFIX) and name.endswith('.ticks'))
+    return [os.path.join(directory, name) for name in names]
+
+
+def symbols_path(path):
+    return path[:-len('.ticks')] + '.symbols'
+
+
+def index_path(path):
+    return path[:-len('.ticks')] + '.index.json'
+
+
+class SegmentIndex:
+    """Per block of INDEX_BLOCK records: lowest / highest ts, and for each ticker id the blocks it's in."""
+
+    def __init__(self):
+        self.blocks = [] # [min_ts, max_ts] per block
+        self.ticker_blocks = {} # ticker id -> block numbers, increasing
+
+    def add(self, position, ticker_id, ts):
+        block = position // INDEX_BLOCK
+        if block == len(self.blocks):
+            self.blocks.append([ts, ts])
+        else:
+            bounds = self.blocks[block]
+            if ts < bounds[0]:
+                bounds[0] = ts
+            elif ts > bounds[1]:
+                bounds[1] = ts
+        blocks = self.ticker_blocks.get(ticker_id)
+        if blocks is None:
+            self.ticker_blocks[ticker_id] = [block]
+        elif blocks[-1] != block:
+            blocks.append(block)
+
+    def save(self, path, count):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'records': count, 'block_size': INDEX_BLOCK, 'blocks': self.blocks,
+                       'tickers': {str(ticker_id): blocks for ticker_id, blocks in self.ticker_blocks.items()}}, f)
+
+    @classmethod
+    def load(cls, path, count):
+        """The saved index, or None if it's missing or doesn't match the segment."""
+        try:
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get('records') != count or saved.get('block_size') != INDEX_BLOCK:
+            return None
+        index = cls()
+        index.blocks = saved['blocks']
+        index.ticker_blocks = {int(ticker_id): blocks for ticker_id, blocks in saved['tickers'].items()}
+        return index
+
+
+class SegmentWriter:
+    """One segment being recorded into."""
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.file = open(path, 'w+b')
+        self.file.truncate(HEADER_SIZE + capacity * RECORD.size) # Sparse on most filesystems
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size, capacity, 0)
+        self.symbols = open(symbols_path(path), 'w', encoding='utf-8')
+        self.ids = {}
+        self.count = 0
+        self.index = SegmentIndex()
+
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, ticker, price, ts, seq, quantity):
+        ticker_id = self.ids.get(ticker)
+        if ticker_id is None:
+            ticker_id = self.ids[ticker] = len(self.ids)
+            self.symbols.write(ticker + '\n')
+            self.symbols.flush() # Records that use this id must never be readable without it
+        position = self.count
+        RECORD.pack_into(self.map, HEADER_SIZE + position * RECORD.size, ts, price, seq, ticker_id, quantity)
+        self.count = position + 1
+        COUNT.pack_into(self.map, COUNT_OFFSET, self.count)
+        self.index.add(position, ticker_id, ts)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(HEADER_SIZE + self.count * RECORD.size) # Give back the unused space
+        self.file.close()
+        self.symbols.close()
+        self.index.save(index_path(self.path), self.count)
+
+
+class TickRecorder:
+    """
+        recorder = TickRecorder('ticks/')
+        recorder.append('MOCKSTOCK_A', 101.25, 1715767200.0, seq=7)
+        recorder.close()
+    Every run starts a new segment after the ones already in the directory; nothing is ever rewritten.
+    """
+
+    def __init__(self, directory, segment_records=DEFAULT_SEGMENT_RECORDS):
+        if segment_records <= 0:
+            raise ValueError("segment_records must be positive")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_records = segment_records
+        existing = segment_paths(directory)
+        self.next_number = int(os.path.basename(existing[-1])[len(SEGMENT_PREFIX):-len('.ticks')]) + 1 \
+            if existing else 1
+        self.segment = None
+        self.ticks = 0
+
+    def append(self, ticker, price, ts, seq=0, quantity=1):
+        segment = self.segment
+        if segment is None or segment.full():
+            segment = self.rotate()
+        segment.append(ticker, price, ts, seq or 0, int(quantity))
+        self.ticks += 1
+
+    def rotate(self):
+        if self.segment is not None:
+            self.segment.close()
+        self.segment = SegmentWriter(segment_path(self.directory, self.next_number), self.segment_records)
+        self.next_number += 1
+        return self.segment
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+
+class SegmentReader:
+    """A recorded segment, memory-mapped read-only (up to the count in its header when opened)."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if os.path.getsize(path) < HEADER_SIZE:
+                raise ValueError(f"{path} is not a tick log segment")
+            magic, version, record_size, capacity, count = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                raise ValueError(f"{path} is not a tick log segment (or a different version)")
+            # Never trust a count pointing past the end of the file (a segment cut short)
+            self.count = min(count, max(0, os.path.getsize(path) - HEADER_SIZE) // RECORD.size)
+            self.map = mmap.mmap(f.fileno(), HEADER_SIZE + self.count * RECORD.size, access=mmap.ACCESS_READ)
+        with open(symbols_path(path), encoding='utf-8') as f:
+            self.symbols = f.read().splitlines()
+        self.ids = {ticker: ticker_id for ticker_id, ticker in enumerate(self.symbols)}
+        self.index = SegmentIndex.load(index_path(path), self.count) or self.build_index()
+
+    def build_index(self):
+        index = SegmentIndex()
+        for position, (ts, _, _, ticker_id, _) in enumerate(RECORD.iter_unpack(self.records(0, self.count))):
+            index.add(position, ticker_id, ts)
+        return index
+
+    def records(self, first, last):
+        """Records first..last-1 as a memoryview straight into the map."""
+        return memoryview(self.map)[HEADER_SIZE + first * RECORD.size:HEADER_SIZE + last * RECORD.size]
+
+    def scan(self, tickers=None, start=None, end=None):
+        """(ticker, price, ts, seq, quantity) for the matching ticks, in recorded order."""
+        start = float('-inf') if start is None else start
+        end = float('inf') if end is None else end
+        index = self.index
+        if tickers is None:
+            ticker_ids = None
+            blocks = range(len(index.blocks))
+        else:
+            ticker_ids = {self.ids[ticker] for ticker in tickers if ticker in self.ids}
+            blocks = sorted({block for ticker_id in ticker_ids for block in index.ticker_blocks.get(ticker_id, ())})
+        symbols = self.symbols
+        for block in blocks:
+            low, high = index.blocks[block]
+            if high < start or low > end:
+                continue
+            whole_block = start <= low and high <= end
+            first = block * INDEX_BLOCK
+            for ts, price, seq, ticker_id, quantity in RECORD.iter_unpack(
+                    self.records(first, min(self.count, first + INDEX_BLOCK))):
+                if ticker_ids is not None and ticker_id not in ticker_ids:
+                    continue
+                if not whole_block and not start <= ts <= end:
+                    continue
+                yield symbols[ticker_id], price, ts, seq, quantity
+
+    def close(self):
+        self.map.close()
+
+
+class TickLog:
+    """Every segment in a directory, read in order: ticks(tickers=None, start=None, end=None)."""
+
+    def __init__(self, directory):
+        paths = segment_paths(directory)
+        if not paths:
+            raise ValueError(f"No tick log segments in {directory}")
+        self.segments = [SegmentReader(path) for path in paths]
+
+    def __len__(self):
+        return sum(segment.count for segment in self.segments)
+
+    def ticks(self, tickers=None, start=None, end=None):
+        for segment in self.segments:
+            yield from segment.scan(tickers, start, end)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
@@ -0,0 +1,310 @@
+"""
+Streaming trade analyzer used by the tradeAnalyzerFunction Lambda (lambda_function_code.py).
+
+Reads a trades.csv (ticker,price,quantity,side,timestamp) line by line and keeps
+only one running total per ticker, so memory stays flat no matter how big the
+file is. Works on anything with a .read(n) method: an S3 StreamingBody, an open
+file, or a stub in tests.
+
+Two engines produce the same output: the default pure-Python one below, and a
+vectorized NumPy one in columnar_analyzer.py (engine='numpy').
+
+Run it locally against a file:
+    python trade_analyzer.py trades.csv -o analysis.csv [--engine numpy]
+"""
+import argparse
+import codecs
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from itertools import compress
+from operator import mul
+
+DEFAULT_READ_CHUNK_SIZE = 1024 * 1024 # Read the input 1 MB at a time
+OUTPUT_SPOOL_SIZE = 8 * 1024 * 1024 # Keep output in memory up to 8 MB, then spill to /tmp
+MAX_MALFORMED_LOGGED = 100 # Don't flood the logs if a whole file is broken
+# The first three columns are the original analysis; the rest were added later, so
+# anything reading the old file by position still works.
+OUTPUT_HEADER = ['ticker', 'total_volume', 'average_price', 'min_price', 'max_price',
+                 'buy_volume', 'sell_volume', 'trade_count']
+ENGINES = ('python', 'numpy')
+# Side column as stored by columnar_store.py (anything else is 0)
+SIDE_CODES = {'BUY': 1, 'SELL': 2}
+
+
+def iter_text_lines(stream, chunk_size=DEFAULT_READ_CHUNK_SIZE, encoding='utf-8'):
+    """
+    Yield decoded lines from a binary stream, reading `chunk_size` bytes at a time.
+    Only one chunk (plus a partial line) is ever held in memory.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    leftover = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        text = leftover + decoder.decode(chunk)
+        lines = text.split('\n')
+        leftover = lines.pop() # Last piece may be a line cut in half
+        for line in lines:
+            yield line + '\n' # Keep the newline so csv can handle quoted multi-line fields
+    leftover += decoder.decode(b'', final=True)
+    if leftover:
+        yield leftover
+
+
+def format_price(value):
+    return f"{value:.2f}"
+
+
+class TradeAnalyzer:
+    """
+    Running per-ticker totals: volume, sum of (price * quantity), trade count,
+    min/max price and buy/sell volume.
+    Feed it rows with consume_lines() / consume_stream(), then read results().
+    """
+
+    def __init__(self):
+        # {'TICKER': [total_volume, sum_price_x_quantity, trade_count, min_price, max_price, buy_volume, sell_volume]}
+        self.stock_analysis = {}
+        self.records_processed = 0
+        self.malformed_records = 0
+
+    @property
+    def ticker_count(self):
+        return len(self.stock_analysis)
+
+    def add_trade(self, ticker, price, quantity, side=None):
+        totals = self.stock_analysis.get(ticker)
+        if totals is None:
+            totals = self.stock_analysis[ticker] = [0, 0.0, 0, price, price, 0, 0]
+        totals[0] += quantity
+        # For weighted average price: sum of (price * quantity)
+        totals[1] += price * quantity
+        totals[2] += 1
+        if price < totals[3]:
+            totals[3] = price
+        if price > totals[4]:
+            totals[4] = price
+        if side == 'BUY':
+            totals[5] += quantity
+        elif side == 'SELL':
+            totals[6] += quantity
+
+    def read_header(self, reader):
+        """
+        Read the CSV header and return the column positions (ticker, price, quantity, side).
+        side is optional and comes back as None if the file has no such column.
+        """
+        header = next(reader, None)
+        if header is None:
+            return None # Empty file, analysis will be empty, which is fine
+        try:
+            columns = (header.index('ticker'), header.index('price'), header.index('quantity'))
+        except ValueError:
+            raise ValueError(f"CSV header must contain ticker, price and quantity columns, got: {header}")
+        side_idx = header.index('side') if 'side' in header else None
+        return columns + (side_idx,)
+
+    def log_malformed(self, row, error):
+        # If a row in the CSV is messed up (e.g., price isn't a number), skip it
+        self.malformed_records += 1
+        if self.malformed_records <= MAX_MALFORMED_LOGGED:
+            print(f"Skipping malformed record: {row}. Error: {error}")
+
+    def consume_lines(self, lines):
+        """Aggregate CSV text lines (header first) as they arrive."""
+        reader = csv.reader(lines)
+        columns = self.read_header(reader)
+        if columns is None:
+            return self
+        ticker_idx, price_idx, quantity_idx, side_idx = columns
+
+        add_trade = self.add_trade
+        for row in reader:
+            if not row:
+                continue # Blank line (e.g. trailing newline)
+            self.records_processed += 1
+            try:
+                side = row[side_idx] if side_idx is not None else None
+                add_trade(row[ticker_idx], float(row[price_idx]), int(row[quantity_idx]), side)
+            except (ValueError, IndexError) as e:
+                self.log_malformed(row, e)
+        return self
+
+    def consume_stream(self, stream, chunk_size=DEFAULT_READ_CHUNK_SIZE):
+        """Aggregate a binary CSV stream (S3 body, open file...) without reading it all in."""
+        return self.consume_lines(iter_text_lines(stream, chunk_size))
+
+    def consume_partition(self, ticker, price_ticks, quantities, side_codes, price_scale):
+        """
+        Aggregate one ticker's already-parsed columns (see columnar_store.py):
+        integer price ticks (price * price_scale), quantities and SIDE_CODES.
+        No text parsing, and the loops below all run inside C builtins.
+        """
+        if not quantities:
+            return
+        self.records_processed += len(quantities)
+        buy_volume = sum(compress(quantities, map(SIDE_CODES['BUY'].__eq__, side_codes)))
+        sell_volume = sum(compress(quantities, map(SIDE_CODES['SELL'].__eq__, side_codes)))
+        self.merge_totals(ticker, [sum(quantities), sum(map(mul, price_ticks, quantities)) / price_scale,
+                                   len(quantities), min(price_ticks) / price_scale,
+                                   max(price_ticks) / price_scale, buy_volume, sell_volume])
+
+    def merge_totals(self, ticker, totals):
+        """Fold one ticker's totals list (same layout as stock_analysis) into ours."""
+        current = self.stock_analysis.get(ticker)
+        if current is None:
+            self.stock_analysis[ticker] = list(totals)
+            return
+        current[0] += totals[0]
+        current[1] += totals[1]
+        current[2] += totals[2]
+        current[3] = min(current[3], totals[3])
+        current[4] = max(current[4], totals[4])
+        current[5] += totals[5]
+        current[6] += totals[6]
+
+    def merge(self, other):
+        """Add another analyzer's results (same engine) into this one, e.g. to roll several days up."""
+        for ticker, totals in other.stock_analysis.items():
+            self.merge_totals(ticker, totals)
+        self.records_processed += other.records_processed
+        self.malformed_records += other.malformed_records
+        return self
+
+    def results(self):
+        """
+        Yield one output row per ticker (see OUTPUT_HEADER).
+        Prices are formatted to 2 decimals.
+        """
+        for ticker, totals in self.stock_analysis.items():
+            total_volume, sum_price_x_quantity, trade_count, min_price, max_price, buy_volume, sell_volume = totals
+            average_price = 0
+            if total_volume > 0: # Avoid division by zero if no volume for a ticker
+                average_price = sum_price_x_quantity / total_volume
+            yield [ticker, total_volume, format_price(average_price), format_price(min_price),
+                   format_price(max_price), buy_volume, sell_volume, trade_count]
+
+    def write_csv(self, text_file):
+        """Write the analysis CSV to an open text file, one row at a time."""
+        writer = csv.writer(text_file)
+        writer.writerow(OUTPUT_HEADER)
+        rows_written = 0
+        for row in self.results():
+            writer.writerow(row)
+            rows_written += 1
+        return rows_written
+
+
+def get_analyzer(engine='python'):
+    """
+    Make an analyzer for the chosen engine:
+      'python' - pure-Python row loop (default, no dependencies)
+      'numpy'  - columnar NumPy engine (columnar_analyzer.py, needs numpy installed)
+    """
+    if engine == 'python':
+        return TradeAnalyzer()
+    if engine == 'numpy':
+        from columnar_analyzer import ColumnarTradeAnalyzer # Only import numpy when asked for
+        return ColumnarTradeAnalyzer()
+    raise ValueError(f"Unknown analysis engine '{engine}'. Use one of: {', '.join(ENGINES)}.")
+
+
+def analyze_file(input_path, output_path=None, chunk_size=DEFAULT_READ_CHUNK_SIZE, engine='python'):
+    """Analyze a local trades.csv. Writes the analysis CSV to output_path (or stdout)."""
+    analyzer = get_analyzer(engine)
+    with open(input_path, 'rb') as stream:
+        analyzer.consume_stream(stream, chunk_size)
+    if output_path:
+        with open(output_path, 'w', newline='', encoding='utf-8') as out:
+            analyzer.write_csv(out)
+    else:
+        analyzer.write_csv(sys.stdout)
+    return analyzer
+
+
+def read_s3_trades(s3_client, bucket_name, input_key, chunk_size=DEFAULT_READ_CHUNK_SIZE, engine='python'):
+    """Stream s3://bucket/input_key through a new analyzer and return it."""
+    analyzer = get_analyzer(engine)
+    response = s3_client.get_object(Bucket=bucket_name, Key=input_key)
+    body = response['Body']
+    try:
+        return analyzer.consume_stream(body, chunk_size)
+    finally:
+        body.close()
+
+
+def write_s3_analysis(s3_client, bucket_name, output_key, analyzer):
+    """
+    Write the analysis CSV to s3://bucket/output_key.
+    Rows go into a spooled temp file as they're produced (memory first, /tmp if it
+    gets big), and that file is handed to S3 as the upload body.
+    Returns the number of result rows written.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_SIZE, mode='w+b') as spool:
+        text_out = codecs.getwriter('utf-8')(spool)
+        rows_written = analyzer.write_csv(text_out)
+        spool.seek(0)
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=output_key,
+            Body=spool,
+            ContentType='text/csv'
+        )
+    return rows_written
+
+
+class LocalS3Client:
+    """
+    Tiny stand-in for boto3's S3 client that maps s3://bucket/key to
+    <root_dir>/bucket/key on disk. Lets the Lambda code run offline:
+        lambda_function_code.s3_client = LocalS3Client('./s3')
+    Only get_object / put_object (and exceptions.NoSuchKey) are supported.
+    """
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, root_dir):
+        self.root_dir = os.path.abspath(root_dir)
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root_dir, bucket, *key.split('/'))
+
+    def get_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise self.exceptions.NoSuchKey(f"No such key: {Key}")
+        return {'Body': open(path, 'rb'), 'ContentLength': os.path.getsize(path)}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            if isinstance(Body, (bytes, bytearray)):
+                out.write(Body)
+            else:
+                shutil.copyfileobj(Body, out)
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute per-ticker volume and average price from a trades CSV.")
+    parser.add_argument('input', help="Path to trades.csv")
+    parser.add_argument('-o', '--output', help="Where to write the analysis CSV (default: stdout)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_READ_CHUNK_SIZE, help="Bytes to read at a time")
+    parser.add_argument('--engine', choices=ENGINES, default='python', help="Analysis engine")
+    args = parser.parse_args(argv)
+
+    analyzer = analyze_file(args.input, args.output, args.chunk_size, args.engine)
+    print(f"Processed {analyzer.records_processed} records "
+          f"({analyzer.malformed_records} malformed) for {analyzer.ticker_count} tickers.",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class TradesApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trades_api'
+
+    def ready(self):
+        # Positions / P&L book: only in the process that serves GET /api/positions/ (see positions.py)
+        if getattr(settings, 'TRADES_POSITIONS_ENABLED', False):
+            from .positions import start_positions
+            start_positions()
@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, router
+
+from .cache import KEY_PREFIX, counters, current_generations, generation_key, get_cache
+from .models import Trade
+from .serializers import format_vwap
+from .stats import trading_day
+
+# OHLCV bars computed in the database: GET /api/trades/bars/.
+#
+# One grouped query buckets a ticker's trades by interval (epoch seconds floored to the
+# interval, so bars line up on UTC boundaries), takes each bucket's first / last price
+# with FIRST_VALUE / LAST_VALUE window functions, and aggregates high, low, volume,
+# notional and count with GROUP BY. Only the bars travel back, never the trades.
+#
+# Bars are cached a UTC day at a time, and only days that are over: a day's block is
+# stored under the same gen:<TICKER>:<day> tokens the trade listing uses (see cache.py),
+# so a late trade for that ticker and day makes exactly that block recompute. Those
+# tokens are per trading day in settings.TIME_ZONE (stats.trading_day), so a block's key
+# holds the token of every trading day its UTC day overlaps (two, off UTC). Bars of the
+# current day are always computed fresh. Blocks that go into the cache are read from
+# the primary, not the replica: a block cached from a lagging replica would miss trades
+# for up to a day, with nothing to change its key.
+
+INTERVALS = {'1m': 60, '5m': 5 * 60, '1h': 60 * 60, '1d': 24 * 60 * 60} # All divide a day evenly
+DAY = timedelta(days=1)
+DEFAULT_MAX_BARS = 50000
+DEFAULT_CACHE_TIMEOUT = 24 * 60 * 60 # Closed days; a new trade for the day changes the key anyway
+
+
+def bucket_sql(vendor, column, seconds):
+    """SQL for a timestamp column floored to `seconds`, as epoch seconds."""
+    if vendor == 'postgresql':
+        return f"(FLOOR(EXTRACT(EPOCH FROM {column}) / {seconds}) * {seconds})::bigint"
+    if vendor == 'sqlite':
+        # Whole seconds only: strftime rounds .9995 up into the next second (and bar). %% : the query has params
+        return f"(CAST(strftime('%%s', substr({column}, 1, 19)) AS INTEGER) / {seconds}) * {seconds}"
+    raise NotImplementedError(f"Bars are not supported on {vendor}")
+
+
+def query_bars(ticker, seconds, start, end, using=None):
+    """Bars for trades in [start, end), oldest first, as dicts with 'start' in epoch seconds."""
+    connection = connections[using or router.db_for_read(Trade)]
+    quote = connection.ops.quote_name
+    timestamp = quote('timestamp')
+    sql = f"""
+        SELECT bucket, MIN(open_price), MAX(price), MIN(price), MIN(close_price),
+               SUM(quantity), SUM(price * quantity), COUNT(*)
+        FROM (
+            SELECT bucket, price, quantity,
+                   FIRST_VALUE(price) OVER bar AS open_price,
+                   LAST_VALUE(price) OVER bar AS close_price
+            FROM (
+                SELECT {bucket_sql(connection.vendor, timestamp, seconds)} AS bucket,
+                       price, quantity, {timestamp}, {quote('id')}
+                FROM {quote(Trade._meta.db_table)}
+                WHERE ticker = %s AND {timestamp} >= %s AND {timestamp} < %s
+            ) trades
+            WINDOW bar AS (PARTITION BY bucket ORDER BY {timestamp}, {quote('id')}
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+        ) priced
+        GROUP BY bucket
+        ORDER BY bucket
+    """
+    params = [ticker, connection.ops.adapt_datetimefield_value(start), connection.ops.adapt_datetimefield_value(end)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    # str() first: SQLite hands back floats, PostgreSQL Decimals
+    return [
+        {
+            'start': int(bucket),
+            'open': f"{Decimal(str(open_price)):.2f}",
+            'high': f"{Decimal(str(high)):.2f}",
+            'low': f"{Decimal(str(low)):.2f}",
+            'close': f"{Decimal(str(close_price)):.2f}",
+            'volume': int(volume),
+            'vwap': format_vwap(Decimal(str(notional)), int(volume)),
+            'trade_count': count,
+        }
+        for bucket, open_price, high, low, close_price, volume, notional, count in rows
+    ]
+
+
+def align(moment, seconds, up=False):
+    """`moment` floored (or ceiled) to a bar boundary."""
+    epoch = int(moment.timestamp())
+    floored = epoch - epoch % seconds
+    if up and floored < moment.timestamp():
+        floored += seconds
+    return datetime.fromtimestamp(floored, tz=dt_timezone.utc)
+
+
+def day_start(day):
+    return datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+
+
+def trading_days(day):
+    """The trading days (settings.TIME_ZONE, as the invalidation uses) that UTC `day` overlaps."""
+    start = day_start(day)
+    return sorted({trading_day(start), trading_day(start + DAY - timedelta(microseconds=1))})
+
+
+def contiguous_runs(days):
+    """Split sorted dates into runs of consecutive days: [d1, d2, d4] -> [[d1, d2], [d4]]."""
+    runs = []
+    for day in days:
+        if runs and runs[-1][-1] + DAY == day:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def bar_range(interval, start, end):
+    """(start, end) widened to whole bars, and how many bars that is."""
+    seconds = INTERVALS[interval]
+    start = align(start, seconds)
+    end = align(end, seconds, up=True)
+    return start, end, int((end - start).total_seconds()) // seconds
+
+
+def get_bars(ticker, interval, start, end, now=None):
+    """
+    The bars for `ticker` covering [start, end) (widened to whole bars), oldest first.
+    Bars without trades are left out. Each bar is a dict with 'start' (epoch seconds),
+    open / high / low / close, volume, vwap, trade_count and 'closed' (it has ended).
+    """
+    seconds = INTERVALS[interval]
+    now = now or datetime.now(dt_timezone.utc)
+    start, end, _ = bar_range(interval, start, end)
+    days = []
+    day = start.date()
+    while day_start(day) < end:
+        days.append(day)
+        day += DAY
+
+    # Closed days come from the cache when their generation token still matches
+    cache_keys = {}
+    blocks = {}
+    closed_days = [day for day in days if day_start(day) + DAY <= now]
+    if closed_days:
+        try:
+            overlaps = {day: trading_days(day) for day in closed_days}
+            gen_keys = sorted({generation_key(ticker, local.isoformat()) for days in overlaps.values() for local in days})
+            generations = dict(zip(gen_keys, current_generations(gen_keys)))
+            cache_keys = {
+                day: f"{KEY_PREFIX}:bars:{ticker}:{interval}:{day.isoformat()}:"
+                     + "-".join(generations[generation_key(ticker, local.isoformat())] for local in local_days)
+                for day, local_days in overlaps.items()
+            }
+            found = get_cache().get_many(list(cache_keys.values()))
+            blocks = {day: found[key] for day, key in cache_keys.items() if key in found}
+        except Exception as e:
+            print(f"Cache lookup failed, serving bars from database: {e}")
+            counters.increment('errors')
+            cache_keys = {}
+    counters.increment('hits', len(blocks))
+
+    missing = [day for day in days if day not in blocks]
+    if missing:
+        # One query per run of consecutive missing days (whole days, so each block is
+        # complete), so cached days between them aren't read again
+        counters.increment('misses', len(missing))
+        fresh = {day: [] for day in missing}
+        for run in contiguous_runs(missing):
+            # A run with a day about to be cached is read from the primary (see above)
+            using = router.db_for_write(Trade) if any(day in cache_keys for day in run) else None
+            for bar in query_bars(ticker, seconds, day_start(run[0]), day_start(run[-1]) + DAY, using=using):
+                day = datetime.fromtimestamp(bar['start'], tz=dt_timezone.utc).date()
+                if day in fresh:
+                    fresh[day].append(bar)
+        blocks.update(fresh)
+        to_store = {cache_keys[day]: fresh[day] for day in missing if day in cache_keys}
+        if to_store:
+            try:
+                get_cache().set_many(to_store, timeout=getattr(settings, 'TRADES_BARS_CACHE_TIMEOUT',
+                                                               DEFAULT_CACHE_TIMEOUT))
+            except Exception as e:
+                print(f"Cache store failed: {e}")
+                counters.increment('errors')
+
+    first, last, closed_before = start.timestamp(), end.timestamp(), now.timestamp()
+    return [
+        dict(bar, closed=bar['start'] + seconds <= closed_before)
+        for day in days for bar in blocks[day]
+        if first <= bar['start'] < last
+    ]
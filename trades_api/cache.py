@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .stats import trading_day
+
+# Read-through cache for the trade listing and /api/stats/.
+#
+# Cached responses are keyed on the normalized query (ticker, dates, cursor, ...)
+# plus a "generation" token for every (ticker, day) bucket the query can see.
+# Writing a trade replaces the tokens for its own (ticker, day) bucket, so only the
+# cached queries that could include that trade stop matching; everything else
+# (other tickers, other days) keeps being served from the cache. Old entries are
+# never deleted explicitly, they just age out with their timeout.
+#
+#   gen:<TICKER>:<YYYY-MM-DD>   queries filtered to that ticker and day range
+#   gen:*:<YYYY-MM-DD>          queries over all tickers for that day range
+#   gen:<TICKER>:open / gen:*:open
+#                               queries without a bounded (<= MAX_BUCKETS_PER_QUERY days) range
+
+KEY_PREFIX = 'trades-cache'
+ALL_TICKERS = '*'
+OPEN_RANGE = 'open'
+MAX_BUCKETS_PER_QUERY = 31
+DEFAULT_TIMEOUT = 60
+
+
+class CacheCounters:
+    """Hit / miss / invalidation / error counts for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.errors = 0
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+            }
+
+
+counters = CacheCounters()
+
+
+def get_cache():
+    return caches[getattr(settings, 'TRADES_CACHE_ALIAS', 'default')]
+
+
+def new_token():
+    # A fresh random token rather than a counter: if a generation key is ever
+    # evicted, it comes back with a value no old cache entry was stored under.
+    return uuid.uuid4().hex
+
+
+def query_buckets(start, end):
+    """
+    The day buckets a query over [start, end] can see.
+    start/end may be dates, datetimes or None; unbounded or very wide ranges
+    fall back to the single OPEN_RANGE bucket.
+    """
+    if start is None or end is None:
+        return [OPEN_RANGE]
+    start_day = trading_day(start) if isinstance(start, datetime) else start
+    end_day = trading_day(end) if isinstance(end, datetime) else end
+    days = (end_day - start_day).days
+    if days < 0:
+        return [] # Empty range, nothing a write could change
+    if days >= MAX_BUCKETS_PER_QUERY:
+        return [OPEN_RANGE]
+    return [(start_day + timedelta(days=offset)).isoformat() for offset in range(days + 1)]
+
+
+def generation_key(scope, bucket):
+    return f"{KEY_PREFIX}:gen:{scope}:{bucket}"
+
+
+def current_generations(keys):
+    """Fetch the tokens for `keys` in one round trip, creating any that are missing."""
+    cache = get_cache()
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            cache.add(key, new_token(), timeout=None)
+            tokens[key] = cache.get(key)
+    return [tokens[key] for key in keys]
+
+
+def cached_response_data(namespace, params, ticker, start, end, compute):
+    """
+    Return compute() through the cache.
+    namespace: which endpoint ('trades', 'stats', ...)
+    params:    tuple of normalized query parameters that identify the response
+    ticker/start/end: what the query can see, used to pick the generation keys
+    """
+    scope = ticker or ALL_TICKERS
+    gen_keys = [generation_key(scope, bucket) for bucket in query_buckets(start, end)]
+    try:
+        generations = current_generations(gen_keys)
+        digest = hashlib.sha1(repr((params, generations)).encode('utf-8')).hexdigest()
+        key = f"{KEY_PREFIX}:{namespace}:{digest}"
+        data = get_cache().get(key)
+    except Exception as e:
+        # The cache is an optimization: if Redis is down, just go to the database
+        print(f"Cache lookup failed, serving from database: {e}")
+        counters.increment('errors')
+        return compute()
+
+    if data is not None:
+        counters.increment('hits')
+        return data
+
+    counters.increment('misses')
+    data = compute()
+    try:
+        get_cache().set(key, data, timeout=getattr(settings, 'TRADES_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    except Exception as e:
+        print(f"Cache store failed: {e}")
+        counters.increment('errors')
+    return data
+
+
+def invalidate_trades(trades):
+    """
+    Call after trades are committed: replaces the generation tokens for every
+    (ticker, day) the trades touch, plus the open-range tokens, in one round trip.
+    """
+    keys = set()
+    for trade in trades:
+        day = trading_day(trade.timestamp).isoformat()
+        for scope in (trade.ticker, ALL_TICKERS):
+            keys.add(generation_key(scope, day))
+            keys.add(generation_key(scope, OPEN_RANGE))
+    if not keys:
+        return
+    try:
+        get_cache().set_many({key: new_token() for key in keys}, timeout=None)
+        counters.increment('invalidations', len(keys))
+    except Exception as e:
+        print(f"Cache invalidation failed: {e}")
+        counters.increment('errors')
+
+
+def cache_stats():
+    """Counters for this process, plus server-side evictions when the backend is Redis."""
+    stats = counters.snapshot()
+    stats['backend'] = get_cache().__class__.__name__
+    stats['evictions'] = None
+    try:
+        client = get_cache()._cache.get_client()
+        stats['evictions'] = client.info('stats').get('evicted_keys')
+    except Exception:
+        pass # Not Redis (e.g. local-memory cache in tests), or Redis unreachable
+    return stats
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads of the trades_api models (trade listing, stats, export) to the 'replica'
+    database; writes and everything else stay on 'default', the primary.
+    Installed by settings.py when DB_REPLICA_HOST is set.
+
+    Reads made inside a transaction on the primary stay on the primary, so code that
+    writes and then reads back always sees its own rows. Other reads can be behind by
+    the replication lag: a new trade may take that long to show up in listings (and a
+    listing cached during that window keeps it out for up to TRADES_CACHE_TIMEOUT).
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'trades_api' or not getattr(settings, 'TRADES_READ_FROM_REPLICA', True):
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Same data on both
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return False if db == REPLICA else None
@@ -0,0 +1,56 @@
+import csv
+import io
+import json
+
+from .serializers import FastTradeSerializer, make_timestamp_formatter
+
+# Columns in the order the API returns them
+EXPORT_FIELDS = list(FastTradeSerializer.fields)
+
+
+def iter_trade_rows(queryset, chunk_size):
+    """
+    Yield one list of plain tuples per database chunk.
+    values_list() skips building Trade objects, and iterator() stops Django from
+    caching the whole result set (on PostgreSQL it uses a server-side cursor).
+    """
+    chunk = []
+    for row in queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_csv(queryset, chunk_size):
+    """Yield the CSV export one chunk of rows at a time, header first."""
+    format_timestamp = make_timestamp_formatter()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+
+    for chunk in iter_trade_rows(queryset, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (trade_id, ticker, format(price, 'f'), quantity, side, format_timestamp(timestamp))
+            for trade_id, ticker, price, quantity, side, timestamp in chunk
+        )
+        yield buffer.getvalue()
+
+
+def stream_ndjson(queryset, chunk_size):
+    """Yield the NDJSON export (one JSON object per line) one chunk of rows at a time."""
+    serializer = FastTradeSerializer()
+    for chunk in iter_trade_rows(queryset, chunk_size):
+        yield ''.join(json.dumps(serializer.to_representation(row)) + '\n' for row in chunk)
+
+
+# format name -> (content type, generator function)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
@@ -0,0 +1,120 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from trades_api.bars import INTERVALS
+from trades_api.cache import invalidate_trades
+from trades_api.models import Trade
+
+TICKER = 'BARSX'
+DAY = datetime(2000, 1, 4, tzinfo=timezone.utc) # Long closed, so its bars are cacheable
+
+
+def client_side_bars(lines, seconds):
+    """What a client has to do without the endpoint: aggregate the raw trades itself."""
+    bars = {}
+    for line in lines:
+        trade = json.loads(line)
+        ts = datetime.fromisoformat(trade['timestamp'].replace('Z', '+00:00'))
+        bucket = int(ts.timestamp()) // seconds * seconds
+        price = Decimal(trade['price'])
+        key = (ts, trade['id'])
+        bar = bars.get(bucket)
+        if bar is None:
+            bars[bucket] = bar = {'first': key, 'open': price, 'last': key, 'close': price,
+                                  'high': price, 'low': price, 'volume': 0, 'notional': Decimal('0'), 'count': 0}
+        if key < bar['first']:
+            bar['first'], bar['open'] = key, price
+        if key > bar['last']:
+            bar['last'], bar['close'] = key, price
+        bar['high'] = max(bar['high'], price)
+        bar['low'] = min(bar['low'], price)
+        bar['volume'] += trade['quantity']
+        bar['notional'] += price * trade['quantity']
+        bar['count'] += 1
+    return bars
+
+
+# Usage: python manage.py bench_bars --trades 200000 --interval 1m
+#
+# Seeds --trades trades for one ticker over one (past) day, then fetches that day as
+#   raw     - GET /api/trades/export/?format=ndjson and the client building the bars itself
+#   bars    - GET /api/trades/bars/ the first time (computed in SQL)
+#   cached  - the same request again (served from the cache)
+# and reports bytes and time for each, after checking the SQL bars match the client-side ones.
+class Command(BaseCommand):
+    help = "Compare downloading raw trades and aggregating client-side against GET /api/trades/bars/."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=200000, help="Trades to seed for the day.")
+        parser.add_argument('--interval', default='1m', choices=list(INTERVALS))
+
+    def handle(self, *args, **options):
+        client = APIClient()
+        seconds = INTERVALS[options['interval']]
+        day = DAY.date().isoformat()
+        trades = self.seed(options['trades'])
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver'], TRADES_READ_FROM_REPLICA=False):
+                started = time.perf_counter()
+                response = client.get(reverse('trade-export'), {'format': 'ndjson', 'ticker': TICKER,
+                                                                'start_date': DAY.isoformat(),
+                                                                'end_date': (DAY + timedelta(days=1)).isoformat()})
+                raw = b''.join(response.streaming_content)
+                expected = client_side_bars(raw.splitlines(), seconds)
+                raw_elapsed = time.perf_counter() - started
+
+                bars_url = reverse('trade-bars')
+                params = {'ticker': TICKER, 'interval': options['interval'], 'start_date': day, 'end_date': day}
+                timings = []
+                for _ in range(2): # Cold, then cached
+                    started = time.perf_counter()
+                    response = client.get(bars_url, params)
+                    timings.append((time.perf_counter() - started, len(response.content)))
+                    if response.status_code != 200:
+                        raise CommandError(f"Bars request failed: {response.status_code} {response.content!r}")
+                bars = response.data['bars']
+        finally:
+            Trade.objects.filter(id__in=[trade.id for trade in trades]).delete()
+            invalidate_trades(trades)
+
+        self.compare(bars, expected)
+        (cold, size), (warm, _) = timings
+        self.stdout.write(f"{len(trades)} trades -> {len(bars)} {options['interval']} bars")
+        self.stdout.write(f"Raw trades + client aggregation: {len(raw):>12,} bytes  {raw_elapsed * 1000:9.1f}ms")
+        self.stdout.write(f"Bars (computed in SQL):          {size:>12,} bytes  {cold * 1000:9.1f}ms")
+        self.stdout.write(f"Bars (cached):                   {size:>12,} bytes  {warm * 1000:9.1f}ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(raw) / size:.0f}x fewer bytes, {raw_elapsed / cold:.0f}x faster cold, {raw_elapsed / warm:.0f}x cached"
+        ))
+
+    def seed(self, count):
+        rng = random.Random(3)
+        price = 100.0
+        trades = []
+        for offset in sorted(rng.uniform(0, 86400) for _ in range(count)):
+            price = max(1.0, price + rng.gauss(0, 0.05))
+            trades.append(Trade(ticker=TICKER, price=f"{price:.2f}", quantity=rng.randint(1, 500),
+                                side=rng.choice(['BUY', 'SELL']), timestamp=DAY + timedelta(seconds=offset)))
+        trades = Trade.objects.bulk_create(trades, batch_size=5000)
+        invalidate_trades(trades) # Like any write: nothing cached for this day survives
+        return trades
+
+    def compare(self, bars, expected):
+        if len(bars) != len(expected):
+            raise CommandError(f"{len(bars)} bars from SQL, {len(expected)} from the raw trades")
+        for bar in bars:
+            bucket = int(datetime.fromisoformat(bar['start'].replace('Z', '+00:00')).timestamp())
+            want = expected[bucket]
+            got = (bar['open'], bar['high'], bar['low'], bar['close'], bar['volume'], bar['vwap'], bar['trade_count'])
+            wanted = (f"{want['open']:.2f}", f"{want['high']:.2f}", f"{want['low']:.2f}", f"{want['close']:.2f}",
+                      want['volume'], f"{want['notional'] / want['volume']:.4f}", want['count'])
+            if got != wanted:
+                raise CommandError(f"Bar at {bar['start']} differs: SQL {got}, raw trades {wanted}")
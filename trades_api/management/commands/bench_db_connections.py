@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+from trades_api.models import Trade
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Usage: python manage.py bench_db_connections --requests 2000
+#
+# Replays the database side of GET /api/trades/ --requests times: Django's request_started /
+# request_finished signals (which is when Django opens, checks and closes connections) around
+# one first-page listing query. Runs it twice:
+#   per request - CONN_MAX_AGE=0 and no pool, a new connection every request (the old settings)
+#   configured  - the settings as they are (persistent connections, or the pool if DB_POOL_MAX_SIZE is set)
+# The difference in time per request is the connection setup the configured settings save.
+# ("connects" counts Django connecting; with the pool that's a checkout of an open connection.)
+class Command(BaseCommand):
+    help = "Compare per-request database time with a new connection per request against the configured pooling."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Simulated requests per run.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database alias to use (e.g. replica).")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections.settings:
+            raise CommandError(f"No database '{alias}' in settings.DATABASES")
+        connection = connections[alias]
+        self.stdout.write(f"{options['requests']} requests against '{alias}' ({connection.settings_dict['HOST']})")
+
+        before = self.run(alias, options['requests'], {'CONN_MAX_AGE': 0, 'OPTIONS': {
+            name: value for name, value in connection.settings_dict.get('OPTIONS', {}).items() if name != 'pool'
+        }})
+        after = self.run(alias, options['requests'], {})
+        self.report("Per request", *before)
+        pooled = 'pool' in connection.settings_dict.get('OPTIONS', {})
+        self.report(f"Configured ({'pool' if pooled else 'CONN_MAX_AGE=%s' % connection.settings_dict['CONN_MAX_AGE']})",
+                    *after)
+        saved = (sum(before[1]) / len(before[1]) - sum(after[1]) / len(after[1])) * 1000
+        self.stdout.write(self.style.SUCCESS(f"Connection setup saved: {saved:.2f}ms per request"))
+
+    def run(self, alias, requests, overrides):
+        """(connections opened, seconds per request) with settings_dict temporarily changed."""
+        connection = connections[alias]
+        original = {name: connection.settings_dict.get(name) for name in overrides}
+        connection.close()
+        connection.settings_dict.update(overrides)
+        opened = 0
+
+        def count(sender, connection, **kwargs):
+            nonlocal opened
+            if connection.alias == alias:
+                opened += 1
+
+        connection_created.connect(count)
+        timings = []
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                list(Trade.objects.using(alias).order_by('-timestamp', '-id').values_list('id', flat=True)[:50])
+                request_finished.send(sender=self.__class__)
+                timings.append(time.perf_counter() - started)
+        finally:
+            connection_created.disconnect(count)
+            connection.close()
+            connection.settings_dict.update(original)
+        return opened, timings
+
+    def report(self, label, opened, timings):
+        self.stdout.write(
+            f"{label + ':':28} {opened:6} connects  {len(timings) / sum(timings):8,.0f} requests/s  "
+            f"mean {sum(timings) / len(timings) * 1000:6.2f}ms  p50 {percentile(timings, 0.5) * 1000:6.2f}ms  "
+            f"p99 {percentile(timings, 0.99) * 1000:6.2f}ms"
+        )
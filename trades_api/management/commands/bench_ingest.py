@@ -0,0 +1,75 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from trades_api import views
+from trades_api.models import Trade
+
+TICKERS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN"]
+
+
+def make_rows(count):
+    """Generate `count` valid trade payloads."""
+    start = datetime(2024, 5, 15, 9, 30, tzinfo=timezone.utc)
+    return [
+        {
+            'ticker': random.choice(TICKERS),
+            'price': f"{random.uniform(10, 500):.2f}",
+            'quantity': random.randint(1, 1000),
+            'side': random.choice(['BUY', 'SELL']),
+            'timestamp': (start + timedelta(seconds=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+# Usage: python manage.py bench_ingest --rows 5000 --chunk-size 1000
+class Command(BaseCommand):
+    help = "Compare rows/sec of the single-row POST /api/trades/ path against POST /api/trades/bulk/."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help="Rows to insert through each path.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="chunk_size for the bulk endpoint.")
+
+    def handle(self, *args, **options):
+        rows = make_rows(options['rows'])
+        client = APIClient()
+        created_ids = []
+
+        # We are measuring the HTTP + database path, not Celery, so the
+        # notification batcher is swapped out and nothing is sent to Redis.
+        # ALLOWED_HOSTS is widened so the in-process test client is accepted.
+        with override_settings(ALLOWED_HOSTS=['testserver']), \
+             mock.patch.object(views, 'queue_trade_notifications'):
+            try:
+                single_url = reverse('trade-list-create')
+                started = time.perf_counter()
+                for row in rows:
+                    response = client.post(single_url, row, format='json')
+                    if response.status_code != 201:
+                        raise CommandError(f"Single-row POST failed: {response.status_code} {response.content!r}")
+                    created_ids.append(response.data['id'])
+                single_elapsed = time.perf_counter() - started
+
+                bulk_url = f"{reverse('trade-bulk-create')}?chunk_size={options['chunk_size']}"
+                started = time.perf_counter()
+                response = client.post(bulk_url, rows, format='json')
+                bulk_elapsed = time.perf_counter() - started
+                if response.status_code != 201:
+                    raise CommandError(f"Bulk POST failed: {response.status_code} {response.content!r}")
+                created_ids.extend(response.data['ids'])
+            finally:
+                # Don't leave benchmark rows behind
+                Trade.objects.filter(id__in=created_ids).delete()
+
+        single_rate = len(rows) / single_elapsed
+        bulk_rate = len(rows) / bulk_elapsed
+        self.stdout.write(f"Single-row path: {len(rows)} rows in {single_elapsed:.2f}s ({single_rate:,.0f} rows/sec)")
+        self.stdout.write(f"Bulk path:       {len(rows)} rows in {bulk_elapsed:.2f}s ({bulk_rate:,.0f} rows/sec)")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {bulk_rate / single_rate:.1f}x"))
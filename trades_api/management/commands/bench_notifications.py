@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from trades_api.notifications import NotificationBatcher, deliver_notifications
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def submit_trades(count, rate, add):
+    """Call add(details) for `count` trades, `rate` per second (0 = as fast as possible)."""
+    started = time.perf_counter()
+    for index in range(count):
+        if rate:
+            delay = started + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        add({'id': index, 'ticker': 'AAPL', 'price': '150.00', 'quantity': 10, 'side': 'BUY'})
+
+
+# Both paths run against the same simulated Celery worker pool (--workers threads, one task at a
+# time each, like the prefork pool) and the same simulated external call (--send-seconds), so
+# nothing touches Redis or the database.
+# Usage: python manage.py bench_notifications --trades 2000 --rate 1000 --workers 8 --send-seconds 0.05
+class Command(BaseCommand):
+    help = "Compare one blocking notification task per trade against micro-batched async delivery."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=2000, help="Trades to notify about.")
+        parser.add_argument('--rate', type=float, default=1000, help="Trades created per second (0 = all at once).")
+        parser.add_argument('--workers', type=int, default=8, help="Simulated Celery worker concurrency.")
+        parser.add_argument('--send-seconds', type=float, default=0.05, help="Simulated external call per notification.")
+        parser.add_argument('--batch-size', type=int, default=500, help="TRADES_NOTIFY_BATCH_SIZE")
+        parser.add_argument('--max-wait', type=float, default=0.25, help="TRADES_NOTIFY_MAX_WAIT")
+        parser.add_argument('--concurrency', type=int, default=100, help="TRADES_NOTIFY_CONCURRENCY")
+
+    def handle(self, *args, **options):
+        count = options['trades']
+        self.stdout.write(f"{count} trades at {options['rate'] or 'unlimited'}/s, {options['workers']} workers, "
+                          f"{options['send_seconds'] * 1000:.0f}ms per external call")
+        per_trade = self.run_per_trade(options)
+        batched = self.run_batched(options)
+        self.report("One task per trade", *per_trade)
+        self.report("Batched", *batched)
+        self.stdout.write(self.style.SUCCESS(
+            f"Broker messages: {per_trade[0] / batched[0]:.0f}x fewer, "
+            f"throughput: {batched[1] / per_trade[1]:.1f}x"
+        ))
+
+    def run_per_trade(self, options):
+        """The old path: every trade is its own task, which blocks its worker for the whole call."""
+        latencies = []
+        lock = threading.Lock()
+
+        def task(queued_at):
+            time.sleep(options['send_seconds'])
+            with lock:
+                latencies.append(time.time() - queued_at)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['workers']) as pool:
+            submit_trades(options['trades'], options['rate'], lambda details: pool.submit(task, time.time()))
+        elapsed = time.perf_counter() - started
+        return options['trades'], options['trades'] / elapsed, latencies, [1] * options['trades'], None
+
+    def run_batched(self, options):
+        """The new path: NotificationBatcher -> one task per batch -> deliver_notifications on an event loop."""
+        latencies = []
+        batch_sizes = []
+        lock = threading.Lock()
+
+        def task(batch):
+            sent, _ = asyncio.run(deliver_notifications(batch, options['concurrency'], options['send_seconds']))
+            with lock:
+                latencies.extend(sent)
+                batch_sizes.append(len(batch))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['workers']) as pool:
+            batcher = NotificationBatcher(lambda batch: pool.submit(task, batch), options['batch_size'],
+                                          options['max_wait'])
+            submit_trades(options['trades'], options['rate'], lambda details: batcher.add([details]))
+            batcher.flush() # Whatever the last window holds; a real process would send it max_wait later
+        elapsed = time.perf_counter() - started
+        return len(batch_sizes), options['trades'] / elapsed, latencies, batch_sizes, batcher.snapshot()
+
+    def report(self, label, messages, rate, latencies, batch_sizes, snapshot):
+        self.stdout.write(
+            f"{label + ':':20} {messages:6} broker messages  {rate:10,.0f} notifications/s  "
+            f"latency p50 {percentile(latencies, 0.5) * 1000:8.1f}ms  p99 {percentile(latencies, 0.99) * 1000:8.1f}ms  "
+            f"mean batch {sum(batch_sizes) / len(batch_sizes):.0f}"
+        )
+        if snapshot:
+            self.stdout.write(f"{'':20} flushed on size {snapshot['flushed_on_size']}, time {snapshot['flushed_on_time']}, "
+                              f"shutdown {snapshot['flushed_on_shutdown']}; max pending {snapshot['max_pending_seen']}")
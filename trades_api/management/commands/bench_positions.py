@@ -0,0 +1,191 @@
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trades_api.models import Trade
+from trades_api.positions import CENTS, PositionBook, load_positions_from_db
+
+DB_TICKER_PREFIX = 'PNLB' # Seeded for the warm start part, deleted afterwards
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def revalue_everything(book):
+    """What an engine without incremental marks does on every tick batch: re-mark every position."""
+    total = 0.0
+    for position in book.positions.values():
+        if position.net and position.price is not None:
+            total += position.net * (position.price - position.cost)
+    return total
+
+
+# Usage: python manage.py bench_positions --positions 100000 --rate 50000 --seconds 5
+#
+#   trades     - apply --trades-per-position trades to each of --positions tickers
+#   marks      - feed ticks as fast as possible, in batches like the feed's (--batch per frame)
+#   revalue    - the same batches, re-marking every position per batch instead (a few batches only)
+#   paced      - feed --rate ticks/sec for --seconds and report how far behind schedule it falls
+#   warm start - seed --db-trades trades and warm-start a book from them, checked against applying
+#                the same trades one at a time
+# Then checks the running unrealized total and realized + unrealized against a recomputation.
+class Command(BaseCommand):
+    help = "Benchmark the positions / P&L engine: trade application, tick marking and warm start."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--positions', type=int, default=100000, help="Tickers with an open position.")
+        parser.add_argument('--trades-per-position', type=int, default=3)
+        parser.add_argument('--rate', type=int, default=50000, help="Ticks per second for the paced run.")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Length of the paced run.")
+        parser.add_argument('--batch', type=int, default=500, help="Ticks per feed batch.")
+        parser.add_argument('--db-trades', type=int, default=50000, help="Trades seeded for the warm start (0 skips it).")
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        count = options['positions']
+        tickers = [f"P{index:07d}" for index in range(count)]
+        prices = {ticker: rng.uniform(5, 500) for ticker in tickers}
+        book = PositionBook()
+
+        trades = []
+        for ticker in tickers:
+            for _ in range(options['trades_per_position']):
+                price = f"{prices[ticker] * rng.uniform(0.95, 1.05):.2f}"
+                trades.append((ticker, rng.choice(['BUY', 'BUY', 'SELL']), rng.randint(1, 500), price))
+        started = time.perf_counter()
+        for trade in trades:
+            book.apply_trade(*trade)
+        applied = time.perf_counter() - started
+        self.stdout.write(f"{len(trades):,} trades applied in {applied * 1000:.0f}ms "
+                          f"({len(trades) / applied:,.0f} trades/s, one at a time)")
+
+        batches = self.make_batches(rng, tickers, prices, options['batch'], max(200, -(-count // options['batch'])))
+        ticks = sum(len(batch) for batch in batches)
+        started = time.perf_counter()
+        for batch in batches:
+            book.mark_updates(batch)
+        marked = time.perf_counter() - started
+        self.stdout.write(f"Marks:   {ticks:,} ticks in {marked * 1000:.0f}ms ({ticks / marked:,.0f} ticks/s, "
+                          f"{marked / ticks * 1e9:.0f}ns per tick)")
+
+        revalue_batches = batches[:5]
+        started = time.perf_counter()
+        for batch in revalue_batches:
+            for update in batch:
+                position = book.positions[update['ticker']]
+                position.price = float(update['price'])
+            revalue_everything(book)
+        revalued = time.perf_counter() - started
+        revalued_ticks = sum(len(batch) for batch in revalue_batches)
+        self.stdout.write(f"Revalue: {revalued_ticks:,} ticks in {revalued * 1000:.0f}ms "
+                          f"({revalued_ticks / revalued:,.0f} ticks/s re-marking all {count:,} positions per batch)")
+        # Put the book back in step with the prices the revalue run set
+        for batch in revalue_batches:
+            book.mark_updates(batch)
+
+        lags, busy, sent, elapsed = self.paced(book, batches, options['rate'], options['seconds'], options['batch'])
+        achieved = sent / elapsed
+        line = (f"Paced:   {sent:,} ticks at {achieved:,.0f}/s (target {options['rate']:,}/s), "
+                f"lag p50 {percentile(lags, 0.5) * 1000:.2f}ms p99 {percentile(lags, 0.99) * 1000:.2f}ms "
+                f"max {max(lags) * 1000:.2f}ms, busy {busy / elapsed:.0%} of one core")
+        self.stdout.write(self.style.SUCCESS(line) if achieved >= options['rate'] * 0.98 else self.style.WARNING(line))
+
+        self.verify(book) # Before snapshot(), which re-sums the running total
+        started = time.perf_counter()
+        snapshot = book.snapshot()
+        self.stdout.write(f"Snapshot: {len(snapshot['positions']):,} open positions in "
+                          f"{(time.perf_counter() - started) * 1000:.0f}ms, totals {snapshot['totals']}")
+
+        if options['db_trades']:
+            self.warm_start(rng, options['db_trades'])
+
+    def make_batches(self, rng, tickers, prices, size, count):
+        """`count` batches of `size` ticks; every ticker gets a price before any gets a second one."""
+        order = []
+        while len(order) < size * count:
+            order.extend(rng.sample(tickers, len(tickers)))
+        batches = []
+        for start in range(0, size * count, size):
+            batch = []
+            for ticker in order[start:start + size]:
+                prices[ticker] *= 1 + rng.gauss(0, 0.001)
+                batch.append({'ticker': ticker, 'price': round(prices[ticker], 4)})
+            batches.append(batch)
+        return batches
+
+    def paced(self, book, batches, rate, seconds, size):
+        """Hand batches to the book on the schedule a rate-ticks/sec feed would. Returns lags, busy time, ticks, elapsed."""
+        interval = size / rate
+        lags = []
+        busy = 0.0
+        sent = 0
+        started = time.perf_counter()
+        index = 0
+        while True:
+            due = started + index * interval
+            if due - started >= seconds:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            begin = time.perf_counter()
+            batch = batches[index % len(batches)]
+            book.mark_updates(batch)
+            done = time.perf_counter()
+            busy += done - begin
+            lags.append(done - due) # Behind schedule, including the batch's own processing
+            sent += len(batch)
+            index += 1
+        return lags, busy, sent, time.perf_counter() - started
+
+    def verify(self, book):
+        positions = list(book.positions.values())
+        fresh = math.fsum(position.net * (position.price - position.cost)
+                          for position in positions if position.net and position.price is not None)
+        running = book.unrealized_total # Kept up by adding each mark's difference
+        worst = 0.0
+        for position in positions:
+            if position.price is None:
+                continue
+            exact = (position.sold_cents - position.bought_cents) / CENTS + position.net * position.price
+            worst = max(worst, abs(position.realized + position.unrealized - exact))
+        if abs(fresh - running) > 0.01 or worst > 0.01:
+            raise CommandError(f"P&L mismatch: running {running:.4f} vs recomputed {fresh:.4f}, worst position {worst:.6f}")
+        self.stdout.write(f"Verified: unrealized {fresh:,.2f} matches a full recomputation; "
+                          f"realized + unrealized within {worst:.2g} of the exact total for every position")
+
+    def warm_start(self, rng, count):
+        start = datetime(2000, 1, 3, tzinfo=timezone.utc)
+        rows = [
+            Trade(ticker=f"{DB_TICKER_PREFIX}{rng.randrange(1000):04d}", price=f"{rng.uniform(5, 500):.2f}",
+                  quantity=rng.randint(1, 500), side=rng.choice(['BUY', 'SELL']),
+                  timestamp=start + timedelta(seconds=index))
+            for index in range(count)
+        ]
+        Trade.objects.bulk_create(rows, batch_size=5000)
+        try:
+            loaded = PositionBook()
+            started = time.perf_counter()
+            load_positions_from_db(loaded)
+            warm = time.perf_counter() - started
+
+            replayed = PositionBook()
+            for row in Trade.objects.order_by('timestamp', 'id').values_list('ticker', 'side', 'quantity', 'price').iterator(chunk_size=5000):
+                replayed.apply_trade(*row)
+            total = Trade.objects.count()
+        finally:
+            Trade.objects.filter(ticker__startswith=DB_TICKER_PREFIX).delete()
+
+        def state(book):
+            return {ticker: (p.net, p.cost, p.realized, p.bought_cents, p.sold_cents) for ticker, p in book.positions.items()}
+        if state(loaded) != state(replayed):
+            raise CommandError("Warm start differs from applying the trades one at a time")
+        self.stdout.write(self.style.SUCCESS(
+            f"Warm start over {total:,} trades: {warm * 1000:.0f}ms ({total / warm:,.0f} trades/s), "
+            f"same book as applying them one at a time"
+        ))
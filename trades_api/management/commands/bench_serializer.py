@@ -0,0 +1,65 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from trades_api.models import Trade
+from trades_api.serializers import FastTradeSerializer, TradeSerializer
+
+TICKERS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN"]
+
+
+def make_trades(count):
+    """Build `count` unsaved Trade objects plus the matching values_list() tuples."""
+    rng = random.Random(42)
+    start = datetime(2024, 5, 15, 9, 30, tzinfo=timezone.utc)
+    trades = []
+    rows = []
+    for i in range(count):
+        trade = Trade(
+            id=i + 1,
+            ticker=rng.choice(TICKERS),
+            price=Decimal(f"{rng.uniform(10, 500):.2f}"),
+            quantity=rng.randint(1, 1000),
+            side=rng.choice(['BUY', 'SELL']),
+            timestamp=start + timedelta(seconds=i, microseconds=rng.choice([0, 123456])),
+        )
+        trades.append(trade)
+        rows.append((trade.id, trade.ticker, trade.price, trade.quantity, trade.side, trade.timestamp))
+    return trades, rows
+
+
+def time_it(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+# Usage: python manage.py bench_serializer --rows 10000 100000 1000000
+# No database needed: the rows are built in memory so only serialization is measured.
+class Command(BaseCommand):
+    help = "Compare TradeSerializer and FastTradeSerializer throughput (and check their JSON is identical)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        for count in options['rows']:
+            trades, rows = make_trades(count)
+
+            drf_data, drf_elapsed = time_it(lambda: TradeSerializer(trades, many=True).data)
+            fast_data, fast_elapsed = time_it(lambda: FastTradeSerializer(rows, many=True).data)
+
+            if renderer.render(drf_data) != renderer.render(fast_data):
+                raise CommandError(f"JSON output differs between serializers at {count} rows")
+
+            self.stdout.write(
+                f"{count:>9} rows | TradeSerializer {count / drf_elapsed:>10,.0f} rows/sec"
+                f" | FastTradeSerializer {count / fast_elapsed:>10,.0f} rows/sec"
+                f" | {drf_elapsed / fast_elapsed:.1f}x"
+            )
+        self.stdout.write(self.style.SUCCESS("JSON output identical for every run."))
@@ -0,0 +1,158 @@
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from trades_api.models import Trade
+from trades_api.partitions import (
+    TABLE, ensure_partitions, get_interval, interval_start, is_partitioned, list_partitions, partition_name, shift,
+)
+
+TICKERS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN", "NVDA", "META", "NFLX", "AMD", "INTC"]
+SEED_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SEED_CHUNK_SIZE = 10000
+PARTITION = re.compile(rf"\b{TABLE}_(?:p\d{{4}}_\d{{2}}(?:_\d{{2}})?|default)\b")
+
+
+# Usage: python manage.py explain_trades --seed 1000000
+#
+# Seeds the trade table to a realistic size and shows what GET /api/trades/ costs there:
+# time and query count for page one, a ticker filter, a date range and a deep cursor page,
+# with their EXPLAIN plans on PostgreSQL, and which partitions a date range reads on a
+# partitioned table. The pass / fail checks (one query per page, index plans, partition
+# pruning) are tests: python manage.py test trades_api.
+class Command(BaseCommand):
+    help = "Seed the trade table and time / EXPLAIN the trade listing at that size."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Make sure the table holds at least this many rows (e.g. 1000000).")
+        parser.add_argument('--deep-pages', type=int, default=200,
+                            help="How many cursor pages to walk for the deep page.")
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--no-plans', action='store_true', help="Only print timings, not EXPLAIN plans.")
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+
+        self.client = APIClient()
+        self.show_plans = not options['no_plans']
+        url = reverse('trade-list-create')
+        page_size = options['page_size']
+
+        # ALLOWED_HOSTS is widened so the in-process test client is accepted.
+        # Reads stay on the primary, where the rows were just seeded and the queries are captured.
+        with override_settings(ALLOWED_HOSTS=['testserver'], TRADES_READ_FROM_REPLICA=False):
+            self.measure("first page", url, {'page_size': page_size})
+            self.measure("ticker filter", url, {'ticker': TICKERS[0], 'page_size': page_size})
+            self.measure("date range", url,
+                         {'start_date': (SEED_START + timedelta(days=1)).isoformat(),
+                          'end_date': (SEED_START + timedelta(days=2)).isoformat(),
+                          'page_size': page_size})
+            self.measure_deep_page(url, page_size, options['deep_pages'])
+            self.measure_partitions(url, page_size)
+
+    def seed(self, target_rows):
+        existing = Trade.objects.count()
+        missing = target_rows - existing
+        if missing <= 0:
+            self.stdout.write(f"Table already has {existing} rows, not seeding.")
+            return
+
+        self.stdout.write(f"Seeding {missing} trades...")
+        started = time.perf_counter()
+        rng = random.Random(42)
+        for chunk_start in range(existing, target_rows, SEED_CHUNK_SIZE):
+            chunk_end = min(chunk_start + SEED_CHUNK_SIZE, target_rows)
+            Trade.objects.bulk_create([
+                Trade(
+                    ticker=rng.choice(TICKERS),
+                    price=f"{rng.uniform(10, 500):.2f}",
+                    quantity=rng.randint(1, 1000),
+                    side=rng.choice(['BUY', 'SELL']),
+                    # One trade per second, several share a timestamp to exercise the id tie-break
+                    timestamp=SEED_START + timedelta(seconds=i // 3),
+                )
+                for i in range(chunk_start, chunk_end)
+            ])
+        if is_partitioned(connection):
+            # Seed rows are in the past; give them their partitions instead of the default one
+            ensure_partitions(connection, since=SEED_START)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Trade._meta.db_table}")
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s.")
+
+    def get(self, url, params):
+        """GET the listing and return (response, captured queries, elapsed seconds)."""
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = self.client.get(url, params)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} {params} returned {response.status_code}")
+        return response, ctx.captured_queries, elapsed
+
+    def measure(self, name, url, params):
+        response, queries, elapsed = self.get(url, params)
+        self.stdout.write(f"\n== {name}: {len(response.data['results'])} rows, "
+                          f"{len(queries)} queries, {elapsed * 1000:.1f} ms")
+        self.show_plan(queries)
+
+    def show_plan(self, queries):
+        if not self.show_plans or not queries or connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {queries[-1]['sql']}")
+            self.stdout.write("\n".join(row[0] for row in cursor.fetchall()))
+
+    def measure_partitions(self, url, page_size):
+        if not is_partitioned(connection):
+            self.stdout.write("\n== partition pruning: table not partitioned, skipped")
+            return
+        start = SEED_START + timedelta(days=1)
+        end = SEED_START + timedelta(days=2)
+        _, queries, _ = self.get(url, {'start_date': start.isoformat(), 'end_date': end.isoformat(),
+                                       'page_size': page_size})
+        # The partitions that can hold trades in [start, end]
+        interval = get_interval()
+        expected = set()
+        bucket = interval_start(start, interval)
+        while bucket <= end:
+            expected.add(partition_name(bucket, interval))
+            bucket = shift(bucket, interval, 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {queries[-1]['sql']}")
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        read = set(PARTITION.findall(plan))
+        self.stdout.write(f"\n== partition pruning: the date range reads {len(read)} of "
+                          f"{len(list_partitions(connection)) + 1} partitions ({', '.join(sorted(read)) or 'none'}; "
+                          f"expected {', '.join(sorted(expected))})")
+
+    def measure_deep_page(self, url, page_size, deep_pages):
+        params = {'page_size': page_size}
+        response, _, first_elapsed = self.get(url, params)
+        next_link = response.data['next']
+
+        # Follow the cursor links page after page, like a client would
+        pages_walked = 0
+        while next_link and pages_walked < deep_pages:
+            response, queries, elapsed = self.get(next_link, {})
+            next_link = response.data['next']
+            pages_walked += 1
+
+        if not pages_walked:
+            self.stdout.write("\n== deep page: not enough rows to page, skipped")
+            return
+
+        self.stdout.write(f"\n== deep page #{pages_walked + 1}: {len(queries)} queries, "
+                          f"{elapsed * 1000:.1f} ms (page one took {first_elapsed * 1000:.1f} ms)")
+        self.show_plan(queries)
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from trades_api.partitions import (
+    DEFAULT_PARTITION, default_partition_rows, detach_partitions_before, ensure_partitions, get_interval,
+    is_partitioned, list_partitions, retention_cutoff,
+)
+
+
+# Usage:
+#   python manage.py manage_trade_partitions                  # create upcoming partitions, apply retention
+#   python manage.py manage_trade_partitions --since 2023-01-01   # also create partitions back to then
+#   python manage.py manage_trade_partitions --retain 24 --drop   # keep 24 partitions, drop older ones
+#   python manage.py manage_trade_partitions --list
+# Celery beat runs the default form on its own (tasks.manage_trade_partitions_task).
+class Command(BaseCommand):
+    help = "Create upcoming Trade partitions and detach (archive) or drop old ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=None,
+                            help="Partitions to create after the current one (default TRADES_PARTITION_PREMAKE).")
+        parser.add_argument('--since', default=None,
+                            help="Also create partitions back to this date (YYYY-MM-DD), e.g. before a backfill.")
+        parser.add_argument('--retain', type=int, default=None,
+                            help="Partitions to keep, current included (default TRADES_PARTITION_RETENTION).")
+        parser.add_argument('--drop', action='store_true',
+                            help="Drop old partitions instead of keeping them as *_archived_* tables.")
+        parser.add_argument('--list', action='store_true', help="Only list the partitions and their row estimates.")
+
+    def handle(self, *args, **options):
+        if not is_partitioned(connection):
+            raise CommandError("trades_api_trade is not partitioned (PostgreSQL with migration 0004 needed).")
+        if options['list']:
+            self.list_partitions()
+            return
+
+        now = datetime.now(timezone.utc)
+        since = None
+        if options['since']:
+            try:
+                since = datetime.fromisoformat(options['since']).replace(tzinfo=timezone.utc)
+            except ValueError:
+                raise CommandError(f"--since must be a date like 2023-01-01, not {options['since']!r}")
+        created = ensure_partitions(connection, now=now, ahead=options['ahead'], since=since)
+        self.stdout.write(f"Created {len(created)} partition(s){': ' + ', '.join(created) if created else ''}")
+
+        retention = options['retain'] or getattr(settings, 'TRADES_PARTITION_RETENTION', None)
+        if retention:
+            cutoff = retention_cutoff(now, retention, get_interval())
+            drop = options['drop'] or getattr(settings, 'TRADES_PARTITION_DROP_DETACHED', False)
+            detached = detach_partitions_before(connection, cutoff, drop=drop)
+            self.stdout.write(f"{'Dropped' if drop else 'Archived'} {len(detached)} partition(s) ending before "
+                              f"{cutoff:%Y-%m-%d}{': ' + ', '.join(detached) if detached else ''}")
+            leftover = default_partition_rows(connection, before=cutoff)
+            if leftover:
+                self.stdout.write(self.style.WARNING(
+                    f"{leftover} row(s) older than the cutoff are in {DEFAULT_PARTITION}; "
+                    f"create their partitions with --since, then run again to retire them."
+                ))
+
+    def list_partitions(self):
+        partitions = list(list_partitions(connection)) + [DEFAULT_PARTITION]
+        with connection.cursor() as cursor:
+            # reltuples is the planner's estimate (updated by ANALYZE / autovacuum), free to read
+            cursor.execute("SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(%s)", [partitions])
+            estimates = dict(cursor.fetchall())
+        for name in partitions:
+            self.stdout.write(f"{name:40} ~{max(estimates.get(name, 0), 0):,} rows")
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from trades_api.models import DailyTickerStats, Trade
+
+BATCH_SIZE = 5000
+
+
+# Usage: python manage.py rebuild_daily_stats
+# Throws away DailyTickerStats and recomputes it from the trades table with one
+# grouped query. Use it after loading trades some other way (admin, raw SQL, restores)
+# or if the rollup is ever suspected to be wrong.
+class Command(BaseCommand):
+    help = "Rebuild the DailyTickerStats rollup from scratch from the Trade table."
+
+    def handle(self, *args, **options):
+        notional = DecimalField(max_digits=24, decimal_places=2)
+        price_x_quantity = F('price') * F('quantity')
+
+        grouped = (
+            Trade.objects
+            .annotate(day=TruncDate('timestamp')) # Uses settings.TIME_ZONE, like the incremental path
+            .values('day', 'ticker')
+            .order_by('day', 'ticker')
+            .annotate(
+                total_volume=Sum('quantity'),
+                total_notional=Sum(price_x_quantity, output_field=notional),
+                total_count=Count('id'),
+                total_buy_volume=Coalesce(Sum('quantity', filter=Q(side='BUY')), 0),
+                total_sell_volume=Coalesce(Sum('quantity', filter=Q(side='SELL')), 0),
+                total_buy_notional=Coalesce(Sum(price_x_quantity, filter=Q(side='BUY'), output_field=notional),
+                                            0, output_field=notional),
+                total_sell_notional=Coalesce(Sum(price_x_quantity, filter=Q(side='SELL'), output_field=notional),
+                                             0, output_field=notional),
+            )
+        )
+
+        rows_written = 0
+        with transaction.atomic():
+            DailyTickerStats.objects.all().delete()
+            batch = []
+            for row in grouped.iterator(chunk_size=BATCH_SIZE):
+                batch.append(DailyTickerStats(
+                    date=row['day'],
+                    ticker=row['ticker'],
+                    volume=row['total_volume'],
+                    notional=row['total_notional'],
+                    trade_count=row['total_count'],
+                    buy_volume=row['total_buy_volume'],
+                    sell_volume=row['total_sell_volume'],
+                    buy_notional=row['total_buy_notional'],
+                    sell_notional=row['total_sell_notional'],
+                ))
+                if len(batch) >= BATCH_SIZE:
+                    DailyTickerStats.objects.bulk_create(batch)
+                    rows_written += len(batch)
+                    batch = []
+            if batch:
+                DailyTickerStats.objects.bulk_create(batch)
+                rows_written += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt DailyTickerStats: {rows_written} (day, ticker) rows."))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:48
+
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+def normalize_existing_tickers(apps, schema_editor):
+    # Rows saved before ticker lookups switched from iexact to exact matching
+    Trade = apps.get_model('trades_api', 'Trade')
+    Trade.objects.update(ticker=Upper('ticker'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trades_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_existing_tickers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['ticker', 'timestamp', 'id'], name='trade_ticker_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['timestamp', 'id'], name='trade_ts_idx'),
+        ),
+    ]
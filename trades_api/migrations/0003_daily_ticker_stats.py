@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trades_api', '0002_trade_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTickerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('ticker', models.CharField(max_length=10)),
+                ('volume', models.BigIntegerField(default=0)),
+                ('notional', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('trade_count', models.IntegerField(default=0)),
+                ('buy_volume', models.BigIntegerField(default=0)),
+                ('sell_volume', models.BigIntegerField(default=0)),
+                ('buy_notional', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('sell_notional', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ticker', 'date'], name='daily_stats_ticker_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'ticker'), name='daily_ticker_stats_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+# Turns trades_api_trade into a table range-partitioned on timestamp (see trades_api/partitions.py).
+# PostgreSQL only: on any other database (SQLite, MySQL...) the migration does nothing and the
+# table stays a plain one. The project and its tests run on PostgreSQL, so both get partitions.
+#
+# Postgres needs the partition key in the primary key, so it becomes (id, timestamp); ids
+# still come from one sequence and stay unique. The model is unchanged, so this is
+# database-only (no migration state changes).
+#
+# Existing rows are copied once into the new partitions (one transaction); on a very big
+# table run it in a maintenance window.
+
+TABLE = 'trades_api_trade'
+OLD_TABLE = 'trades_api_trade_unpartitioned'
+SEQUENCE = 'trades_api_trade_id_seq'
+INDEXES = [
+    ('trade_ticker_ts_idx', '"ticker", "timestamp", "id"'),
+    ('trade_ts_idx', '"timestamp", "id"'),
+]
+
+
+def create_indexes(cursor):
+    for name, columns in INDEXES:
+        cursor.execute(f'CREATE INDEX "{name}" ON "{TABLE}" ({columns})')
+
+
+def take_over_sequence(cursor, old_table):
+    """
+    The sequence the new table's ids come from: the old table's own sequence if it is a
+    serial column, or a new one carrying on from MAX(id) if it is an identity column
+    (how Django creates BigAutoField; identity sequences can't move to another table).
+    Returns (sequence, whether it was created here).
+    """
+    cursor.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+                   [old_table])
+    if cursor.fetchone()[0] == '':
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old_table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE") # Or it's dropped with the old table
+        return sequence, False
+    cursor.execute(f'SELECT COALESCE(MAX("id"), 0) + 1 FROM "{old_table}"')
+    cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}_new" START WITH {cursor.fetchone()[0]}')
+    return f'"{SEQUENCE}_new"', True
+
+
+def finish_sequence(cursor, sequence, created):
+    cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'{sequence}\'::regclass)')
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{TABLE}"."id"')
+    cursor.execute(f'SELECT setval(\'{sequence}\'::regclass, COALESCE((SELECT MAX("id") FROM "{TABLE}"), 0) + 1, false)')
+    if created: # The old table's identity sequence had this name and went with it
+        cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO "{SEQUENCE}"')
+
+
+def partition_trades(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    from trades_api.partitions import DEFAULT_PARTITION, ensure_partitions
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("timestamp") FROM "{TABLE}"')
+        oldest = cursor.fetchone()[0]
+        for name, _ in INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+        sequence, created = take_over_sequence(cursor, OLD_TABLE)
+
+        # LIKE without INCLUDING IDENTITY: id becomes a plain bigint fed by the sequence
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{OLD_TABLE}" INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" DROP DEFAULT')
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+        # Partitions for the existing history (and a few ahead), so the copy lands in the right ones
+        ensure_partitions(connection, since=oldest or datetime.now(timezone.utc))
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{OLD_TABLE}"')
+        cursor.execute(f'DROP TABLE "{OLD_TABLE}"')
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "timestamp")')
+        create_indexes(cursor)
+        finish_sequence(cursor, sequence, created)
+
+
+def unpartition_trades(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+        sequence, created = take_over_sequence(cursor, OLD_TABLE)
+        cursor.execute(f'ALTER TABLE "{OLD_TABLE}" DROP CONSTRAINT "{TABLE}_pkey"')
+        for name, _ in INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{OLD_TABLE}" INCLUDING DEFAULTS)')
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{OLD_TABLE}"') # Detached partitions are not brought back
+        cursor.execute(f'DROP TABLE "{OLD_TABLE}"') # And every partition with it
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id")')
+        create_indexes(cursor)
+        finish_sequence(cursor, sequence, created)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trades_api', '0003_daily_ticker_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_trades, unpartition_trades, elidable=False),
+    ]
@@ -1,6 +1,17 @@
 from django.db import models
 # from django.utils import timezone # Not currently used as timestamp is client-provided
 
+
+def normalize_ticker(ticker):
+    """
+    Tickers are stored upper-case (the serializer enforces it), so lookups
+    normalize the user's input the same way and compare with a plain '='.
+    That lets Postgres use the (ticker, timestamp) index instead of running
+    UPPER() on every row like ticker__iexact does.
+    """
+    return ticker.strip().upper()
+
+
 # This class defines what a 'Trade' looks like in our database
 class Trade(models.Model):
     ticker = models.CharField(max_length=10) # e.g., "AAPL", "GOOG"
@@ -10,7 +21,48 @@ class Trade(models.Model):
     side = models.CharField(max_length=4, choices=[('BUY', 'Buy'), ('SELL', 'Sell')])
     timestamp = models.DateTimeField() # When the trade happened, provided by the client
 
+    class Meta:
+        indexes = [
+            # Serves "?ticker=X" listings (optionally with a date range), newest first
+            models.Index(fields=['ticker', 'timestamp', 'id'], name='trade_ticker_ts_idx'),
+            # Serves date-range listings and the (timestamp, id) cursor pagination
+            models.Index(fields=['timestamp', 'id'], name='trade_ts_idx'),
+        ]
+
     # This is how a Trade object will look if printed (e.g., in Django admin)
     def __str__(self):
         return f"{self.side} {self.quantity} {self.ticker} @ {self.price} on {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
     
+
+
+# Running per-ticker, per-day totals, kept up to date as trades are inserted
+# (see trades_api/stats.py). Lets /api/stats/ answer volume and VWAP questions
+# by reading one row per (day, ticker) instead of scanning every trade.
+class DailyTickerStats(models.Model):
+    date = models.DateField() # Trading day (in settings.TIME_ZONE)
+    ticker = models.CharField(max_length=10)
+    volume = models.BigIntegerField(default=0) # Sum of quantity
+    notional = models.DecimalField(max_digits=24, decimal_places=2, default=0) # Sum of price * quantity
+    trade_count = models.IntegerField(default=0)
+    buy_volume = models.BigIntegerField(default=0)
+    sell_volume = models.BigIntegerField(default=0)
+    buy_notional = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    sell_notional = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'ticker'], name='daily_ticker_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['ticker', 'date'], name='daily_stats_ticker_date_idx'),
+        ]
+
+    @property
+    def vwap(self):
+        """Volume-weighted average price, or None if nothing traded."""
+        if not self.volume:
+            return None
+        return self.notional / self.volume
+
+    def __str__(self):
+        return f"{self.ticker} on {self.date}: {self.volume} shares in {self.trade_count} trades"
@@ -0,0 +1,299 @@
+import asyncio
+import atexit
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+
+from .cache import get_cache
+
+# Micro-batched trade notifications.
+#
+# Saving a trade used to queue one Celery task per trade, and each task held a worker
+# in time.sleep(5), so a worker could only get through concurrency / 5 trades a second.
+# Now the API process hands notifications to a NotificationBatcher, which holds them until
+# TRADES_NOTIFY_BATCH_SIZE are pending or the oldest has waited TRADES_NOTIFY_MAX_WAIT
+# seconds, and then queues ONE send_trade_notifications_batch_task for the lot from a
+# background thread, so a request never waits on the broker.
+# The worker sends a batch's notifications concurrently on an asyncio event loop
+# (TRADES_NOTIFY_CONCURRENCY at a time), so it waits on the external service about once
+# per batch instead of once per trade.
+#
+# Metrics (GET /api/notifications/stats/):
+#   batcher  - this API process (like the cache counters): pending queue depth now / max,
+#              batches queued by what triggered them (size / time / shutdown), failures
+#   delivery - every worker, added up in the cache: batches and notifications sent,
+#              batch size histogram, and end-to-end latency (trade committed -> notification
+#              sent, from the 'queued_at' each notification carries)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_WAIT = 0.25 # Seconds
+DEFAULT_MAX_PENDING = 50000 # Only reached while batches can't be queued (broker down)
+DEFAULT_CONCURRENCY = 100 # Notifications in flight per batch
+DEFAULT_SEND_SECONDS = 5.0 # How long the (simulated) external service takes per notification
+
+METRICS_PREFIX = 'trade-notifications'
+# Histogram bucket upper bounds; the last bucket is everything above
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60] # Seconds
+BATCH_SIZE_BUCKETS = [1, 10, 50, 100, 250, 500, 1000, 5000]
+
+
+def notify_setting(name, default):
+    return getattr(settings, f'TRADES_NOTIFY_{name}', default)
+
+
+class NotificationBatcher:
+    """
+    Collects trade notifications and queues them as one Celery task per batch.
+    A batch goes out as soon as batch_size are pending, or max_wait seconds after the
+    oldest pending one arrived. send_batch(list) does the queueing, always on the
+    background flusher thread, so add() never waits on the broker (sync or async views).
+    Thread safe: every request thread of the process shares one batcher.
+    """
+
+    def __init__(self, send_batch, batch_size=None, max_wait=None, max_pending=None):
+        self.send_batch = send_batch
+        self.batch_size = max(1, batch_size or notify_setting('BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        self.max_wait = max_wait if max_wait is not None else notify_setting('MAX_WAIT', DEFAULT_MAX_WAIT)
+        self.max_pending = max_pending or notify_setting('MAX_PENDING', DEFAULT_MAX_PENDING)
+        self._lock = threading.Condition()
+        self.pending = []
+        self.oldest_at = None # monotonic() when the oldest pending notification arrived
+        self.retry_at = None # monotonic() before which a failed send isn't retried (broker down)
+        self.flusher = None
+        self.counts = Counter()
+        self.max_depth = 0
+
+    def add(self, details_list):
+        """Queue notifications (plain dicts, see views.trade_details_for_task). Only takes the lock, never the broker."""
+        queued_at = time.time()
+        with self._lock:
+            room = max(0, self.max_pending - len(self.pending))
+            self.pending.extend(dict(details, queued_at=queued_at) for details in details_list[:room])
+            self.counts['queued'] += len(details_list)
+            self.counts['dropped'] += max(0, len(details_list) - room)
+            self.max_depth = max(self.max_depth, len(self.pending))
+            if not self.pending:
+                return
+            self.start_flusher()
+            if self.oldest_at is None: # Flusher is idle: start the max_wait clock
+                self.oldest_at = time.monotonic()
+                self._lock.notify()
+            elif len(self.pending) >= self.batch_size: # A full batch doesn't wait for the clock
+                self._lock.notify()
+
+    def take(self, reason):
+        """Remove the pending notifications as one batch (call with the lock held)."""
+        batch = self.pending[:self.batch_size]
+        del self.pending[:self.batch_size]
+        self.oldest_at = time.monotonic() if self.pending else None
+        self.counts[f'flushed_on_{reason}'] += 1
+        return batch
+
+    def start_flusher(self):
+        if self.flusher is None or not self.flusher.is_alive(): # Also after a fork, where threads don't survive
+            self.flusher = threading.Thread(target=self.run_flusher, name='trade-notification-batcher', daemon=True)
+            self.flusher.start()
+
+    def run_flusher(self):
+        """
+        Sends out full batches straight away, and partial ones once the oldest has waited max_wait.
+        After a failed send nothing goes out for max_wait, full batch or not, so a broker outage
+        costs one attempt per max_wait instead of a busy loop.
+        """
+        while True:
+            with self._lock:
+                while self.oldest_at is None:
+                    self._lock.wait()
+                backoff = self.retry_at - time.monotonic() if self.retry_at is not None else 0
+                if backoff > 0:
+                    self._lock.wait(backoff)
+                    continue
+                if len(self.pending) >= self.batch_size:
+                    batch = self.take('size')
+                else:
+                    remaining = self.oldest_at + self.max_wait - time.monotonic()
+                    if remaining > 0:
+                        self._lock.wait(remaining)
+                        continue
+                    batch = self.take('time')
+            self.dispatch(batch)
+
+    def dispatch(self, batch):
+        """Queue one batch; False (and the batch put back) if the broker wouldn't take it."""
+        try:
+            self.send_batch(batch)
+        except Exception as e:
+            # Broker unreachable: keep them (up to max_pending) and try again after max_wait
+            print(f"Queueing a batch of {len(batch)} trade notifications failed: {e}")
+            with self._lock:
+                room = max(0, self.max_pending - len(self.pending))
+                self.pending[:0] = batch[:room]
+                self.max_depth = max(self.max_depth, len(self.pending))
+                self.counts['failed_batches'] += 1
+                self.counts['dropped'] += len(batch) - min(room, len(batch))
+                self.oldest_at = time.monotonic() if self.pending else None
+                self.retry_at = time.monotonic() + self.max_wait
+            return False
+        with self._lock:
+            self.counts['batches'] += 1
+            self.retry_at = None
+        return True
+
+    def flush(self):
+        """Send everything pending now (e.g. at shutdown)."""
+        while True:
+            with self._lock:
+                if not self.pending:
+                    return
+                batch = self.take('shutdown')
+            if not self.dispatch(batch):
+                return # Broker down; don't spin
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pending': len(self.pending),
+                'max_pending_seen': self.max_depth,
+                'queued': self.counts['queued'],
+                'batches': self.counts['batches'],
+                'flushed_on_size': self.counts['flushed_on_size'],
+                'flushed_on_time': self.counts['flushed_on_time'],
+                'flushed_on_shutdown': self.counts['flushed_on_shutdown'],
+                'failed_batches': self.counts['failed_batches'],
+                'dropped': self.counts['dropped'],
+                'batch_size': self.batch_size,
+                'max_wait': self.max_wait,
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """The process-wide batcher, made on first use (settings are loaded by then)."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            from .tasks import send_trade_notifications_batch_task # tasks.py imports this module
+            _batcher = NotificationBatcher(send_trade_notifications_batch_task.delay)
+            atexit.register(_batcher.flush)
+        return _batcher
+
+
+def queue_trade_notifications(details_list):
+    """Hand committed trades' notifications to the batcher."""
+    if details_list:
+        get_batcher().add(details_list)
+
+
+# --- Worker side ---
+
+async def send_notification(details, send_seconds):
+    # Stand-in for the external call (email service, webhook, ...). A real one would use an
+    # async HTTP client here, so waiting on it doesn't block the other notifications.
+    await asyncio.sleep(send_seconds)
+
+
+async def deliver_notifications(details_list, concurrency=None, send_seconds=None):
+    """Send a batch's notifications concurrently. Returns (latencies in seconds of the ones sent, failures)."""
+    concurrency = concurrency or notify_setting('CONCURRENCY', DEFAULT_CONCURRENCY)
+    send_seconds = send_seconds if send_seconds is not None else notify_setting('SEND_SECONDS', DEFAULT_SEND_SECONDS)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def deliver(details):
+        async with semaphore:
+            await send_notification(details, send_seconds)
+        if details.get('queued_at') is not None:
+            latencies.append(time.time() - details['queued_at'])
+
+    results = await asyncio.gather(*[deliver(details) for details in details_list], return_exceptions=True)
+    failures = sum(1 for result in results if isinstance(result, Exception))
+    return latencies, failures
+
+
+def deliver_batch(details_list):
+    """What the batch task runs: send everything, record the metrics. Returns (sent, failed)."""
+    latencies, failures = asyncio.run(deliver_notifications(details_list))
+    record_delivery(len(details_list), latencies, failures)
+    return len(details_list) - failures, failures
+
+
+def metric_key(name):
+    return f"{METRICS_PREFIX}:{name}"
+
+
+def record_delivery(batch_size, latencies, failures):
+    """Add one delivered batch to the shared metrics (a handful of cache increments per batch)."""
+    counts = Counter()
+    counts['batches'] += 1
+    counts['delivered'] += batch_size - failures
+    counts['failed'] += failures
+    counts[f'batch_size:{bisect_left(BATCH_SIZE_BUCKETS, batch_size)}'] += 1
+    for latency in latencies:
+        counts[f'latency:{bisect_left(LATENCY_BUCKETS, latency)}'] += 1
+    counts['latency_ms_total'] += round(sum(latencies) * 1000)
+    cache = get_cache()
+    try:
+        for name, amount in counts.items():
+            key = metric_key(name)
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, amount)
+    except Exception as e:
+        # Metrics must never fail the notifications themselves
+        print(f"Recording notification metrics failed: {e}")
+
+
+def histogram(counts, bounds, prefix):
+    """{upper bound label: count} from the bucket counters ('+Inf' for the last)."""
+    labels = [str(bound) for bound in bounds] + ['+Inf']
+    return {label: counts.get(metric_key(f'{prefix}:{index}'), 0) for index, label in enumerate(labels)}
+
+
+def bucket_percentile(buckets, bounds, fraction):
+    """Upper bound of the bucket holding the given fraction of samples (None if no samples or above the last)."""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    running = 0
+    for count, bound in zip(buckets.values(), bounds + [None]):
+        running += count
+        if running >= fraction * total:
+            return bound
+    return None
+
+
+def notification_stats():
+    """This process's batcher numbers plus the delivery numbers from every worker."""
+    names = ['batches', 'delivered', 'failed', 'latency_ms_total']
+    names += [f'batch_size:{index}' for index in range(len(BATCH_SIZE_BUCKETS) + 1)]
+    names += [f'latency:{index}' for index in range(len(LATENCY_BUCKETS) + 1)]
+    try:
+        counts = get_cache().get_many([metric_key(name) for name in names])
+    except Exception as e:
+        print(f"Reading notification metrics failed: {e}")
+        counts = {}
+    latency = histogram(counts, LATENCY_BUCKETS, 'latency')
+    sent = sum(latency.values())
+    delivered = counts.get(metric_key('delivered'), 0)
+    batches = counts.get(metric_key('batches'), 0)
+    return {
+        'batcher': get_batcher().snapshot(),
+        'delivery': {
+            'batches': batches,
+            'delivered': delivered,
+            'failed': counts.get(metric_key('failed'), 0),
+            'mean_batch_size': round(delivered / batches, 1) if batches else None,
+            'batch_size': histogram(counts, BATCH_SIZE_BUCKETS, 'batch_size'),
+            'latency_seconds': {
+                'mean': round(counts.get(metric_key('latency_ms_total'), 0) / sent / 1000, 3) if sent else None,
+                'p50_at_most': bucket_percentile(latency, LATENCY_BUCKETS, 0.5),
+                'p99_at_most': bucket_percentile(latency, LATENCY_BUCKETS, 0.99),
+                'buckets': latency,
+            },
+        },
+    }
@@ -0,0 +1,122 @@
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Keyset ("cursor") pagination for trades, newest first.
+# Instead of OFFSET (which makes Postgres walk and throw away every earlier row),
+# the cursor remembers the (timestamp, id) of the last row we sent, and the next
+# page is simply "rows older than that". With an index on (timestamp, id) every
+# page costs the same, no matter how deep you go.
+class TradeCursorPagination(BasePagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            is_reverse = False
+            results = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+            has_more = len(results) > page_size
+            results = results[:page_size]
+            self.has_next, self.has_previous = has_more, False
+        else:
+            position_ts, position_id, is_reverse = cursor
+            if not is_reverse:
+                # Rows strictly older than the cursor position, newest first.
+                # timestamp__lte gives Postgres an index range to scan; the Q()
+                # breaks ties between trades with the same timestamp.
+                queryset = queryset.filter(timestamp__lte=position_ts).filter(
+                    Q(timestamp__lt=position_ts) | Q(id__lt=position_id)
+                ).order_by('-timestamp', '-id')
+            else:
+                # Going backwards: rows strictly newer than the cursor, oldest first,
+                # then flipped so the page is still newest first.
+                queryset = queryset.filter(timestamp__gte=position_ts).filter(
+                    Q(timestamp__gt=position_ts) | Q(id__gt=position_id)
+                ).order_by('timestamp', 'id')
+            results = list(queryset[:page_size + 1])
+            has_more = len(results) > page_size
+            results = results[:page_size]
+            if is_reverse:
+                results.reverse()
+                self.has_next, self.has_previous = True, has_more
+            else:
+                self.has_next, self.has_previous = has_more, True
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        """
+        Cursor format (before base64): "<iso timestamp>|<id>|<n or p>".
+        'n' means "page after this row", 'p' means "page before this row".
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            timestamp_str, id_str, direction = decoded.split('|')
+            position_ts = parse_datetime(timestamp_str)
+            position_id = int(id_str)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position_ts is None or direction not in ('n', 'p'):
+            raise NotFound(self.invalid_cursor_message)
+        return position_ts, position_id, direction == 'p'
+
+    def encode_cursor(self, trade, is_reverse):
+        raw = f"{trade.timestamp.isoformat()}|{trade.id}|{'p' if is_reverse else 'n'}"
+        encoded = base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], is_reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], is_reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
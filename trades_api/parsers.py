@@ -0,0 +1,30 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+# NDJSON = "newline delimited JSON": one JSON object per line.
+# This lets clients stream a big fill replay without wrapping it in one giant array.
+class NDJSONParser(BaseParser):
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Turn an NDJSON body into a list of dicts (same shape as a JSON array body).
+        Blank lines are ignored.
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        rows = []
+        for line_number, raw_line in enumerate(stream, start=1):
+            line = raw_line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error on line {line_number}: {exc}")
+        return rows
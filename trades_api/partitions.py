@@ -0,0 +1,196 @@
+"""
+Range partitioning of the trades table on timestamp (PostgreSQL only).
+
+Since migration 0004, trades_api_trade is a partitioned table: one partition per month
+(TRADES_PARTITION_INTERVAL = 'month', e.g. trades_api_trade_p2024_05) or per day
+('day', trades_api_trade_p2024_05_15), all in UTC, plus trades_api_trade_default for
+any row no partition covers (a late backfill, a far-future timestamp). Postgres only
+reads the partitions a timestamp range can touch (partition pruning), so date-range
+listings don't slow down as history grows, and retention detaches whole partitions
+instead of DELETEing rows.
+
+ensure_partitions() creates partitions ahead of time; detach_partitions_before()
+takes old ones out of the table and keeps them as trades_api_trade_archived_p...
+(dump with pg_dump -t, then drop) or drops them. maintain_partitions() does both
+from the settings; Celery beat runs it (tasks.manage_trade_partitions_task), and
+python manage.py manage_trade_partitions runs it by hand.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+
+from .models import Trade
+
+TABLE = Trade._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+ARCHIVE_PREFIX = f"{TABLE}_archived_"
+INTERVALS = ('month', 'day')
+DEFAULT_INTERVAL = 'month'
+DEFAULT_PREMAKE = 3 # Partitions created ahead of the current one
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})(?:_(\d{{2}}))?$")
+
+
+def get_interval():
+    interval = getattr(settings, 'TRADES_PARTITION_INTERVAL', DEFAULT_INTERVAL)
+    if interval not in INTERVALS:
+        raise ValueError(f"TRADES_PARTITION_INTERVAL must be one of {', '.join(INTERVALS)}, not {interval!r}")
+    return interval
+
+
+def interval_start(moment, interval):
+    """Start (UTC midnight) of the day or month holding `moment`."""
+    moment = moment.astimezone(dt_timezone.utc) if moment.tzinfo else moment.replace(tzinfo=dt_timezone.utc)
+    if interval == 'day':
+        return datetime(moment.year, moment.month, moment.day, tzinfo=dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def shift(start, interval, count):
+    """The interval start `count` days / months after (or before, if negative) `start`."""
+    if interval == 'day':
+        return start + timedelta(days=count)
+    months = start.year * 12 + start.month - 1 + count
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(start, interval):
+    return f"{TABLE}_p{start:%Y_%m_%d}" if interval == 'day' else f"{TABLE}_p{start:%Y_%m}"
+
+
+def partition_range(name):
+    """(start, end) a partition covers, from its name; None for names we didn't make."""
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    year, month, day = match.groups()
+    start = datetime(int(year), int(month), int(day or 1), tzinfo=dt_timezone.utc)
+    return start, shift(start, 'day' if day else 'month', 1)
+
+
+def is_partitioned(connection=default_connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions(connection=default_connection):
+    """{name: (start, end)} for the table's range partitions (not the default one), oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    ranges = {name: partition_range(name) for name in names}
+    return dict(sorted((name, bounds) for name, bounds in ranges.items() if bounds is not None))
+
+
+def create_partition(connection, start, interval):
+    """
+    Add the partition for the interval starting at `start`.
+    It's built as a plain table and then attached, so rows the default partition
+    already holds for that range can be moved into it first (Postgres refuses to
+    attach a range the default partition has rows for).
+    """
+    end = shift(start, interval, 1)
+    name = partition_name(start, interval)
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)}"
+            f" WHERE {quote('timestamp')} >= %s AND {quote('timestamp')} < %s RETURNING *)"
+            f" INSERT INTO {quote(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        # Indexes and the primary key on the parent are created on the new partition here
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+                       [start, end])
+    return name
+
+
+def ensure_partitions(connection=default_connection, now=None, ahead=None, since=None):
+    """
+    Create every missing partition from the one holding `since` (default: now) through
+    `ahead` intervals after the current one. Returns the names created.
+    Ranges an existing partition already overlaps (e.g. after switching month -> day) are skipped.
+    """
+    interval = get_interval()
+    now = now or datetime.now(dt_timezone.utc)
+    ahead = getattr(settings, 'TRADES_PARTITION_PREMAKE', DEFAULT_PREMAKE) if ahead is None else ahead
+    existing = list(list_partitions(connection).values())
+    start = interval_start(since or now, interval)
+    last = shift(interval_start(now, interval), interval, ahead)
+    created = []
+    while start <= last:
+        end = shift(start, interval, 1)
+        if not any(low < end and start < high for low, high in existing):
+            created.append(create_partition(connection, start, interval))
+            existing.append((start, end))
+        start = end
+    return created
+
+
+def detach_partitions_before(connection=default_connection, cutoff=None, drop=False):
+    """
+    Take every partition that ends on or before `cutoff` out of the table. They are kept as
+    trades_api_trade_archived_p... (or dropped, if drop). Returns the partition names.
+    """
+    quote = connection.ops.quote_name
+    detached = []
+    for name, (_, end) in list_partitions(connection).items():
+        if end > cutoff:
+            continue
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}")
+            if drop:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            else:
+                archived = ARCHIVE_PREFIX + name[len(TABLE) + 1:]
+                cursor.execute(f"ALTER TABLE {quote(name)} RENAME TO {quote(archived)}")
+        detached.append(name)
+    return detached
+
+
+def default_partition_rows(connection=default_connection, before=None):
+    """Rows sitting in the default partition (optionally only those before a time)."""
+    quote = connection.ops.quote_name
+    sql = f"SELECT count(*) FROM {quote(DEFAULT_PARTITION)}"
+    params = []
+    if before is not None:
+        sql += f" WHERE {quote('timestamp')} < %s"
+        params.append(before)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def retention_cutoff(now, retention, interval):
+    """Start of the oldest interval to keep when keeping `retention` intervals (current one included)."""
+    return shift(interval_start(now, interval), interval, 1 - retention)
+
+
+def maintain_partitions(connection=default_connection, now=None):
+    """
+    Create upcoming partitions and apply TRADES_PARTITION_RETENTION.
+    Returns {'created': [...], 'detached': [...]}, or None if the table isn't partitioned
+    (not PostgreSQL, or migration 0004 not applied).
+    """
+    if not is_partitioned(connection):
+        return None
+    now = now or datetime.now(dt_timezone.utc)
+    created = ensure_partitions(connection, now=now)
+    detached = []
+    retention = getattr(settings, 'TRADES_PARTITION_RETENTION', None)
+    if retention:
+        cutoff = retention_cutoff(now, retention, get_interval())
+        detached = detach_partitions_before(connection, cutoff,
+                                            drop=getattr(settings, 'TRADES_PARTITION_DROP_DETACHED', False))
+    return {'created': created, 'detached': detached}
@@ -0,0 +1,351 @@
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Max
+
+from .models import Trade
+
+# Real-time positions and P&L: GET /api/positions/.
+#
+# A PositionBook keeps, per ticker, the net quantity, the average cost of that open
+# quantity and the realized P&L so far, so a trade is applied in O(1) without looking at
+# history. How much was bought and sold (and the notional, in integer cents) is kept too.
+#
+# Accounting (average cost, per fill):
+#   a fill on the side of the position (or from flat) moves the average cost to the
+#   quantity-weighted average of the old cost and the fill price
+#   a fill against the position realizes closed quantity * (fill price - average cost)
+#   (reversed when short); the cost stays for what's left open, is cleared when the
+#   position goes flat, and becomes the fill price for the part that opens the other way
+#   unrealized = net quantity * (last price - average cost)
+# So buy 100@10, sell 100@12, buy 100@20 is realized +200 and an open 100 at cost 20.
+# realized + unrealized is always the total: sold notional - bought notional + net * last.
+#
+# That makes the book depend on the order of the trades, so the warm start
+# (load_positions_from_db) replays every trade in (timestamp, id) order. Live trades are
+# applied in commit order, so a back-dated trade can leave a running book slightly
+# different (in realized vs unrealized, not the total) from one warm-started later.
+#
+# Prices: each tick from the feed (mock_server.py, via feed_supervisor.FeedSupervisor on a
+# background thread) sets the ticker's last price and re-marks its unrealized P&L, O(1) per
+# tick; the book-wide unrealized total is kept by adding the difference.
+#
+# The book lives in the API process and is fed by that process's own inserts (on commit).
+# It is off unless TRADES_POSITIONS_ENABLED (POSITIONS_ENGINE=1) is set for that process:
+# then start_positions() runs from TradesApiConfig.ready() and warm-starts it on a
+# background thread, never inside a request. Enable it on a single process, or each
+# process only sees the trades it inserted since its warm start. The price feed is only
+# opened when TRADES_POSITIONS_FEED_URL is set.
+#
+# The warm start only sees trades still in the table: with TRADES_PARTITION_RETENTION set,
+# trades in detached (archived or dropped) partitions are left out of the positions, so a
+# book built after a detach differs from one that was running before it.
+
+CENTS = 100
+WARM_START_CHUNK_SIZE = 5000 # Trades fetched per database round trip during the warm start
+
+
+class Position:
+    """One ticker's totals, open quantity and its cost, realized P&L, last price and current unrealized P&L."""
+    __slots__ = ('ticker', 'bought', 'sold', 'bought_cents', 'sold_cents', 'net', 'cost', 'realized', 'price',
+                 'unrealized')
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.bought = 0
+        self.sold = 0
+        self.bought_cents = 0
+        self.sold_cents = 0
+        self.net = 0
+        self.cost = None # Average cost of the open quantity, None when flat
+        self.realized = 0.0
+        self.price = None # Last price from the feed
+        self.unrealized = 0.0
+
+    def fill(self, side, quantity, cents):
+        """Apply one trade (cents: its notional, price in cents * quantity); see the accounting above."""
+        if not quantity:
+            return # The API allows quantity 0; it changes nothing
+        price = cents / quantity / CENTS
+        if side == 'BUY':
+            self.bought += quantity
+            self.bought_cents += cents
+            signed = quantity
+        else:
+            self.sold += quantity
+            self.sold_cents += cents
+            signed = -quantity
+        net = self.net
+        if net and (net > 0) != (signed > 0):
+            # Closes some or all of the position, at the current average cost
+            closed = min(abs(net), quantity)
+            self.realized += closed * (price - self.cost) * (1 if net > 0 else -1)
+            if quantity > abs(net):
+                self.cost = price # Crossed zero: the rest is a new position the other way
+            elif quantity == abs(net):
+                self.cost = None # Flat
+        else:
+            held = abs(net)
+            self.cost = ((self.cost or 0.0) * held + price * quantity) / (held + quantity)
+        self.net = net + signed
+        self.refresh()
+
+    def refresh(self):
+        """Recompute the unrealized P&L after the position or the last price changed."""
+        self.unrealized = self.net * (self.price - self.cost) if self.net and self.price is not None else 0.0
+
+    def as_dict(self):
+        return {
+            'ticker': self.ticker,
+            'net_quantity': self.net,
+            'average_cost': None if self.cost is None else f"{self.cost:.4f}",
+            'last_price': None if self.price is None else f"{self.price:.4f}",
+            'market_value': None if self.price is None else f"{self.net * self.price:.2f}",
+            'realized_pnl': f"{self.realized:.2f}",
+            'unrealized_pnl': f"{self.unrealized:.2f}",
+            'bought': self.bought,
+            'sold': self.sold,
+        }
+
+
+class PositionBook:
+    """
+    Every ticker's Position. Thread safe: request threads apply trades while the feed
+    thread marks prices.
+        book.apply_trade('AAPL', 'BUY', 100, '187.25')
+        book.mark('AAPL', 188.10)
+        book.snapshot()
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.unrealized_total = 0.0
+        self.ticks = 0
+        self.trades_applied = 0
+        self.loaded_at = None
+        self.loading = False
+        self.pending = [] # (trade id, row) for trades committed while load() runs, applied once it's done
+
+    def position(self, ticker):
+        position = self.positions.get(ticker)
+        if position is None:
+            position = self.positions[ticker] = Position(ticker)
+        return position
+
+    def _apply(self, ticker, side, quantity, cents):
+        position = self.position(ticker)
+        before = position.unrealized
+        position.fill(side, quantity, cents)
+        self.unrealized_total += position.unrealized - before
+        self.trades_applied += 1
+
+    def apply_trade(self, ticker, side, quantity, price):
+        """One trade; price as the Decimal / string the API stores (2 decimal places)."""
+        self.apply_trades([(ticker, side, quantity, price)])
+
+    def apply_trades(self, trades, ids=None):
+        """
+        (ticker, side, quantity, price) tuples. `ids` (the Trade ids, same order) let a
+        load() running meanwhile skip the ones its totals already include.
+        """
+        rows = [(ticker, side, quantity, round(float(price) * CENTS) * quantity) for ticker, side, quantity, price in trades]
+        with self.lock:
+            if self.loading:
+                self.pending.extend(zip(ids or [None] * len(rows), rows))
+                return
+            for row in rows:
+                self._apply(*row)
+
+    def mark(self, ticker, price):
+        """A new last price for `ticker`: O(1), re-marks only that position."""
+        with self.lock:
+            self._mark(ticker, price)
+
+    def _mark(self, ticker, price):
+        position = self.positions.get(ticker)
+        if position is None:
+            position = self.positions[ticker] = Position(ticker) # Remember the price for a first trade
+        position.price = price
+        if position.net:
+            unrealized = position.net * (price - position.cost)
+            self.unrealized_total += unrealized - position.unrealized
+            position.unrealized = unrealized
+        self.ticks += 1
+
+    def mark_updates(self, updates):
+        """A batch of feed updates ({'ticker', 'price', ...} dicts), under one lock."""
+        with self.lock:
+            mark = self._mark
+            for update in updates:
+                mark(update['ticker'], float(update['price']))
+
+    def load(self, positions, max_id=None):
+        """
+        Replace the book's positions with `positions` ({ticker: Position}, e.g. another
+        book's, built by replaying trades). Prices already seen are kept. Trades applied
+        while they were being built (begin_load() called first) are added on top, except
+        those with an id up to `max_id`, the last trade `positions` include.
+        """
+        with self.lock:
+            prices = {ticker: position.price for ticker, position in self.positions.items()}
+            self.positions = positions
+            for ticker, price in prices.items():
+                if price is not None:
+                    self.position(ticker).price = price
+            for position in self.positions.values():
+                position.refresh()
+            for trade_id, row in self.pending:
+                if max_id is None or trade_id is None or trade_id > max_id:
+                    self._apply(*row)
+            self.pending = []
+            self.loading = False
+            self.unrealized_total = math.fsum(position.unrealized for position in self.positions.values())
+            self.loaded_at = datetime.now(dt_timezone.utc)
+
+    def begin_load(self):
+        with self.lock:
+            self.loading = True
+
+    def snapshot(self, tickers=None, include_flat=False):
+        """
+        Positions (open ones, or every ticker that has traded with include_flat) and totals.
+        Totals are summed afresh here, which also clears any float drift from the running total.
+        """
+        with self.lock:
+            positions = [
+                position for position in self.positions.values()
+                if (position.net or (include_flat and (position.bought or position.sold)))
+                and (tickers is None or position.ticker in tickers)
+            ]
+            rows = [position.as_dict() for position in sorted(positions, key=lambda position: position.ticker)]
+            every = self.positions.values()
+            self.unrealized_total = math.fsum(position.unrealized for position in every)
+            realized = math.fsum(position.realized for position in every)
+            unrealized = self.unrealized_total
+            open_count = sum(1 for position in every if position.net)
+            unmarked = sum(1 for position in every if position.net and position.price is None)
+            stats = {'ticks': self.ticks, 'trades_applied': self.trades_applied,
+                     'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None}
+        return {
+            'positions': rows,
+            'totals': {
+                'realized_pnl': f"{realized:.2f}",
+                'unrealized_pnl': f"{unrealized:.2f}",
+                'total_pnl': f"{realized + unrealized:.2f}",
+                'open_positions': open_count,
+                'unmarked_positions': unmarked, # Open, but no price from the feed yet (unrealized counted as 0)
+            },
+            'engine': stats,
+        }
+
+
+def load_positions_from_db(book, chunk_size=WARM_START_CHUNK_SIZE):
+    """
+    Warm-start `book` by replaying every trade up to the newest id, in (timestamp, id)
+    order, into a fresh book (so marks aren't held up meanwhile). Returns the tickers loaded.
+    """
+    book.begin_load()
+    try:
+        # From the primary: the trades this process applies on commit are written there
+        trades = Trade.objects.using(router.db_for_write(Trade))
+        # The replay stops at max_id, so a trade committing while it runs is either in it
+        # (id <= max_id) or applied from book.pending afterwards (id > max_id), not both.
+        # (A trade inserted before max_id was read but committed after the replay read past
+        # it is still missed; that needs its transaction open across the whole warm start.)
+        max_id = trades.aggregate(max_id=Max('id'))['max_id']
+        rows = (
+            trades.filter(id__lte=max_id or 0)
+            .order_by('timestamp', 'id')
+            .values_list('ticker', 'side', 'quantity', 'price')
+            .iterator(chunk_size=chunk_size)
+        )
+        loaded = PositionBook()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            loaded.apply_trades(chunk)
+    except Exception:
+        with book.lock:
+            book.loading = False # Keep applying trades as they come
+        raise
+    book.load(loaded.positions, max_id)
+    return len(loaded.positions)
+
+
+def start_price_feed(book, url):
+    """Mark the book from the WebSocket price feed on a daemon thread (reconnects forever)."""
+    import asyncio
+    from feed_supervisor import FeedSupervisor # Top-level module next to manage.py
+
+    def log(message):
+        print(f"Positions price feed: {message}")
+
+    def run():
+        asyncio.run(FeedSupervisor(url, book.mark_updates, log=log).run())
+
+    thread = threading.Thread(target=run, name='positions-price-feed', daemon=True)
+    thread.start()
+    return thread
+
+
+_book = None
+_book_lock = threading.Lock()
+
+
+def start_positions():
+    """
+    Create the process-wide book and warm-start it (then open its price feed, if
+    TRADES_POSITIONS_FEED_URL is set) on a daemon thread. Returns the thread, or None if
+    the book was already started. Called from TradesApiConfig.ready() when enabled.
+    """
+    global _book
+    with _book_lock:
+        if _book is not None:
+            return None
+        book = PositionBook()
+        book.begin_load()
+        _book = book # Before loading, so trades committed meanwhile are queued, not lost
+
+    def warm_start():
+        global _book
+        started = time.perf_counter()
+        try:
+            count = load_positions_from_db(book)
+        except Exception as e:
+            print(f"Positions: warm start failed ({e}), positions are off")
+            with _book_lock:
+                _book = None
+            return
+        finally:
+            connections.close_all() # This thread's connections, not the request threads'
+        print(f"Positions: loaded {count} tickers in {(time.perf_counter() - started) * 1000:.0f}ms")
+        url = getattr(settings, 'TRADES_POSITIONS_FEED_URL', None)
+        if url:
+            try:
+                start_price_feed(book, url)
+            except ImportError as e:
+                print(f"Positions: no price feed ({e}), positions stay unmarked")
+
+    thread = threading.Thread(target=warm_start, name='positions-warm-start', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_book():
+    """The process-wide book, or None if positions are off (see start_positions). Never loads anything."""
+    return _book
+
+
+def record_trades(trades):
+    """Apply committed Trade objects to the book, if it has been built (otherwise its warm start reads them)."""
+    book = _book
+    if book is not None and trades:
+        book.apply_trades([(trade.ticker, trade.side, trade.quantity, trade.price) for trade in trades],
+                          ids=[trade.id for trade in trades])
@@ -1,5 +1,8 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Trade
+from .models import DailyTickerStats, Trade
+from decimal import Decimal
 import re # For regular expression (used in ticker validation)
 
 # Serializers turn our 'Trade' model data into JSON (and vice-versa)
@@ -41,4 +44,81 @@ class TradeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Ticker must be 1-5 uppercase letters (e.g., AAPL, TSLA)."
             )
-        return value
\ No newline at end of file
+        return value
+
+
+def make_timestamp_formatter():
+    """
+    Return a function with the same output as DRF's DateTimeField: ISO 8601 in the
+    current time zone, with 'Z' instead of '+00:00'.
+    The time zone is looked up once here instead of once per row.
+    """
+    current_tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    # The database hands back UTC datetimes, so with TIME_ZONE = 'UTC' (our setting)
+    # most rows need no conversion at all.
+    current_tz_is_utc = current_tz is not None and timezone.get_current_timezone_name() == 'UTC'
+
+    def format_timestamp(value):
+        if current_tz is not None and value.tzinfo is not None:
+            if not current_tz_is_utc or value.utcoffset():
+                value = value.astimezone(current_tz)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return format_timestamp
+
+
+# Read-only fast path for listing trades.
+# TradeSerializer builds DRF field objects and runs each value through them, row by row.
+# For reads we don't need any of that: the view fetches plain tuples with
+# .values_list(*FastTradeSerializer.fields) and this class turns each tuple straight
+# into a dict with exactly the same keys and formatting as TradeSerializer,
+# so the JSON response is byte-for-byte the same.
+class FastTradeSerializer:
+    fields = ('id', 'ticker', 'price', 'quantity', 'side', 'timestamp')
+
+    def __init__(self, instance=None, many=False):
+        self.instance = instance
+        self.many = many
+        self.format_timestamp = make_timestamp_formatter()
+
+    def to_representation(self, row):
+        trade_id, ticker, price, quantity, side, timestamp = row
+        return {
+            'id': trade_id,
+            'ticker': ticker,
+            'price': format(price, 'f'), # Decimal -> "170.50", like COERCE_DECIMAL_TO_STRING
+            'quantity': quantity,
+            'side': side,
+            'timestamp': self.format_timestamp(timestamp),
+        }
+
+    @property
+    def data(self):
+        if self.many:
+            to_representation = self.to_representation
+            return [to_representation(row) for row in self.instance]
+        return self.to_representation(self.instance)
+
+
+def format_vwap(notional, volume):
+    """VWAP as a string with 4 decimal places, or None if nothing traded."""
+    if not volume:
+        return None
+    return f"{Decimal(notional) / volume:.4f}"
+
+
+# Read-only view of the per-ticker daily rollup, with VWAP worked out from the totals
+class DailyTickerStatsSerializer(serializers.ModelSerializer):
+    vwap = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DailyTickerStats
+        fields = ['date', 'ticker', 'volume', 'notional', 'vwap', 'trade_count',
+                  'buy_volume', 'sell_volume', 'buy_notional', 'sell_notional']
+        read_only_fields = fields
+
+    def get_vwap(self, obj):
+        return format_vwap(obj.notional, obj.volume)
@@ -0,0 +1,75 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import DailyTickerStats
+
+# Columns we add to on every insert, in the order used by the SQL below
+COUNTER_FIELDS = [
+    'volume', 'notional', 'trade_count',
+    'buy_volume', 'sell_volume', 'buy_notional', 'sell_notional',
+]
+
+
+def trading_day(timestamp):
+    """The calendar day a trade belongs to, in settings.TIME_ZONE."""
+    if timezone.is_aware(timestamp):
+        timestamp = timezone.localtime(timestamp)
+    return timestamp.date()
+
+
+def summarize_trades(trades):
+    """
+    Add up a batch of Trade objects per (day, ticker).
+    Returns {(date, ticker): {'volume': ..., 'notional': ..., ...}}.
+    """
+    totals = defaultdict(lambda: {
+        'volume': 0, 'notional': Decimal('0'), 'trade_count': 0,
+        'buy_volume': 0, 'sell_volume': 0,
+        'buy_notional': Decimal('0'), 'sell_notional': Decimal('0'),
+    })
+    for trade in trades:
+        row = totals[(trading_day(trade.timestamp), trade.ticker)]
+        notional = Decimal(trade.price) * trade.quantity
+        row['volume'] += trade.quantity
+        row['notional'] += notional
+        row['trade_count'] += 1
+        if trade.side == 'BUY':
+            row['buy_volume'] += trade.quantity
+            row['buy_notional'] += notional
+        else:
+            row['sell_volume'] += trade.quantity
+            row['sell_notional'] += notional
+    return totals
+
+
+def apply_trades_to_daily_stats(trades):
+    """
+    Fold newly inserted trades into DailyTickerStats.
+
+    Call this inside the same transaction as the Trade insert, so the rollup
+    can never disagree with the trades table. Each (day, ticker) row is upserted
+    with INSERT ... ON CONFLICT DO UPDATE SET col = col + EXCLUDED.col, which
+    is atomic even when two requests add to the same row at once.
+    """
+    totals = summarize_trades(trades)
+    if not totals:
+        return
+
+    table = connection.ops.quote_name(DailyTickerStats._meta.db_table)
+    columns = ['date', 'ticker'] + COUNTER_FIELDS
+    quoted = [connection.ops.quote_name(column) for column in columns]
+    increments = ', '.join(f"{name} = {table}.{name} + EXCLUDED.{name}" for name in quoted[2:])
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quoted)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({quoted[0]}, {quoted[1]}) DO UPDATE SET {increments}"
+    )
+    params = [
+        [day, ticker] + [row[field] for field in COUNTER_FIELDS]
+        for (day, ticker), row in totals.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
@@ -1,13 +1,39 @@
 from celery import shared_task
-import time 
+from .notifications import deliver_batch
+from .partitions import maintain_partitions
 
 @shared_task
 def send_trade_notification_task(trade_details):
 
+    # Trades are queued through the batcher now (send_trade_notifications_batch_task);
+    # this stays so tasks already sitting in the broker from before still run.
     print(f"TASK STARTED: Preparing to send notification for trade: {trade_details}")
-    
-    # Simulate some work (e.g., calling an external email service)
-    time.sleep(5) # Simulate a 5-second delay
-    
+
+    deliver_batch([trade_details])
+
     print(f"TASK COMPLETED: Notification 'sent' for trade: {trade_details}")
-    return f"Notification processed for {trade_details.get('id', 'N/A')}"
\ No newline at end of file
+    return f"Notification processed for {trade_details.get('id', 'N/A')}"
+
+
+@shared_task
+def send_trade_notifications_batch_task(trade_details_list):
+    # One task per batch from the notification batcher (see notifications.py).
+    # The notifications are sent concurrently with non-blocking I/O, so the whole
+    # batch takes about as long as one external call instead of one per trade.
+    print(f"BATCH TASK STARTED: Preparing notifications for {len(trade_details_list)} trades")
+
+    sent, failed = deliver_batch(trade_details_list)
+
+    print(f"BATCH TASK COMPLETED: {sent} notifications 'sent', {failed} failed")
+    return f"Notifications processed for {sent} trades"
+
+
+@shared_task
+def manage_trade_partitions_task():
+    # Run by Celery beat (CELERY_BEAT_SCHEDULE): makes sure the next partitions exist before
+    # trades arrive for them, and detaches the ones past TRADES_PARTITION_RETENTION.
+    result = maintain_partitions()
+    if result is None:
+        return "Trade table is not partitioned, nothing to do"
+    print(f"PARTITIONS: created {result['created'] or 'none'}, detached {result['detached'] or 'none'}")
+    return result
@@ -1,3 +1,514 @@
-from django.test import TestCase
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .bars import get_bars
+from .cache import get_cache, invalidate_trades
+from .models import Trade
+from .notifications import NotificationBatcher
+from . import positions
+from .positions import CENTS, PositionBook, load_positions_from_db
+from .partitions import (
+    ARCHIVE_PREFIX, DEFAULT_PARTITION, TABLE, default_partition_rows, detach_partitions_before, ensure_partitions,
+    is_partitioned, list_partitions, partition_name, partition_range, retention_cutoff, shift,
+)
+
+TICKERS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN", "NVDA", "META", "NFLX", "AMD", "INTC"]
+SEED_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# On a partitioned table each partition has its own copy of an index, named by Postgres
+# after the partition and the columns (trades_api_trade_p2024_01_timestamp_id_idx)
+PARTITION_INDEX_COLUMNS = {'trade_ts_idx': 'timestamp_id', 'trade_ticker_ts_idx': 'ticker_timestamp_id'}
+PARTITION_IN_PLAN = re.compile(rf"\b{TABLE}_(?:p\d{{4}}_\d{{2}}(?:_\d{{2}})?|default)\b")
+
+
+def seed_trades(count, spacing=timedelta(seconds=1), start=SEED_START, per_timestamp=3):
+    """Bulk insert `count` trades, `per_timestamp` sharing each timestamp (to exercise the id tie-break)."""
+    return Trade.objects.bulk_create([
+        Trade(
+            ticker=TICKERS[i % len(TICKERS)],
+            price=f"{10 + i % 490}.{i % 100:02d}",
+            quantity=1 + i % 1000,
+            side='BUY' if i % 2 else 'SELL',
+            timestamp=start + spacing * (i // per_timestamp),
+        )
+        for i in range(count)
+    ], batch_size=5000)
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}")
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def uses_index(plan, index_name):
+    """True if the plan reads `index_name`, or (partitioned table) a partition's copy of it."""
+    if index_name in plan:
+        return True
+    columns = PARTITION_INDEX_COLUMNS.get(index_name)
+    return (columns is not None and is_partitioned(connection)
+            and re.search(rf"\b{TABLE}_(?:p[\d_]+|default)_{columns}_idx\b", plan) is not None)
+
+
+class ListingTestMixin:
+    """GETs the trade listing with the response cache emptied first, so every request hits the database."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.url = reverse('trade-list-create')
+
+    def listing(self, params=None, url=None):
+        """GET the listing and return (response, captured queries)."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url or self.url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, ctx.captured_queries
+
+    def walk_pages(self, params, pages):
+        """Follow `next` links like a client; returns (responses, captured queries per page)."""
+        response, queries = self.listing(params)
+        walked = [(response, queries)]
+        while response.data['next'] and len(walked) < pages:
+            response, queries = self.listing(url=response.data['next'])
+            walked.append((response, queries))
+        return walked
+
+
+# Every listing request is exactly one SQL query: no COUNT(*), no N+1, on page one or deep in the cursor.
+class TradeListingQueryCountTests(ListingTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_trades(1200)
+
+    def test_first_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 100)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_ticker_filter_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'ticker': 'aapl', 'page_size': 50}) # Lower-case input
+        self.assertEqual({row['ticker'] for row in response.data['results']}, {'AAPL'})
+
+    def test_deep_cursor_pages_are_one_query_each(self):
+        walked = self.walk_pages({'page_size': 100}, pages=20)
+        self.assertEqual(len(walked), 12)
+        for response, queries in walked:
+            self.assertEqual(len(queries), 1, queries)
+        # Newest first, every trade exactly once, ties on timestamp included
+        rows = [row for response, _ in walked for row in response.data['results']]
+        self.assertEqual(len({row['id'] for row in rows}), 1200)
+        keys = [(row['timestamp'], row['id']) for row in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_previous_page_is_one_query(self):
+        walked = self.walk_pages({'page_size': 100}, pages=3)
+        third, _ = walked[-1]
+        response, queries = self.listing(url=third.data['previous'])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['results'], walked[1][0].data['results'])
+
+
+# The listing's plans use our indexes instead of a sequential scan (PostgreSQL only: the
+# plans are what matter at a million rows, and SQLite's are not comparable).
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN checks need PostgreSQL")
+class TradeListingPlanTests(ListingTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # ~17 days of trades, enough that Postgres prefers an index for a page of 100
+        seed_trades(50000, spacing=timedelta(seconds=30), per_timestamp=1)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Trade._meta.db_table}")
+
+    def assert_plan_uses(self, queries, index_name):
+        plan = explain(queries[-1]['sql'])
+        self.assertNotIn('Seq Scan', plan)
+        self.assertTrue(uses_index(plan, index_name), f"{index_name} not used:\n{plan}")
+
+    def test_first_page_uses_timestamp_index(self):
+        _, queries = self.listing({'page_size': 100})
+        self.assert_plan_uses(queries, 'trade_ts_idx')
+
+    def test_ticker_filter_uses_ticker_index(self):
+        _, queries = self.listing({'ticker': 'msft', 'page_size': 100})
+        self.assert_plan_uses(queries, 'trade_ticker_ts_idx')
+
+    def test_date_range_uses_timestamp_index(self):
+        _, queries = self.listing({'start_date': (SEED_START + timedelta(days=1)).isoformat(),
+                                   'end_date': (SEED_START + timedelta(days=2)).isoformat(),
+                                   'page_size': 100})
+        self.assert_plan_uses(queries, 'trade_ts_idx')
+
+    def test_deep_cursor_page_uses_timestamp_index(self):
+        walked = self.walk_pages({'page_size': 100}, pages=50)
+        self.assertEqual(len(walked), 50)
+        self.assert_plan_uses(walked[-1][1], 'trade_ts_idx')
+
+
+# --- Partitioning (trades_api/partitions.py, migration 0004) ---
+
+def partitions_read(plan):
+    return set(PARTITION_IN_PLAN.findall(plan))
+
+
+def table_exists(name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        return cursor.fetchone()[0]
+
+
+def count_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+def migrate(app_label, name):
+    executor = MigrationExecutor(connection)
+    executor.loader.build_graph() # Pick up what earlier migrate() calls applied
+    executor.migrate([(app_label, name)])
+
+
+class PartitionDateTests(SimpleTestCase):
+
+    def test_shift_months_across_years(self):
+        start = datetime(2024, 11, 1, tzinfo=timezone.utc)
+        self.assertEqual(shift(start, 'month', 3), datetime(2025, 2, 1, tzinfo=timezone.utc))
+        self.assertEqual(shift(start, 'month', -11), datetime(2023, 12, 1, tzinfo=timezone.utc))
+        self.assertEqual(shift(start, 'day', 30), datetime(2024, 12, 1, tzinfo=timezone.utc))
+
+    def test_partition_name_round_trips(self):
+        for interval, start in [('month', datetime(2024, 5, 1, tzinfo=timezone.utc)),
+                                ('day', datetime(2024, 5, 15, tzinfo=timezone.utc))]:
+            name = partition_name(start, interval)
+            self.assertEqual(partition_range(name), (start, shift(start, interval, 1)))
+        self.assertIsNone(partition_range(DEFAULT_PARTITION))
+        self.assertIsNone(partition_range(f"{ARCHIVE_PREFIX}p2024_05"))
+
+    def test_retention_cutoff_keeps_current_interval(self):
+        now = datetime(2024, 5, 15, 13, 30, tzinfo=timezone.utc)
+        self.assertEqual(retention_cutoff(now, 1, 'month'), datetime(2024, 5, 1, tzinfo=timezone.utc))
+        self.assertEqual(retention_cutoff(now, 3, 'month'), datetime(2024, 3, 1, tzinfo=timezone.utc))
+        self.assertEqual(retention_cutoff(now, 24, 'month'), datetime(2022, 6, 1, tzinfo=timezone.utc))
+        self.assertEqual(retention_cutoff(now, 2, 'day'), datetime(2024, 5, 14, tzinfo=timezone.utc))
+
+
+# Creating, archiving and dropping partitions on the (already partitioned) test database.
+# Everything here is in 1990, long before the partitions migration 0004 created, so only
+# the test's own partitions are touched.
+@skipUnless(connection.vendor == 'postgresql', "Partitioning needs PostgreSQL")
+@override_settings(TRADES_PARTITION_INTERVAL='month')
+class PartitionManagementTests(TestCase):
+    JANUARY = datetime(1990, 1, 1, tzinfo=timezone.utc)
+    FEBRUARY = datetime(1990, 2, 1, tzinfo=timezone.utc)
+    MARCH = datetime(1990, 3, 1, tzinfo=timezone.utc)
+
+    def test_table_is_partitioned(self):
+        self.assertTrue(is_partitioned(connection))
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        seed_trades(6, spacing=timedelta(days=2), start=self.JANUARY + timedelta(days=10))
+        self.assertEqual(default_partition_rows(connection, before=self.MARCH), 6)
+
+        created = ensure_partitions(connection, now=self.JANUARY + timedelta(days=5), ahead=1)
+        self.assertEqual(created, [partition_name(self.JANUARY, 'month'), partition_name(self.FEBRUARY, 'month')])
+        self.assertEqual(default_partition_rows(connection, before=self.MARCH), 0)
+        self.assertEqual(count_rows(partition_name(self.JANUARY, 'month')), 6)
+        self.assertEqual(Trade.objects.filter(timestamp__lt=self.MARCH).count(), 6)
+        # Nothing left to create the second time
+        self.assertEqual(ensure_partitions(connection, now=self.JANUARY + timedelta(days=5), ahead=1), [])
+
+    def test_detach_archives_by_default(self):
+        ensure_partitions(connection, now=self.JANUARY, ahead=1)
+        seed_trades(3, start=self.JANUARY + timedelta(days=3))
+        january = partition_name(self.JANUARY, 'month')
+
+        detached = detach_partitions_before(connection, cutoff=self.FEBRUARY)
+        self.assertEqual(detached, [january])
+        archived = f"{ARCHIVE_PREFIX}{january[len(TABLE) + 1:]}"
+        self.assertTrue(table_exists(archived))
+        self.assertFalse(table_exists(january))
+        self.assertEqual(count_rows(archived), 3) # Kept for pg_dump, out of the table
+        self.assertEqual(Trade.objects.filter(timestamp__lt=self.FEBRUARY).count(), 0)
+        self.assertIn(partition_name(self.FEBRUARY, 'month'), list_partitions(connection))
+
+    def test_detach_with_drop_removes_the_table(self):
+        ensure_partitions(connection, now=self.JANUARY, ahead=1)
+        seed_trades(3, start=self.FEBRUARY + timedelta(days=3))
+        february = partition_name(self.FEBRUARY, 'month')
+
+        detached = detach_partitions_before(connection, cutoff=self.MARCH, drop=True)
+        self.assertEqual(detached, [partition_name(self.JANUARY, 'month'), february])
+        self.assertFalse(table_exists(february))
+        self.assertFalse(table_exists(f"{ARCHIVE_PREFIX}{february[len(TABLE) + 1:]}"))
+        self.assertEqual(Trade.objects.filter(timestamp__lt=self.MARCH).count(), 0)
+
+
+# Migration 0004 itself: rows written to the plain table end up in monthly partitions, and a
+# one-day listing only reads that day's partition.
+@skipUnless(connection.vendor == 'postgresql', "Partitioning needs PostgreSQL")
+@override_settings(TRADES_PARTITION_INTERVAL='month')
+class PartitionMigrationTests(ListingTestMixin, TransactionTestCase):
+    BEFORE = ('trades_api', '0003_daily_ticker_stats')
+    AFTER = ('trades_api', '0004_partition_trades')
+
+    def tearDown(self):
+        migrate(*self.AFTER) # Put the schema back even if the test failed half way
+        super().tearDown()
+
+    def test_migration_partitions_existing_rows_and_listing_prunes(self):
+        migrate(*self.BEFORE)
+        self.assertFalse(is_partitioned(connection))
+        # Three months of trades in the plain table, a few hours apart
+        trades = seed_trades(540, spacing=timedelta(hours=4), start=SEED_START, per_timestamp=1)
+        last_id = max(trade.id for trade in trades)
+
+        migrate(*self.AFTER)
+        self.assertTrue(is_partitioned(connection))
+        self.assertEqual(Trade.objects.count(), 540)
+        self.assertEqual(default_partition_rows(connection), 0)
+        for month in range(3):
+            start = shift(SEED_START, 'month', month)
+            self.assertEqual(count_rows(partition_name(start, 'month')),
+                             Trade.objects.filter(timestamp__gte=start, timestamp__lt=shift(start, 'month', 1)).count())
+        # The id sequence carries on after the copied rows
+        new = Trade.objects.create(ticker='AAPL', price='1.00', quantity=1, side='BUY', timestamp=SEED_START)
+        self.assertGreater(new.id, last_id)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {TABLE}")
+        day = datetime(2024, 2, 10, tzinfo=timezone.utc)
+        _, queries = self.listing({'start_date': day.isoformat(),
+                                   'end_date': (day + timedelta(days=1)).isoformat()})
+        self.assertEqual(partitions_read(explain(queries[-1]['sql'])), {partition_name(day, 'month')})
+
+
+class NotificationBatcherTests(SimpleTestCase):
+
+    def test_full_batches_go_out_straight_away(self):
+        sent = []
+        batcher = NotificationBatcher(sent.append, batch_size=2, max_wait=60)
+        batcher.add([{'trade_id': i} for i in range(4)])
+        deadline = time.monotonic() + 5
+        while len(sent) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([[details['trade_id'] for details in batch] for batch in sent], [[0, 1], [2, 3]])
+        self.assertEqual(batcher.snapshot()['flushed_on_size'], 2)
+
+    def test_broker_down_retries_once_per_max_wait(self):
+        attempts = []
+
+        def broker_down(batch):
+            attempts.append(len(batch))
+            raise ConnectionError("broker unreachable")
+
+        # Far more than batch_size pending, so the flusher always has a full batch to try
+        batcher = NotificationBatcher(broker_down, batch_size=2, max_wait=0.1)
+        batcher.add([{'trade_id': i} for i in range(100)])
+        time.sleep(0.5)
+        snapshot = batcher.snapshot()
+
+        # About one attempt per max_wait (0.5s / 0.1s), not a busy loop
+        self.assertGreaterEqual(len(attempts), 2)
+        self.assertLessEqual(len(attempts), 7)
+        self.assertEqual(snapshot['failed_batches'], len(attempts))
+        self.assertEqual(snapshot['pending'], 100) # Every failed batch was put back
+        self.assertEqual(snapshot['dropped'], 0)
+
+
+def exact_total(position):
+    """Sold notional - bought notional + net quantity * last price."""
+    return (position.sold_cents - position.bought_cents) / CENTS + position.net * position.price
+
+
+class PositionBookTests(SimpleTestCase):
+
+    def test_long_flat_short(self):
+        book = PositionBook()
+        book.apply_trade('AAPL', 'BUY', 100, '10.00')
+        position = book.positions['AAPL']
+        self.assertEqual((position.net, position.cost), (100, 10.0))
+
+        book.apply_trade('AAPL', 'SELL', 100, '12.00')
+        self.assertEqual((position.net, position.cost), (0, None))
+        self.assertAlmostEqual(position.realized, 200.0)
+
+        book.apply_trade('AAPL', 'SELL', 50, '15.00')
+        self.assertEqual((position.net, position.cost), (-50, 15.0)) # A new position: its own fill price
+        book.mark('AAPL', 11.0)
+        self.assertAlmostEqual(position.unrealized, 200.0)
+        self.assertAlmostEqual(position.realized, 200.0)
+
+    def test_flat_then_reopen_starts_a_new_cost_basis(self):
+        book = PositionBook()
+        book.apply_trade('AAPL', 'BUY', 100, '10.00')
+        book.apply_trade('AAPL', 'SELL', 100, '12.00')
+        book.apply_trade('AAPL', 'BUY', 100, '20.00')
+        position = book.positions['AAPL']
+        self.assertEqual((position.net, position.cost), (100, 20.0))
+        self.assertAlmostEqual(position.realized, 200.0)
+
+        book.apply_trade('AAPL', 'BUY', 100, '22.00')
+        self.assertAlmostEqual(position.cost, 21.0)
+        book.apply_trade('AAPL', 'SELL', 50, '25.00') # Partial close keeps the cost
+        self.assertAlmostEqual(position.realized, 200.0 + 50 * 4)
+        self.assertAlmostEqual(position.cost, 21.0)
+        book.apply_trade('AAPL', 'SELL', 200, '20.00') # Through zero: closes 150, opens 50 short at 20
+        self.assertAlmostEqual(position.realized, 400.0 - 150)
+        self.assertEqual((position.net, position.cost), (-50, 20.0))
+
+    def test_realized_plus_unrealized_is_the_exact_total(self):
+        book = PositionBook()
+        for side, quantity, price in [('BUY', 30, '10.10'), ('BUY', 70, '10.35'), ('SELL', 40, '10.90'),
+                                      ('SELL', 90, '9.95'), ('BUY', 15, '10.05')]:
+            book.apply_trade('MSFT', side, quantity, price)
+            book.mark('MSFT', 10.25)
+            position = book.positions['MSFT']
+            self.assertAlmostEqual(position.realized + position.unrealized, exact_total(position), places=6)
+        totals = book.snapshot()['totals']
+        self.assertEqual(totals['total_pnl'], f"{exact_total(position):.2f}")
+
+    def test_mark_while_flat(self):
+        book = PositionBook()
+        book.mark('TSLA', 200.0) # Price before any trade
+        book.apply_trade('TSLA', 'BUY', 10, '190.00')
+        self.assertAlmostEqual(book.positions['TSLA'].unrealized, 100.0)
+        book.apply_trade('TSLA', 'SELL', 10, '195.00')
+        book.mark('TSLA', 250.0) # Flat: nothing to re-mark
+        position = book.positions['TSLA']
+        self.assertEqual((position.unrealized, position.price), (0.0, 250.0))
+        self.assertEqual(book.unrealized_total, 0.0)
+        self.assertEqual(book.snapshot()['positions'], [])
+        self.assertEqual(book.snapshot(include_flat=True)['totals']['realized_pnl'], "50.00")
+
+    def test_load_applies_only_trades_after_max_id(self):
+        book = PositionBook()
+        book.begin_load()
+        book.mark('AAPL', 13.0)
+        # Committed while the trades were replayed: id 5 is in the replay, id 6 is not
+        book.apply_trades([('AAPL', 'BUY', 10, '10.00'), ('AAPL', 'BUY', 5, '12.00')], ids=[5, 6])
+        self.assertIsNone(book.positions['AAPL'].cost) # Held until load()
+        replayed = PositionBook()
+        replayed.apply_trade('AAPL', 'BUY', 10, '10.00')
+        book.load(replayed.positions, max_id=5)
+        position = book.positions['AAPL']
+        self.assertEqual((position.bought, position.bought_cents), (15, 16000))
+        self.assertEqual(position.price, 13.0) # The price seen before the load is kept
+        self.assertAlmostEqual(position.unrealized, 15 * (13.0 - 16000 / 15 / 100))
+        self.assertFalse(book.loading)
+        book.apply_trade('AAPL', 'SELL', 15, '11.00') # Straight in once loaded
+        self.assertEqual(position.net, 0)
+
+
+def position_state(book):
+    return {ticker: (p.net, p.cost, p.realized, p.bought_cents, p.sold_cents) for ticker, p in book.positions.items()}
+
+
+class PositionWarmStartTests(TestCase):
+
+    def test_trade_committed_during_load_is_counted_once(self):
+        trades = seed_trades(6)
+        book = PositionBook()
+        book.begin_load()
+        # The last trade committed after begin_load(), so it's both in the table and pending
+        last = trades[-1]
+        book.apply_trades([(last.ticker, last.side, last.quantity, last.price)], ids=[last.id])
+        load_positions_from_db(book)
+
+        replayed = PositionBook()
+        for trade in trades:
+            replayed.apply_trade(trade.ticker, trade.side, trade.quantity, trade.price)
+        self.assertEqual(position_state(book), position_state(replayed))
+
+    def test_replays_in_timestamp_order(self):
+        # Inserted out of order: the sell (earlier id) happened after the first buy
+        for side, price, minutes in [('SELL', '12.00', 1), ('BUY', '10.00', 0), ('BUY', '20.00', 2)]:
+            Trade.objects.create(ticker='AAPL', side=side, price=price, quantity=100,
+                                 timestamp=SEED_START + timedelta(minutes=minutes))
+        book = PositionBook()
+        load_positions_from_db(book)
+        position = book.positions['AAPL']
+        self.assertEqual((position.net, position.cost), (100, 20.0))
+        self.assertAlmostEqual(position.realized, 200.0)
+
+
+class PositionsViewTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('positions')
+        self.addCleanup(setattr, positions, '_book', positions._book)
+
+    def test_off_unless_started(self):
+        positions._book = None # Nothing warm-starts on a request
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNone(positions.get_book())
+
+    def test_loading_then_loaded(self):
+        book = positions._book = PositionBook()
+        book.begin_load()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+        book.apply_trade('AAPL', 'BUY', 10, '10.00') # Queued until the load
+        book.load({})
+        response = self.client.get(self.url, {'ticker': 'aapl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['net_quantity'] for row in response.data['positions']], [10])
+
+
+class BarsCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # One trade every 30 minutes for a week, AAPL every tenth
+        seed_trades(336, spacing=timedelta(minutes=30), per_timestamp=1)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def bars(self, start, days):
+        with CaptureQueriesContext(connection) as ctx:
+            bars = get_bars('AAPL', '1h', start, start + timedelta(days=days), now=SEED_START + timedelta(days=30))
+        return bars, [query for query in ctx.captured_queries if 'GROUP BY bucket' in query['sql']]
+
+    def test_only_uncached_runs_are_queried(self):
+        uncached, queries = self.bars(SEED_START, 5)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len({bar['start'] // 86400 for bar in uncached}), 5) # Bars on every day
+        get_cache().clear()
+
+        self.bars(SEED_START + timedelta(days=2), 1) # Cache the middle day only
+        cached, queries = self.bars(SEED_START, 5)
+        self.assertEqual(cached, uncached)
+        # Days 1-2 and 4-5, not one query from day 1 to day 5 reading day 3 again
+        self.assertEqual(len(queries), 2)
+
+        _, queries = self.bars(SEED_START, 5)
+        self.assertEqual(queries, []) # Every day cached now
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_late_trade_invalidates_its_block_off_utc(self):
+        day = SEED_START + timedelta(days=2)
+        before, _ = self.bars(day, 1)
+        # 02:00 UTC is the evening before in New York: the invalidation bumps that trading day
+        late = Trade.objects.create(ticker='AAPL', price='999.00', quantity=1, side='BUY',
+                                    timestamp=day + timedelta(hours=2))
+        invalidate_trades([late])
+        after, queries = self.bars(day, 1)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(sum(bar['trade_count'] for bar in after), sum(bar['trade_count'] for bar in before) + 1)
@@ -1,9 +1,28 @@
 from django.urls import path
-from .views import TradeListCreateView # Importing our view
+from .views import (  # Importing our views
+    CacheStatsView, DailyTickerStatsView, NotificationStatsView, PositionsView, TradeAsyncCreateView,
+    TradeBarsView, TradeBulkCreateView, TradeExportView, TradeListCreateView,
+)
 
 urlpatterns = [
     # This maps the URL 'trades/' to our TradeListCreateView.
     # So, requests to /api/trades/ (assuming '/api/' is the prefix in project urls)
     # will be handled by this view.
     path('trades/', TradeListCreateView.as_view(), name='trade-list-create'),
-]
\ No newline at end of file
+    # POST a JSON array (or NDJSON) of trades to create them in one go.
+    path('trades/bulk/', TradeBulkCreateView.as_view(), name='trade-bulk-create'),
+    # Same as POST trades/, as an async view (serve with an ASGI server)
+    path('trades/async/', TradeAsyncCreateView.as_view(), name='trade-async-create'),
+    # Streams matching trades as ?format=csv (default) or ?format=ndjson
+    path('trades/export/', TradeExportView.as_view(), name='trade-export'),
+    # OHLCV + VWAP bars for a ticker, e.g. ?ticker=AAPL&interval=5m&start_date=2024-05-15&end_date=2024-05-15
+    path('trades/bars/', TradeBarsView.as_view(), name='trade-bars'),
+    # Per-ticker daily volume / VWAP from the DailyTickerStats rollup
+    path('stats/', DailyTickerStatsView.as_view(), name='daily-ticker-stats'),
+    # Cache hit / miss / eviction counters
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    # Notification queue depth, batch sizes and end-to-end latency
+    path('notifications/stats/', NotificationStatsView.as_view(), name='notification-stats'),
+    # Net positions with realized / unrealized P&L, marked to the live price feed
+    path('positions/', PositionsView.as_view(), name='positions'),
+]
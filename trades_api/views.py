@@ -1,51 +1,482 @@
-from rest_framework import generics, status
-from .models import Trade
-from .serializers import TradeSerializer
-from django.utils.dateparse import parse_datetime # For converting date strings to datetime objects
-from .tasks import send_trade_notification_task
+import json
+import threading
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from rest_framework import generics, serializers, status
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Sum
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from .bars import INTERVALS as BAR_INTERVALS, DEFAULT_MAX_BARS, bar_range, get_bars
+from .cache import cache_stats, cached_response_data, invalidate_trades
+from .exports import EXPORT_FORMATS
+from .models import DailyTickerStats, Trade, normalize_ticker
+from .notifications import notification_stats, queue_trade_notifications
+from .pagination import TradeCursorPagination
+from .parsers import NDJSONParser
+from .positions import get_book, record_trades
+from .serializers import DailyTickerStatsSerializer, FastTradeSerializer, TradeSerializer, format_vwap
+from .stats import apply_trades_to_daily_stats
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime # For converting date strings to datetime objects
 # from datetime import timedelta # Could be used for more precise end_date handling
 
+# Defaults for the bulk endpoint, can be overridden in settings.py
+DEFAULT_BULK_CHUNK_SIZE = 1000
+DEFAULT_BULK_MAX_ROWS = 100000
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+DEFAULT_ASYNC_DB_THREADS = 20
+
+
+def trade_details_for_task(trade_instance):
+    """
+    Build the plain dict we hand to Celery for a saved trade.
+    It's generally better to pass simple data types (like IDs or dicts) to Celery tasks
+    rather than full model instances, as model instances might not serialize well
+    or might carry too much state.
+    """
+    return {
+        'id': trade_instance.id,
+        'ticker': trade_instance.ticker,
+        'price': str(trade_instance.price), # Convert Decimal to string
+        'quantity': trade_instance.quantity,
+        'side': trade_instance.side,
+        'timestamp': trade_instance.timestamp.isoformat() # Convert datetime to string
+    }
+
+
+def create_trade(serializer):
+    """
+    Save a validated trade and update the daily rollup together, or not at all.
+    The cache invalidation, position update and notification only happen once it's committed.
+    """
+    with transaction.atomic():
+        trade_instance = serializer.save()
+        apply_trades_to_daily_stats([trade_instance])
+        transaction.on_commit(lambda: invalidate_trades([trade_instance]))
+        transaction.on_commit(lambda: record_trades([trade_instance]))
+        # The batcher sends it with the other trades of the next few hundred milliseconds
+        # as one Celery task, from its own thread (see notifications.py)
+        transaction.on_commit(lambda: queue_trade_notifications([trade_details_for_task(trade_instance)]))
+    return trade_instance
+
+
+def parse_trade_filters(params):
+    """
+    Read the optional ?ticker=, ?start_date= and ?end_date= filters.
+    Returns (ticker, start_date, end_date) with the ticker normalized and the dates
+    parsed; anything missing or unparseable comes back as None.
+    """
+    ticker = params.get('ticker')
+    start_date_str = params.get('start_date')
+    end_date_str = params.get('end_date')
+    ticker = normalize_ticker(ticker) if ticker else None
+    start_date = parse_datetime(start_date_str) if start_date_str else None
+    end_date = parse_datetime(end_date_str) if end_date_str else None
+    return ticker, start_date, end_date
+
+
+def filter_trades(queryset, params):
+    """
+    Apply the optional ?ticker=, ?start_date= and ?end_date= filters.
+    Shared by the listing and the export so both always agree on what a filter means.
+    """
+    ticker, start_date, end_date = parse_trade_filters(params)
+    if ticker:
+        queryset = queryset.filter(ticker=ticker)
+    if start_date:
+        queryset = queryset.filter(timestamp__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(timestamp__lte=end_date)
+    return queryset
+
+
 # This view handles both listing trades (GET) and creating new trades (POST)
 class TradeListCreateView(generics.ListCreateAPIView):
     serializer_class = TradeSerializer # Use our TradeSerializer for this view
+    pagination_class = TradeCursorPagination # Keyset pagination on (timestamp, id)
+    # Serializer used for GET listings. FastTradeSerializer reads plain values_list()
+    # rows and skips DRF's per-field machinery; set to None to list with serializer_class.
+    read_serializer_class = FastTradeSerializer
 
     # This method controls what data is returned for GET requests
     def get_queryset(self):
-        
-        queryset = Trade.objects.all().order_by('-timestamp')
-        ticker = self.request.query_params.get('ticker')
-        start_date_str = self.request.query_params.get('start_date')
-        end_date_str = self.request.query_params.get('end_date')
+        queryset = Trade.objects.all().order_by('-timestamp', '-id')
+        return filter_trades(queryset, self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        # Identical dashboard polls are answered from the cache; a new trade only
+        # invalidates the cached queries for its own ticker and day (see cache.py).
+        ticker, start_date, end_date = parse_trade_filters(request.query_params)
+        cache_params = (
+            request.get_host(), # next/previous links are absolute URLs
+            ticker, start_date, end_date,
+            request.query_params.get('cursor'),
+            request.query_params.get('page_size'),
+        )
+        data = cached_response_data(
+            'trades', cache_params, ticker, start_date, end_date,
+            lambda: self.list_uncached(request, *args, **kwargs).data
+        )
+        return Response(data)
+
+    def list_uncached(self, request, *args, **kwargs):
+        if self.read_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        # named=True rows still have .id/.timestamp, which the cursor paginator needs
+        queryset = self.filter_queryset(self.get_queryset()).values_list(
+            *self.read_serializer_class.fields, named=True
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.read_serializer_class(page, many=True).data)
+        return Response(self.read_serializer_class(queryset, many=True).data)
+
+    def perform_create(self, serializer):
+        trade_instance = create_trade(serializer)
+        print(f"API View: New trade {trade_instance.id} created. Notification queued.")
+
+
+_db_executor = None
+_db_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """
+    Threads the async create view runs its database work on.
+    sync_to_async's default (thread_sensitive) runs every call on ONE shared thread, so
+    concurrent inserts would queue up behind each other; this pool runs
+    TRADES_ASYNC_DB_THREADS at once, each thread with its own database connection.
+    """
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is None:
+            threads = getattr(settings, 'TRADES_ASYNC_DB_THREADS', DEFAULT_ASYNC_DB_THREADS)
+            _db_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='trade-db')
+        return _db_executor
+
+
+def create_trade_in_thread(serializer):
+    # Django only tidies up connections around requests on its own threads, so do the
+    # same here (CONN_MAX_AGE, connections broken by a database restart)
+    close_old_connections()
+    try:
+        return create_trade(serializer)
+    finally:
+        close_old_connections()
+
+
+def compact_json_response(data, status_code):
+    # Same bytes as DRF's JSONRenderer, so both create endpoints answer identically
+    return JsonResponse(data, status=status_code, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+
+
+# Async version of POST /api/trades/, for ASGI servers (uvicorn trading_system.asgi:application).
+# Validation runs right on the event loop (TradeSerializer never touches the database), the
+# insert + rollup run as one transaction on the database thread pool (the async ORM can't do
+# transactions), and the notification goes to the batcher, whose own thread talks to Redis.
+# So the event loop keeps serving other requests while one waits on Postgres, and none waits on the broker.
+# Same request body, validation errors and response body as POST /api/trades/.
+@method_decorator(csrf_exempt, name='dispatch')
+class TradeAsyncCreateView(View):
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+        except ValueError as e:
+            return compact_json_response({'detail': f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+        serializer = TradeSerializer(data=data)
+        if not serializer.is_valid():
+            return compact_json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        save = sync_to_async(create_trade_in_thread, thread_sensitive=False, executor=get_db_executor())
+        trade_instance = await save(serializer)
+        print(f"API View: New trade {trade_instance.id} created (async). Notification queued.")
+        return compact_json_response(TradeSerializer(trade_instance).data, status.HTTP_201_CREATED)
+
+
+# This view handles POSTing many trades at once (e.g. an end-of-day fill replay).
+# Body can be a JSON array of trade objects, or NDJSON (one trade object per line).
+class TradeBulkCreateView(generics.GenericAPIView):
+    serializer_class = TradeSerializer
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def get_chunk_size(self):
+        """
+        Rows per INSERT statement. Comes from ?chunk_size=, falling back to
+        settings.TRADES_BULK_CHUNK_SIZE.
+        """
+        default = getattr(settings, 'TRADES_BULK_CHUNK_SIZE', DEFAULT_BULK_CHUNK_SIZE)
+        try:
+            chunk_size = int(self.request.query_params.get('chunk_size', default))
+        except (TypeError, ValueError):
+            chunk_size = default
+        return max(1, chunk_size)
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {'error': "Expected a JSON array (or NDJSON body) of trade objects."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_rows = getattr(settings, 'TRADES_BULK_MAX_ROWS', DEFAULT_BULK_MAX_ROWS)
+        if len(rows) > max_rows:
+            return Response(
+                {'error': f"Too many rows in one request ({len(rows)}). Maximum is {max_rows}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Validate every row with the same rules as the single-row endpoint.
+        # One serializer instance is reused so DRF only builds its fields once.
+        # Bad rows are reported by index instead of rejecting the whole batch.
+        row_serializer = self.get_serializer()
+        valid_trades = []
+        errors = []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors.append({'index': index, 'errors': {'non_field_errors': ["Expected a trade object."]}})
+                continue
+            try:
+                validated = row_serializer.run_validation(row)
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+                continue
+            valid_trades.append(Trade(**validated))
+
+        created_ids = []
+        if valid_trades:
+            created_ids = self.perform_bulk_create(valid_trades)
+
+        if errors and not created_ids:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_201_CREATED
+
+        return Response({
+            'created': len(created_ids),
+            'failed': len(errors),
+            'ids': created_ids,
+            'errors': errors,
+        }, status=response_status)
+
+    def perform_bulk_create(self, trades):
+        chunk_size = self.get_chunk_size()
+        created_ids = []
+        notification_details = []
+
+        # One transaction for the whole batch, but chunked INSERTs so a huge
+        # replay doesn't turn into one enormous statement.
+        with transaction.atomic():
+            for start in range(0, len(trades), chunk_size):
+                chunk = Trade.objects.bulk_create(trades[start:start + chunk_size])
+                created_ids.extend(trade.id for trade in chunk)
+                apply_trades_to_daily_stats(chunk)
+
+                notification_details.extend(trade_details_for_task(trade) for trade in chunk)
+
+            # Drop cached listings/stats that could include the new trades
+            transaction.on_commit(lambda: invalidate_trades(trades))
+            transaction.on_commit(lambda: record_trades(trades))
+            # The batcher splits these into notification tasks; only once the rows are actually committed
+            transaction.on_commit(lambda: queue_trade_notifications(notification_details))
+
+        print(f"API View: Bulk created {len(created_ids)} trades. {len(notification_details)} notifications queued.")
+        return created_ids
+
+
+# This view streams every matching trade as CSV or NDJSON (e.g. a whole month for analysts).
+# Rows are read from the database in chunks (a server-side cursor on PostgreSQL) and
+# written out as they arrive, so memory stays flat however many rows match.
+# It's a plain Django view because DRF reserves ?format= for its own renderers.
+class TradeExportView(View):
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse(
+                {'error': f"Unknown export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = filter_trades(Trade.objects.all(), request.GET).order_by('-timestamp', '-id')
+        chunk_size = getattr(settings, 'TRADES_EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+        content_type, row_stream = EXPORT_FORMATS[export_format]
+
+        response = StreamingHttpResponse(row_stream(queryset, chunk_size), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="trades.{export_format}"'
+        return response
+
+
+def parse_bar_time(value, end=False):
+    """
+    A datetime (naive ones are UTC) or a plain date, which means the start of that day,
+    or for an end the end of it. None if missing or unparseable.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value) # Checked first: parse_datetime also takes a plain date, as midnight
+        if day is not None:
+            moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+        else:
+            moment = parse_datetime(value)
+            if moment is None:
+                return None
+    except ValueError:
+        return None
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment, dt_timezone.utc)
+
+
+def format_bar_time(epoch):
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+# OHLCV + VWAP bars for one ticker, computed in the database instead of shipping raw trades:
+#   GET /api/trades/bars/?ticker=AAPL&interval=5m&start_date=2024-05-15&end_date=2024-05-15
+# interval is 1m, 5m, 1h or 1d. Bars are aligned to UTC and cover [start_date, end_date)
+# widened to whole bars (a plain end_date includes that day). Bars without trades are left out.
+# Closed days of bars are cached until a trade for that ticker and day arrives (see bars.py).
+class TradeBarsView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        ticker = normalize_ticker(params.get('ticker', ''))
+        interval = params.get('interval')
+        if not ticker or interval not in BAR_INTERVALS:
+            return Response({'error': f"ticker and interval ({', '.join(BAR_INTERVALS)}) are required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        start = parse_bar_time(params.get('start_date'))
+        end = parse_bar_time(params.get('end_date'), end=True)
+        if start is None or end is None or end <= start:
+            return Response({'error': "start_date and end_date (YYYY-MM-DD or ISO 8601) are required, "
+                                      "end_date after start_date."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_bars = getattr(settings, 'TRADES_BARS_MAX_BARS', DEFAULT_MAX_BARS)
+        start, end, bar_count = bar_range(interval, start, end)
+        if bar_count > max_bars:
+            return Response({'error': f"That range is {bar_count} {interval} bars, more than the {max_bars} allowed. "
+                                      f"Use a longer interval or a shorter range."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        bars = get_bars(ticker, interval, start, end)
+        for bar in bars:
+            bar['start'] = format_bar_time(bar['start'])
+        return Response({
+            'ticker': ticker,
+            'interval': interval,
+            'start': format_bar_time(start.timestamp()),
+            'end': format_bar_time(end.timestamp()),
+            'bars': bars,
+        })
+
+
+# This view answers volume / VWAP questions from the DailyTickerStats rollup.
+# It reads one row per (day, ticker), so the cost doesn't depend on how many trades there were.
+#   GET /api/stats/?ticker=AAPL&start_date=2024-05-01&end_date=2024-05-31
+#   GET /api/stats/?start_date=2024-05-01&group_by=ticker   (one total per ticker for the range)
+class DailyTickerStatsView(generics.ListAPIView):
+    serializer_class = DailyTickerStatsSerializer
+    pagination_class = None # At most days x tickers rows
+
+    def get_filters(self):
+        """(ticker, start_day, end_day), normalized; missing values are None."""
+        params = self.request.query_params
+        ticker = params.get('ticker')
+        ticker = normalize_ticker(ticker) if ticker else None
+        # Accept plain dates (2024-05-15) or full datetimes like the trade listing does
+        start_day = parse_date(params['start_date'][:10]) if params.get('start_date') else None
+        end_day = parse_date(params['end_date'][:10]) if params.get('end_date') else None
+        return ticker, start_day, end_day
+
+    def get_queryset(self):
+        queryset = DailyTickerStats.objects.all().order_by('date', 'ticker')
+        ticker, start_day, end_day = self.get_filters()
         if ticker:
-            queryset = queryset.filter(ticker__iexact=ticker)
-        if start_date_str:
-            start_date = parse_datetime(start_date_str)
-            if start_date:
-                queryset = queryset.filter(timestamp__gte=start_date)
-        if end_date_str:
-            end_date = parse_datetime(end_date_str)
-            if end_date:
-                queryset = queryset.filter(timestamp__lte=end_date)
+            queryset = queryset.filter(ticker=ticker)
+        if start_day:
+            queryset = queryset.filter(date__gte=start_day)
+        if end_day:
+            queryset = queryset.filter(date__lte=end_day)
         return queryset
 
-    def perform_create(self, serializer):
-        trade_instance = serializer.save() 
-
-        # Prepare details for the task (serializer.data is a good source after save)
-        # It's generally better to pass simple data types (like IDs or dicts) to Celery tasks
-        # rather than full model instances, as model instances might not serialize well
-        # or might carry too much state.
-        trade_details_for_task = {
-            'id': trade_instance.id,
-            'ticker': trade_instance.ticker,
-            'price': str(trade_instance.price), # Convert Decimal to string
-            'quantity': trade_instance.quantity,
-            'side': trade_instance.side,
-            'timestamp': trade_instance.timestamp.isoformat() # Convert datetime to string
-        }
-        
-        # Call the Celery task asynchronously
-        # .delay() is a shortcut for .apply_async()
-        send_trade_notification_task.delay(trade_details_for_task)
-        
-        print(f"API View: New trade {trade_instance.id} created. Notification task queued.")
\ No newline at end of file
+    def list(self, request, *args, **kwargs):
+        ticker, start_day, end_day = self.get_filters()
+        group_by = request.query_params.get('group_by')
+        data = cached_response_data(
+            'stats', (ticker, start_day, end_day, group_by), ticker, start_day, end_day,
+            lambda: self.list_uncached(request, *args, **kwargs).data
+        )
+        return Response(data)
+
+    def list_uncached(self, request, *args, **kwargs):
+        if request.query_params.get('group_by') != 'ticker':
+            return super().list(request, *args, **kwargs)
+
+        totals = self.get_queryset().order_by('ticker').values('ticker').annotate(
+            volume=Sum('volume'),
+            notional=Sum('notional'),
+            trade_count=Sum('trade_count'),
+            buy_volume=Sum('buy_volume'),
+            sell_volume=Sum('sell_volume'),
+            buy_notional=Sum('buy_notional'),
+            sell_notional=Sum('sell_notional'),
+        )
+        return Response([
+            {
+                'ticker': row['ticker'],
+                'volume': row['volume'],
+                'notional': f"{row['notional']:.2f}",
+                'vwap': format_vwap(row['notional'], row['volume']),
+                'trade_count': row['trade_count'],
+                'buy_volume': row['buy_volume'],
+                'sell_volume': row['sell_volume'],
+                'buy_notional': f"{row['buy_notional']:.2f}",
+                'sell_notional': f"{row['sell_notional']:.2f}",
+            }
+            for row in totals
+        ])
+
+
+# Hit / miss / invalidation counters for the trade listing and stats cache, to help size it.
+# Counters are per process; evictions come from Redis itself when it's the backend.
+class CacheStatsView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats())
+
+
+# Notification batching / delivery metrics (queue depth, batch sizes, end-to-end latency)
+class NotificationStatsView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        return Response(notification_stats())
+
+
+# Net positions and P&L per ticker, marked to the latest price from the feed (see positions.py).
+# ?ticker=AAPL,MSFT narrows it down; ?include_flat=true also lists tickers that are flat now.
+class PositionsView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        tickers = request.query_params.get('ticker')
+        if tickers:
+            tickers = {normalize_ticker(ticker) for ticker in tickers.split(',') if ticker.strip()}
+        include_flat = request.query_params.get('include_flat', '').lower() in ('1', 'true', 'yes')
+        book = get_book()
+        if book is None:
+            return Response({'error': "Positions are off in this process (set POSITIONS_ENGINE=1, see settings.py)."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if book.loading:
+            return Response({'error': "Positions are still loading, try again shortly."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+        return Response(book.snapshot(tickers=tickers or None, include_flat=include_flat))
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import sys
 from dotenv import load_dotenv
 import os
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -75,17 +76,79 @@ WSGI_APPLICATION = 'trading_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Connections are kept open between requests instead of reconnecting every time (each new
+# connection costs a TCP + auth handshake and a fresh Postgres backend process).
+# DB_CONN_MAX_AGE seconds, health-checked before reuse, so a connection dropped by a database
+# restart or an idle timeout is replaced instead of failing the request. That is one connection
+# per worker thread (and per thread of the async create view's pool, TRADES_ASYNC_DB_THREADS).
+# DB_POOL_MAX_SIZE > 0 switches to a real pool per process instead, shared by all its threads
+# (needs psycopg 3: pip install "psycopg[binary,pool]"). Either way keep
+#   processes x connections per process   below Postgres' max_connections.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '0'))
+
+
+def database_settings(host, port):
+    database = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
-        'HOST': os.getenv('DB_HOST', 'localhost'),
-        'PORT': os.getenv('DB_PORT', '5432'),
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
+    if DB_POOL_MAX_SIZE:
+        from psycopg_pool import ConnectionPool # Only needed when pooling is on
+        database['CONN_MAX_AGE'] = 0 # The pool keeps connections open; Django refuses both at once
+        database['OPTIONS'] = {'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')), # Seconds to wait for a free connection
+            'check': ConnectionPool.check_connection, # Health check on checkout
+        }}
+    return database
+
+
+DATABASES = {
+    'default': database_settings(os.getenv('DB_HOST', 'localhost'), os.getenv('DB_PORT', '5432')),
 }
 
+# Optional read replica: set DB_REPLICA_HOST and reads of trades (listing, stats, export)
+# go to it, writes stay on the primary (see trades_api/db_routers.py).
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = database_settings(os.getenv('DB_REPLICA_HOST'), os.getenv('DB_REPLICA_PORT', '5432'))
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'} # Tests have no replica, read the primary
+    DATABASE_ROUTERS = ['trades_api.db_routers.ReadReplicaRouter']
+TRADES_READ_FROM_REPLICA = True # False sends every read back to the primary
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Caches trade listings and /api/stats/ responses (see trades_api/cache.py).
+# Uses Redis db 1 so it doesn't mix with the Celery broker on db 0.
+# Tests (or CACHE_BACKEND=locmem) get an in-process cache instead, so Redis isn't needed.
+
+if 'test' in sys.argv or os.getenv('CACHE_BACKEND') == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'trades-api',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+
+TRADES_CACHE_TIMEOUT = 60 # Seconds a cached listing/stats response lives
+TRADES_BARS_CACHE_TIMEOUT = 24 * 60 * 60 # Seconds a closed day of /api/trades/bars/ lives (new trades replace it sooner)
+TRADES_BARS_MAX_BARS = 50000 # Most bars one bars request may cover
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -132,4 +195,42 @@ CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+# Run with: celery -A trading_system beat -l info
+CELERY_BEAT_SCHEDULE = {
+    # Create upcoming trade partitions and apply retention (see trades_api/partitions.py)
+    'manage-trade-partitions': {
+        'task': 'trades_api.tasks.manage_trade_partitions_task',
+        'schedule': 6 * 60 * 60, # Seconds; it's idempotent, so running it often is harmless
+    },
+}
+# Bulk trade ingestion (POST /api/trades/bulk/)
+TRADES_BULK_CHUNK_SIZE = 1000 # Rows per INSERT statement
+TRADES_BULK_MAX_ROWS = 100000 # Reject bodies bigger than this
+
+# Streaming export (GET /api/trades/export/)
+TRADES_EXPORT_CHUNK_SIZE = 2000 # Rows fetched per database round trip
+
+# Trade table partitioning (PostgreSQL, see trades_api/partitions.py)
+TRADES_PARTITION_INTERVAL = 'month' # 'month' or 'day' (UTC)
+TRADES_PARTITION_PREMAKE = 3 # Partitions created ahead of the current one
+TRADES_PARTITION_RETENTION = None # Partitions kept, current included (e.g. 24 months); None keeps everything
+TRADES_PARTITION_DROP_DETACHED = False # Drop old partitions instead of keeping them as *_archived_* tables
+
+# Async trade creation (POST /api/trades/async/ under ASGI)
+TRADES_ASYNC_DB_THREADS = 20 # Inserts running at once per process (one DB connection each)
+
+# Trade notifications (see trades_api/notifications.py)
+TRADES_NOTIFY_BATCH_SIZE = 500 # Queue a batch task once this many notifications are pending...
+TRADES_NOTIFY_MAX_WAIT = 0.25 # ...or once the oldest has waited this many seconds
+TRADES_NOTIFY_MAX_PENDING = 50000 # Kept in memory while the broker is unreachable, the rest dropped
+TRADES_NOTIFY_CONCURRENCY = 100 # Notifications a worker sends at once per batch
+TRADES_NOTIFY_SEND_SECONDS = 5 # Simulated external call per notification
+
+# Positions and P&L (see trades_api/positions.py)
+# Off by default. Set POSITIONS_ENGINE=1 on the ONE process that serves GET /api/positions/:
+# it warm-starts the book in the background when Django starts, not on a request.
+TRADES_POSITIONS_ENABLED = os.getenv('POSITIONS_ENGINE') == '1'
+# Price feed the positions are marked against, e.g. ws://localhost:8765 (mock_server.py);
+# unset leaves them unmarked
+TRADES_POSITIONS_FEED_URL = os.getenv('POSITIONS_FEED_URL') or None
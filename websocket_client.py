@@ -1,57 +1,95 @@
+import argparse
 import asyncio
+import os
+import time
 import websockets
-import json
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
+from alert_rules import load_rule_engine
+from feed_pipeline import DEFAULT_QUEUE_SIZE, DEFAULT_STATS_INTERVAL, FeedPipeline
+from feed_supervisor import FeedSupervisor, SequenceTracker, interest_messages
+from price_windows import PriceWindowMonitor
+from tick_log import TickLog, TickRecorder
+from wire_format import FORMAT_JSON, FORMATS, FeedDecoder, format_messages
 
 SERVER_URL = "ws://localhost:8765"
 PRICE_HISTORY_SECONDS = 60  # How long we look back for the price check (1 minute)
 PRICE_INCREASE_THRESHOLD_PERCENT = 2.0 # The 2% jump we're looking for
+PRICE_DROP_THRESHOLD_PERCENT = 2.0 # ...and the 2% fall
+
+# Optional per-ticker settings, e.g. a shorter window and a bigger threshold for a jumpy stock:
+# {"TSLA": {"window_seconds": 30, "rise_percent": 3.0, "drop_percent": 3.0}}
+# A threshold of None turns that check off for the ticker, e.g. {"AAPL": {"drop_percent": None}}.
+TICKER_WINDOW_SETTINGS = {}
+
+# Only ask the server for these tickers (None = all of them), e.g. {"MOCKSTOCK_A", "MOCKSTOCK_C"}.
+# Can also be set with --tickers.
+WATCHED_TICKERS = None
+
+# 'json' (default) or 'binary': compact frames with a symbol table sent once (see wire_format.py).
+# Can also be set with --format.
+WIRE_FORMAT = FORMAT_JSON
+
+# Set to a TickRecorder (tick_log.py) to save every tick received, e.g. with --record ticks/.
+# Replay them later through the same checks with --replay ticks/.
+tick_recorder = None
+
+# Rolling min / max price per ticker over the last PRICE_HISTORY_SECONDS (see price_windows.py).
+# Each tick costs the same no matter how many prices are in the window.
+price_monitor = PriceWindowMonitor(
+    window_seconds=PRICE_HISTORY_SECONDS,
+    rise_percent=PRICE_INCREASE_THRESHOLD_PERCENT,
+    drop_percent=PRICE_DROP_THRESHOLD_PERCENT,
+)
+for _ticker, _settings in TICKER_WINDOW_SETTINGS.items():
+    price_monitor.configure(_ticker, **_settings)
+
+
+# Extra alert rules (see alert_rules.py and alert_rules.example.json). Only used if the file exists.
+ALERT_RULES_FILE = os.environ.get("ALERT_RULES_FILE", "alert_rules.json")
+rule_engine = load_rule_engine(ALERT_RULES_FILE) if os.path.exists(ALERT_RULES_FILE) else None
+
+
+def format_price_alert(alert):
+    """Turn a PriceAlert into the message we print."""
+    change = "increased" if alert.direction == 'rise' else "dropped"
+    from_time = datetime.fromtimestamp(alert.from_ts, timezone.utc).strftime('%H:%M:%S')
+    to_time = datetime.fromtimestamp(alert.ts, timezone.utc).strftime('%H:%M:%S')
+    return (
+        f"ALERT! {alert.ticker} {change} by {alert.percent:.2f}% "
+        f"(from {alert.from_price:.2f} at {from_time} "
+        f"to {alert.price:.2f} at {to_time}) "
+        f"within the last {alert.window_seconds} seconds."
+    )
 
-# This dictionary will hold lists of (timestamp, price) for each stock ticker
-# e.g., {"AAPL": [(datetime_obj, 150.00), (datetime_obj, 150.10)], ...}
-recent_prices = {}
 
 def update_and_check_price_history(ticker, current_price, current_timestamp_dt):
     """
-    Updates the price history for a ticker and checks for a >2% increase in the last minute.
-    Returns a notification message if the threshold is met, otherwise None.
+    Adds the price to the ticker's window and checks for a rise above the window's
+    lowest price (or a drop below its highest) past the threshold.
+    Returns a notification message if a threshold is met, otherwise None.
     """
-    if ticker not in recent_prices:
-        recent_prices[ticker] = [] # Start a new list if it's a new ticker
-
-    # Add the latest price and time to our list for this stock
-    recent_prices[ticker].append((current_timestamp_dt, current_price))
+    alert = price_monitor.update(ticker, current_price, current_timestamp_dt.timestamp())
+    if alert is None:
+        return None
+    return format_price_alert(alert)
 
-    # Figure out what time it was one minute ago
-    one_minute_ago = current_timestamp_dt - timedelta(seconds=PRICE_HISTORY_SECONDS)
 
-    # Keep only the prices from the last minute to prevent the list from growing forever
-    valid_history = []
-    for ts, price in recent_prices[ticker]:
-        if ts >= one_minute_ago:
-            valid_history.append((ts, price))
-    recent_prices[ticker] = valid_history
+def update_timestamp(update_data):
+    """When an update happened, as a UTC datetime: binary frames give epoch seconds ('ts'), JSON an ISO string."""
+    if 'ts' in update_data:
+        return datetime.fromtimestamp(update_data['ts'], timezone.utc)
+    return datetime.fromisoformat(update_data['timestamp'].replace('Z', '+00:00'))
 
-    # Need at least two prices in the last minute to compare (an old one and the current one)
-    if not recent_prices[ticker] or len(recent_prices[ticker]) < 2:
-        return None
 
-    # The first price in our 'valid_history' is the oldest one from the last minute
-    earliest_ts_in_window, earliest_price_in_window = recent_prices[ticker][0]
+def record_tick(ticker, price, ts, update_data):
+    """Save a received tick, if we're recording."""
+    if tick_recorder is not None:
+        tick_recorder.append(ticker, price, ts, update_data.get('seq', 0), update_data.get('quantity', 1))
 
-    if current_price > earliest_price_in_window:
-        # Calculate the percentage increase
-        percentage_increase = ((current_price - earliest_price_in_window) / earliest_price_in_window) * 100
 
-        if percentage_increase > PRICE_INCREASE_THRESHOLD_PERCENT:
-            notification = (
-                f"ALERT! {ticker} increased by {percentage_increase:.2f}% "
-                f"(from {earliest_price_in_window:.2f} at {earliest_ts_in_window.strftime('%H:%M:%S')} "
-                f"to {current_price:.2f} at {current_timestamp_dt.strftime('%H:%M:%S')}) "
-                f"within the last {PRICE_HISTORY_SECONDS} seconds."
-            )
-            return notification
-    return None
+def connect_messages():
+    """What we send right after connecting: the wire format, then the tickers we watch."""
+    return format_messages(WIRE_FORMAT) + interest_messages(None, WATCHED_TICKERS)
 
 
 async def connect_and_listen():
@@ -62,36 +100,48 @@ async def connect_and_listen():
     try:
         async with websockets.connect(SERVER_URL) as websocket: # Try to connect
             print(f"Successfully connected to server at {SERVER_URL}")
+            for message in connect_messages(): # Tell the server how to send and what we watch
+                await websocket.send(message)
+            decoder = FeedDecoder() # JSON, or binary frames + the symbol table they need
 
             while True: # Keep listening for messages forever (or until disconnect)
                 try:
                     message_str = await websocket.recv() # Wait for a message from server
-                    updates = json.loads(message_str) # Server sends JSON, so parse it
+                    updates = decoder.decode(message_str)
+                    if not updates:
+                        continue # e.g. the symbol table
 
                     print(f"\nReceived {len(updates)} updates:", flush=True)
 
                     for update_data in updates:
                         ticker = update_data['ticker']
                         price = float(update_data['price']) # Make sure price is a number
-                        # Convert timestamp string from server to a real datetime object
-                        timestamp_dt = datetime.fromisoformat(update_data['timestamp'].replace('Z', '+00:00'))
+                        # Convert the server's timestamp to a real datetime object
+                        timestamp_dt = update_timestamp(update_data)
 
                         print(f"  Ticker: {ticker}, Price: {price:.2f}, Timestamp: {timestamp_dt.strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
+                        record_tick(ticker, price, timestamp_dt.timestamp(), update_data)
 
                         # Check if this new price triggers our 2% rule
                         notification = update_and_check_price_history(ticker, price, timestamp_dt)
                         if notification:
                             print(f"\n>> {notification}\n", flush=True) # Show the alert!
 
+                        # Any configured rules too (they share one rolling state per ticker)
+                        if rule_engine is not None:
+                            quantity = update_data.get('quantity', 1)
+                            for rule_alert in rule_engine.update(ticker, price, timestamp_dt.timestamp(), quantity):
+                                print(f"\n>> RULE {rule_alert.message}\n", flush=True)
+
                 except websockets.exceptions.ConnectionClosedOK:
                     print("Connection closed gracefully by the server.")
                     break # Exit the loop if server closes connection
                 except websockets.exceptions.ConnectionClosedError as e:
                     print(f"Connection closed with error: {e}")
                     break # Exit loop on error too
-                except json.JSONDecodeError:
-                    # Just in case server sends something weird that's not JSON
-                    print(f"Received a non-JSON message: {message_str}", flush=True)
+                except ValueError:
+                    # Just in case server sends something weird (not JSON, or a broken binary frame)
+                    print(f"Received a message we can't decode: {str(message_str)[:200]}", flush=True)
                 except Exception as e:
                     print(f"An unexpected error occurred: {e}", flush=True)
                     break # Stop if something else unexpected happens
@@ -102,8 +152,180 @@ async def connect_and_listen():
     except Exception as e:
         print(f"Failed to connect or an error occurred: {e}")
 
+def check_update(ticker, price, ts, update_data):
+    """
+    Pipeline mode's per-update hook: the same 2% window check and configured rules
+    as connect_and_listen, on an already-parsed float timestamp. Returns alert messages.
+    """
+    record_tick(ticker, price, ts, update_data)
+    messages = []
+    alert = price_monitor.update(ticker, price, ts)
+    if alert is not None:
+        messages.append(format_price_alert(alert))
+    if rule_engine is not None:
+        for rule_alert in rule_engine.update(ticker, price, ts, update_data.get('quantity', 1)):
+            messages.append(f"RULE {rule_alert.message}")
+    return messages
+
+
+async def connect_and_listen_pipeline(queue_size=DEFAULT_QUEUE_SIZE, overflow='block', print_updates=True,
+                                      stats_interval=DEFAULT_STATS_INTERVAL):
+    """
+    Same job as connect_and_listen, but through FeedPipeline (see feed_pipeline.py):
+    frames are queued as they arrive and decoded / checked in batches, console
+    output is buffered and rate-limited, and latency / backpressure stats are printed.
+    """
+    pipeline = FeedPipeline(check_update, queue_size=queue_size, overflow=overflow,
+                            print_updates=print_updates, stats_interval=stats_interval)
+    try:
+        async with websockets.connect(SERVER_URL) as websocket:
+            print(f"Successfully connected to server at {SERVER_URL} (pipeline mode)")
+            for message in connect_messages():
+                await websocket.send(message)
+            await pipeline.run(websocket)
+    except websockets.exceptions.ConnectionClosedOK:
+        print("Connection closed gracefully by the server.")
+    except websockets.exceptions.ConnectionClosedError as e:
+        print(f"Connection closed with error: {e}")
+    except ConnectionRefusedError:
+        print(f"Connection refused. Is the server running at {SERVER_URL}?")
+    except Exception as e:
+        print(f"Failed to connect or an error occurred: {e}")
+    return pipeline
+
+
+def handle_updates(updates):
+    """Reconnecting mode's handler for one batch: print it and run the same checks as connect_and_listen."""
+    print(f"\nReceived {len(updates)} updates:", flush=True)
+    for update_data in updates:
+        ticker = update_data['ticker']
+        price = float(update_data['price'])
+        timestamp_dt = update_timestamp(update_data)
+        print(f"  Ticker: {ticker}, Price: {price:.2f}, Timestamp: {timestamp_dt.strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
+        for message in check_update(ticker, price, timestamp_dt.timestamp(), update_data):
+            print(f"\n>> {message}\n", flush=True)
+
+
+def mark_feed_gap():
+    """We missed updates: don't let the windows compare prices from before the gap with ones after it."""
+    price_monitor.mark_gap()
+    if rule_engine is not None:
+        rule_engine.mark_gap()
+
+
+async def listen_with_reconnect():
+    """
+    Like connect_and_listen, but never gives up: reconnects with backoff when the
+    connection drops, keeps the price windows, and marks them when updates were
+    missed in between (see feed_supervisor.py).
+    """
+    supervisor = FeedSupervisor(SERVER_URL, handle_updates, on_gap=mark_feed_gap, tickers=WATCHED_TICKERS,
+                                wire_format=WIRE_FORMAT)
+    try:
+        await supervisor.run()
+    finally:
+        for line in supervisor.stats_lines():
+            print(line)
+
+
+def parse_time_argument(value):
+    """--start / --end: ISO 8601, taken as UTC when there's no offset. Returns float epoch seconds."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def replay_ticks(directory, speed=0.0, tickers=None, start=None, end=None):
+    """
+    Run recorded ticks (see tick_log.py) through the same checks as the live client, printing the alerts.
+    speed=0 goes as fast as possible; otherwise `speed` times as fast as the ticks happened (1 = real time).
+    tickers / start / end (float epoch seconds) pick what to replay. Feed gaps in the recording
+    (seq jumps, or a new recording session) mark the windows, just like when it was live.
+    Returns (ticks replayed, alerts).
+    """
+    log = TickLog(directory)
+    sequence = SequenceTracker()
+    last_seq = None
+    ticks = alerts = 0
+    first_ts = None
+    started = time.perf_counter()
+    try:
+        for ticker, price, ts, seq, quantity in log.ticks(tickers, start, end):
+            if speed:
+                if first_ts is None:
+                    first_ts = ts
+                wait = started + (ts - first_ts) / speed - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            if seq and seq != last_seq: # A new batch
+                last_seq = seq
+                if sequence.check(seq):
+                    mark_feed_gap()
+            for message in check_update(ticker, price, ts, {'quantity': quantity}):
+                alerts += 1
+                print(f"\n>> {message}\n", flush=True)
+            ticks += 1
+    finally:
+        log.close()
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {ticks:,} ticks in {elapsed:.2f}s ({ticks / max(elapsed, 1e-9):,.0f} ticks/s), "
+          f"{alerts} alerts, {sequence.gaps} feed gaps")
+    return ticks, alerts
+
+
+async def watch_tickers(supervisor, tickers):
+    """Change what a running reconnecting client listens to; windows / rule state of dropped tickers are thrown away."""
+    for ticker in await supervisor.set_interest(tickers):
+        price_monitor.forget(ticker)
+        if rule_engine is not None:
+            rule_engine.forget(ticker)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Listen to the mock price feed and print alerts.")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Queue + batch processing with buffered output and latency stats")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="Pipeline queue size (frames)")
+    parser.add_argument('--overflow', choices=['block', 'drop_oldest'], default='block',
+                        help="What the pipeline does when its queue is full")
+    parser.add_argument('--quiet', action='store_true', help="Pipeline mode: only print alerts and stats")
+    parser.add_argument('--stats-interval', type=float, default=DEFAULT_STATS_INTERVAL)
+    parser.add_argument('--reconnect', action='store_true',
+                        help="Keep reconnecting (with backoff) when the connection drops, keeping the price windows")
+    parser.add_argument('--tickers', help="Comma-separated tickers to subscribe to (default: all of them)")
+    parser.add_argument('--format', choices=FORMATS, default=FORMAT_JSON,
+                        help="Wire format to ask the server for (binary: smaller frames, cheaper to decode)")
+    parser.add_argument('--record', metavar='DIR', help="Save every tick received to a tick log in DIR")
+    parser.add_argument('--replay', metavar='DIR',
+                        help="Don't connect: run the ticks recorded in DIR through the alert checks")
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="Replay: 0 = as fast as possible (default), 1 = real time, 60 = a minute per second")
+    parser.add_argument('--start', help="Replay: only ticks from this time on (ISO 8601, UTC if no offset)")
+    parser.add_argument('--end', help="Replay: only ticks up to this time")
+    args = parser.parse_args()
+    WIRE_FORMAT = args.format
+    if args.tickers:
+        WATCHED_TICKERS = {ticker.strip() for ticker in args.tickers.split(',') if ticker.strip()}
+    if args.record and args.replay:
+        parser.error("--record and --replay can't be used together")
+    if args.record:
+        tick_recorder = TickRecorder(args.record)
     try:
-        asyncio.run(connect_and_listen()) # Start the client
+        if args.replay:
+            replay_ticks(args.replay, args.speed, WATCHED_TICKERS,
+                         parse_time_argument(args.start) if args.start else None,
+                         parse_time_argument(args.end) if args.end else None)
+        elif args.reconnect:
+            asyncio.run(listen_with_reconnect())
+        elif args.pipeline:
+            asyncio.run(connect_and_listen_pipeline(args.queue_size, args.overflow, not args.quiet,
+                                                    args.stats_interval))
+        else:
+            asyncio.run(connect_and_listen()) # Start the client
     except KeyboardInterrupt:
-        print("\nClient shutting down...") # For Ctrl+C
\ No newline at end of file
+        print("\nClient shutting down...") # For Ctrl+C
+    finally:
+        if tick_recorder is not None:
+            tick_recorder.close()
+            print(f"Recorded {tick_recorder.ticks:,} ticks to {args.record}")
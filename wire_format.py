@@ -0,0 +1,120 @@
+"""
+Wire formats for the price feed (mock_server.py <-> websocket_client.py).
+
+JSON (the default): every frame is a JSON list of updates,
+    [{"ticker": "MOCKSTOCK_A", "price": 101.25, "timestamp": "2024-05-15T10:00:00.123456+00:00", "seq": 7}, ...]
+
+Binary: a client asks for it with the control message
+    {"action": "format", "format": "binary"}
+and the server answers (as a text frame) with the symbol table, once per connection:
+    {"type": "symbols", "version": 1, "price_scale": 10000, "tickers": ["MOCKSTOCK_A", ...]}
+A ticker's id is its position in that list. From then on every batch is one binary frame:
+    header  <2sBxIqq  magic b"PF", version, count, seq, timestamp (epoch nanoseconds)
+    count x <Iq       ticker id, price * price_scale (fixed point)
+All updates in a batch share seq and timestamp, so they're in the header once.
+That's 12 bytes per tick against ~90 for JSON, and decoding is a struct.iter_unpack
+instead of json.loads plus a timestamp parse per update.
+
+{"action": "format", "format": "json"} switches back. A new connection always starts as JSON.
+"""
+import json
+import struct
+
+FORMAT_JSON = 'json'
+FORMAT_BINARY = 'binary'
+FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+MAGIC = b'PF' # Binary frames start with this; JSON frames start with '[' and control replies with '{'
+VERSION = 1
+PRICE_SCALE = 10000 # Prices travel as integers of 1/10000ths
+HEADER = struct.Struct('<2sBxIqq') # magic, version, count, seq, ts_ns
+RECORD = struct.Struct('<Iq') # ticker id, price * PRICE_SCALE
+
+
+def format_message(wire_format):
+    return json.dumps({"action": "format", "format": wire_format})
+
+
+def format_messages(wire_format):
+    """Control messages to send on a new connection to get `wire_format` (none for the default, JSON)."""
+    if wire_format not in FORMATS:
+        raise ValueError(f"Unknown wire format '{wire_format}', expected one of {', '.join(FORMATS)}")
+    return [] if wire_format == FORMAT_JSON else [format_message(wire_format)]
+
+
+def is_binary_frame(frame):
+    return isinstance(frame, (bytes, bytearray, memoryview)) and bytes(frame[:2]) == MAGIC
+
+
+class BinaryEncoder:
+    """Server side: packs batches for binary clients. Ticker ids are positions in `tickers`."""
+
+    def __init__(self, tickers):
+        self.tickers = list(tickers)
+        self.ids = {ticker: index for index, ticker in enumerate(self.tickers)}
+        self.table = None
+
+    def symbol_table(self):
+        """The reply to a format request, as UTF-8 JSON bytes (sent as a text frame). Built once."""
+        if self.table is None:
+            self.table = json.dumps({"type": "symbols", "version": VERSION, "price_scale": PRICE_SCALE,
+                                     "tickers": self.tickers}).encode('utf-8')
+        return self.table
+
+    def record(self, ticker_id, price):
+        return RECORD.pack(ticker_id, round(price * PRICE_SCALE))
+
+    def frame(self, seq, ts, records):
+        """One batch: ts is float epoch seconds, records a list of record() bytes."""
+        return HEADER.pack(MAGIC, VERSION, len(records), seq, round(ts * 1e9)) + b''.join(records)
+
+
+class FeedDecoder:
+    """
+    Client side: decode(message) turns a frame of either format into a list of update dicts.
+    Binary updates carry 'ts' (float epoch seconds) instead of the 'timestamp' string.
+    A symbol table is remembered and decodes to []. Any other JSON that isn't an
+    object or a list of objects raises ValueError.
+    """
+
+    def __init__(self):
+        self.tickers = None
+        self.price_scale = PRICE_SCALE
+
+    def decode(self, message):
+        if is_binary_frame(message):
+            return self.decode_binary(message)
+        data = json.loads(message)
+        if isinstance(data, dict):
+            if data.get('type') == 'symbols':
+                self.load_symbols(data)
+                return []
+            return [data]
+        # Anything else has to be a list of update objects; a bare number or [1, 2] is a bad frame
+        if not isinstance(data, list) or not all(isinstance(update, dict) for update in data):
+            raise ValueError("Expected a JSON object or a list of objects")
+        return data
+
+    def load_symbols(self, table):
+        if table.get('version') != VERSION:
+            raise ValueError(f"Unsupported binary feed version {table.get('version')}")
+        self.tickers = table['tickers']
+        self.price_scale = table.get('price_scale', PRICE_SCALE)
+
+    def decode_binary(self, frame):
+        if self.tickers is None:
+            raise ValueError("Binary frame before the symbol table")
+        try:
+            magic, version, count, seq, ts_ns = HEADER.unpack_from(frame)
+        except struct.error as e:
+            raise ValueError(f"Short binary frame: {e}")
+        if version != VERSION or len(frame) != HEADER.size + count * RECORD.size:
+            raise ValueError(f"Malformed binary frame (version {version}, {count} updates, {len(frame)} bytes)")
+        ts = ts_ns / 1e9
+        tickers = self.tickers
+        scale = self.price_scale
+        try:
+            return [{'ticker': tickers[ticker_id], 'price': price / scale, 'ts': ts, 'seq': seq}
+                    for ticker_id, price in RECORD.iter_unpack(memoryview(frame)[HEADER.size:])]
+        except IndexError:
+            raise ValueError("Binary frame has a ticker id that isn't in the symbol table")